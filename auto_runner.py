@@ -1,25 +1,67 @@
 import os
 import json
+import hashlib
 import random
 import subprocess
 import shutil
 import argparse
 import sys
-from pom_modifier import inject_jacoco_into_pom
-
-# ==================== Global Variables (initialized by command line arguments) ====================
-CONTAINER_NAME = "" 
-PARSER_JAR_NAME = ""
-OUTPUT_DIR = ""
-SAMPLE_RATIO = 3.0
-REMOTE_WORKDIR = "/app"
-MVN_EXECUTABLE = "mvn"
-BUILD_SYSTEM = "maven" # "maven" or "gradle"
+import queue
+import tarfile
+import tempfile
+import threading
+import shlex
+import time
+import re
+import statistics
+from collections import OrderedDict
+from pom_modifier import inject_jacoco_into_pom, inject_fast_profile, module_poms, FAST_PROFILE_ID
+import batch_listener
+from offline_report import BULK_REPORT_SOURCE
+from run_ledger import RunLedger, STATES, print_summary
+from run_trace import RunTrace, command_name
+from report_pipeline import ReportPipeline
+from report_store import ReportStore
+from change_tracker import SourceSnapshot, SNAPSHOT_SCRIPT, covered_sources, find_files
+from sample_planner import plan_sample, plan_path, load_plan, save_plan, parse_budget, STRATA
+from container_session import ContainerSession, CountingReader, DockerAPIError, OutputTail, STREAM_TAIL_BYTES
+
+# ==================== Constants (paths inside the containers) ====================
+BATCH_DUMP_DIR = "/tmp/ptcov-exec"
+COMPILE_STAMP = ".ptcov-compiled"
+MERGED_EXEC = "/tmp/ptcov-merged.exec"
+HOST_TIMEOUT_GRACE = 120 # extra seconds before the host gives up on a hanging docker exec
+BUILD_PIDFILE = "/tmp/ptcov-build.pid"
+TIMEOUT_MARK = "/tmp/ptcov-timeout"
+BATCH_TASKS = "/tmp/ptcov-batch-tasks.tsv" # batch mode: .exec -> .xml list for BulkReport
+COLLECT_DIR = "/tmp/ptcov-collect" # --pipeline: reports wait here until a collector copies them out
+# Warm Gradle mode: prints the RSS (KB) of every Gradle daemon in the container. The bracketed
+# dots keep the pattern from matching the cmdline of the shell running this very snippet.
+DAEMON_RSS_PROBE = ("for d in /proc/[0-9]*; do if grep -q 'launcher[.]daemon[.]bootstrap[.]GradleDaemon' $d/cmdline 2>/dev/null; then "
+                    "sed -n 's/^VmRSS:[[:space:]]*\\([0-9]*\\).*/PTCOV_DAEMON_RSS=\\1/p' $d/status 2>/dev/null; fi; done")
+# Configuration cache flags of warm Gradle mode (they cannot be switched on from an init script)
+GRADLE_CACHE_FLAGS = "--build-cache --configuration-cache --configuration-cache-problems=warn"
+# What the parser needs from the container: test sources and build files
+TEST_SOURCES = "-path '*/src/test/java/*'"
+SOURCE_FIND = find_files(f"{TEST_SOURCES} -o -name pom.xml -o -name 'build.gradle*' -o -name 'settings.gradle*'")
+# "<path> <size> <mtime>" of the test sources among them (the parser cache key, see test_source_fingerprint)
+TEST_SOURCE_LISTING = find_files(TEST_SOURCES, "-printf '%P %s %T@\\n'")
 # =================================================================
 
-def run_cmd(cmd, silent=False):
+class RunnerError(Exception):
+    """A project cannot be run (missing jar, container not reachable, ...)"""
+    pass
+
+def run_cmd(cmd, silent=False, timeout=None):
     if not silent: print(f"👉 {cmd}")
-    return subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8', errors='ignore')
+    try:
+        return subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8', errors='ignore', timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        out = e.stdout.decode('utf-8', errors='ignore') if isinstance(e.stdout, bytes) else (e.stdout or "")
+        return subprocess.CompletedProcess(cmd, 124, out, f"Timed out after {timeout}s")
+
+def safe_test_name(test_id):
+    return test_id.replace("#", "_").replace(".", "_")
 
 def extract_class_name(file_path):
     """Extract fully qualified class name from filePath (helper function)"""
@@ -48,248 +90,1456 @@ def force_cleanup(path):
         cmd = f"docker run --rm -v \"{cwd}\":/work alpine rm -rf /work/{target}"
         run_cmd(cmd, silent=True)
 
-def step0_check_tests_existence():
-    """Step 0: Check if tests exist in the container"""
-    print(f"\n🔍 Step 0: Checking for tests in {CONTAINER_NAME}...")
-    
-    # Count Test files
-    cmd = f"docker exec -w {REMOTE_WORKDIR} {CONTAINER_NAME} find . -name '*Test.java' | wc -l"
-    res_count = run_cmd(cmd, silent=True)
-    count = int(res_count.stdout.strip()) if res_count.stdout.strip().isdigit() else 0
-    
-    print(f"   ℹ️ Found approximately {count} Test.java files.")
-    
-    if count == 0:
-        print("   ❌ No *Test.java files found in the container. Please check the working directory or project structure.")
-        sys.exit(1)
+def with_timeout(cmd, seconds):
+    """Shell snippet running cmd in its own session (pgid in BUILD_PIDFILE) and setting $rc
+
+    A watchdog kills the whole process group (Maven/Gradle and their forked test JVMs)
+    after `seconds`, prints PTCOV_TIMEOUT and sets rc=124.
+    """
+    return (f"rm -f {TIMEOUT_MARK}\n"
+            f"setsid sh -c 'echo $$ > {BUILD_PIDFILE}; exec sh -c \"$1\"' sh {shlex.quote(cmd)} &\n"
+            "pid=$!\n"
+            # Poll instead of one long sleep so the watchdog ends right after the build
+            f"( i=0; while [ $i -lt {int(seconds)} ] && kill -0 $pid 2>/dev/null; do sleep 1 >/dev/null 2>&1; i=$((i+1)); done\n"
+            f"  if kill -0 $pid 2>/dev/null; then echo PTCOV_TIMEOUT; touch {TIMEOUT_MARK}; pg=$(cat {BUILD_PIDFILE})\n"
+            "    kill -TERM -$pg 2>/dev/null; j=0; while [ $j -lt 10 ] && kill -0 -$pg 2>/dev/null; do sleep 1; j=$((j+1)); done\n"
+            "    kill -KILL -$pg 2>/dev/null; fi ) &\n"
+            "wd=$!\n"
+            "wait $pid\nrc=$?\n"
+            f"if [ -f {TIMEOUT_MARK} ]; then rc=124; wait $wd; else kill $wd 2>/dev/null; fi\n")
+
+def test_outcome(res, report_path, phases):
+    """Ledger outcome of one test run; a copied report counts as ok even if the build failed (exit code is kept)"""
+    if report_path and os.path.exists(report_path):
+        state, size = "ok", os.path.getsize(report_path)
+    elif "PTCOV_TIMEOUT" in res.stdout or res.returncode == 124:
+        state, size = "timeout", None
     else:
-        print("   ✅ Tests detected.")
+        state, size = ("failed" if res.returncode != 0 else "no-xml"), None
+    return {"state": state, "exit_code": res.returncode, "phases": phases, "report_bytes": size, "log": res.stdout + res.stderr}
+
+def path_size(path):
+    """Bytes of a file, or of all files below a directory"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def surefire_seconds(output):
+    """Sum of the per-class 'Time elapsed' of a surefire run, i.e. the time spent in the tests themselves"""
+    return sum(float(t.replace(",", "")) for t in re.findall(r"Time elapsed: ([\d.,]+) s", output))
+
+def stage_script(stage):
+    """Shell snippet moving the report in $f to the staging path (--pipeline), so the next test cannot clean it up"""
+    if not stage: return ""
+    return f'mkdir -p {shlex.quote(os.path.dirname(stage))} && mv "$f" {shlex.quote(stage)} && f={shlex.quote(stage)}; '
+
+def docker_limit_options(limits):
+    """docker run / docker update flags for {"cpus": 2.0, "memory": "4g"} style limits"""
+    if not limits: return ""
+    opts = []
+    if limits.get("cpus"): opts.append(f"--cpus {limits['cpus']}")
+    if limits.get("memory"):
+        # Raise the swap limit along with the memory limit, docker update refuses memory > memory-swap
+        opts.append(f"--memory {limits['memory']} --memory-swap {limits['memory']}")
+    return " ".join(opts)
+
+class ProjectRunner:
+    """Runs the coverage pipeline (steps 0-5) for one project container
+
+    All per-project state (build system, report index, run ledger, Engine API sessions,
+    ...) lives on the instance, so several projects can run side by side in one
+    process (see orchestrator.py).
+    """
+
+    def __init__(self, container_name, parser_jar="test-parser-1.0-SNAPSHOT-jar-with-dependencies.jar",
+                 output_dir="./experiment_data", sample_ratio=3.0, remote_workdir="/app", workers=1, batch_mode=None,
+                 jacoco_cli_jar="jacococli.jar", compile_once=False, fast_profile=False, engine_api=False, engine_socket="",
+                 stream_logs=False, exec_only=False, refresh_parser=False, compress_transfer=False, retry_failed=False,
+                 only_status=None, test_timeout=0, schedule_order=None, container_limits=None, trace=False,
+                 pipeline=False, convert_csv=None, convert_jobs=1, store_reports=None, gradle_daemon=False,
+                 daemon_max_runs=50, daemon_max_rss=0, daemon_heap=None, sample_seed=None, time_budget=None,
+                 stratify="class", probe_tests=5, incremental=False, out=None):
+        self.options = {k: v for k, v in locals().items() if k not in ("self", "out")}
+        self.container_name = container_name
+        self.parser_jar = parser_jar
+        self.output_dir = output_dir
+        self.sample_ratio = sample_ratio
+        self.remote_workdir = remote_workdir
+        self.workers = max(1, workers)
+        self.batch_mode = batch_mode # None, "class" or "all"
+        self.jacoco_cli_jar = jacoco_cli_jar
+        self.compile_once = compile_once
+        self.fast_profile = fast_profile
+        self.engine_api = engine_api # talk to the Docker Engine socket directly instead of spawning the docker CLI
+        self.engine_socket = engine_socket
+        self.stream_logs = stream_logs
+        self.exec_only = exec_only # keep per-test .exec files and build the reports offline (offline_report.py)
+        self.refresh_parser = refresh_parser # ignore the parser cache (OUTPUT_DIR/<container>/parser_cache/)
+        self.compress_transfer = compress_transfer # gzip the source stream of the parser step
+        self.retry_failed = retry_failed # also re-run tests the ledger has as failed / no-xml / timeout
+        self.only_status = only_status # run only tests in these ledger states
+        self.test_timeout = max(0, test_timeout) # seconds per test before its build process tree is killed (0 = no limit)
+        self.schedule_order = schedule_order # None (default), "auto", "longest", "shortest" or "none" (see schedule_jobs)
+        self.plan_order = False # set once step 2b has put the tests into sampling order
+        self.container_limits = container_limits # {"cpus": ..., "memory": ...} applied with docker update / docker run
+        self.pipeline = pipeline # collect reports in the background while the next test runs (see report_pipeline.py)
+        self.convert_csv = convert_csv # with pipeline: CSV output root to convert collected reports into
+        self.convert_jobs = max(1, convert_jobs)
+        self.store_reports = store_reports # codec of the content-addressed report store (see report_store.py), None = loose XMLs
+        self.gradle_daemon = gradle_daemon # Gradle: keep one warm daemon per container instead of --no-daemon builds
+        self.daemon_max_runs = daemon_max_runs # restart the daemon after this many builds (0 = never)
+        self.daemon_max_rss = daemon_max_rss # ... or once its RSS exceeds this many MB (0 = no limit)
+        self.daemon_heap = daemon_heap # -Xmx of the daemon, e.g. "2g" (None = Gradle's default)
+        self.sample_seed = sample_seed # None = the seed of the saved plan, else a random one (see sample_planner.py)
+        # Wall-clock seconds for the planned tests; "12h", "90m" or seconds (the CLI and manifests pass the text)
+        self.time_budget = parse_budget(time_budget) if time_budget else None
+        self.stratify = stratify # sampling strata: "class" or "package"
+        self.probe_tests = probe_tests # with a budget but no recorded durations: PTs run first to measure them
+        self.incremental = incremental # re-run only tests whose input fingerprint changed (see change_tracker.py)
+        self.out = out # stream for this project's messages (None = stdout)
+        # Phase timings; with trace=True the spans are also written as a Chrome trace at the end
+        self.trace = RunTrace(keep_events=trace, name=container_name)
+
+        # Discovered while running
+        self.mvn_executable = "mvn"
+        self.build_system = "maven" # "maven" or "gradle"
+        self.maven_profile_args = "" # e.g. "-Ppt-coverage-fast" once the fast profile is injected
+        self.report_index = None # where each module writes jacoco.xml / .exec, see prepare_report_index()
+        self.ledger = None # RunLedger of this project (OUTPUT_DIR/<container>/ledger.sqlite)
+        self.report_store = None # ReportStore of this project with --store-reports (OUTPUT_DIR/<container>/reports/)
+        self.source_snapshot = None # SourceSnapshot of the project's files with --incremental
+        self.phase = "queued" # shown by the orchestrator
+
+        # Serializes writes to shared runner files (report index, timings) when running with several workers
+        self.log_lock = threading.Lock()
+        self.out_lock = threading.Lock()
+        # Warm Gradle mode: builds since the daemon of each container was (re)started
+        self.daemon_runs = {}
+        self.gradle_cache_flags = GRADLE_CACHE_FLAGS
+        # Wall-clock seconds per Maven test invocation, by command kind ("full" lifecycle vs "fast" goals-only)
+        self.compile_timings = {"full": [], "fast": []}
+        self.full_baseline_claimed = False # compile-once mode: one test (of any worker) runs the full command
+        # Engine API sessions by container name (see get_session)
+        self.sessions = {}
+        self.session_lock = threading.Lock()
+        # Staged reports already copied out, by container; removed by that container's next test command
+        self.collected_stage = {}
+        # Local scratch files of this project (projects may share the working directory)
+        self.scratch_dir = f"./temp_ptcov_{container_name}"
+
+    def log(self, message=""):
+        """print() for this project's messages"""
+        with self.out_lock:
+            print(message, file=self.out or sys.stdout, flush=True)
+
+    def run_cmd(self, cmd, silent=False, timeout=None):
+        if not silent: self.log(f"👉 {cmd}")
+        with self.trace.span(command_name(cmd), "cmd"):
+            return run_cmd(cmd, silent=True, timeout=timeout)
+
+    def temp_path(self, name):
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        return os.path.join(self.scratch_dir, name)
+
+    def apply_container_limits(self, container):
+        """docker update the CPU/memory limits of a running container"""
+        res = self.run_cmd(f"docker update {docker_limit_options(self.container_limits)} {container}", silent=True)
+        if res.returncode != 0:
+            self.log(f"   ⚠️ Could not apply resource limits to {container}: {res.stderr.strip()}")
+
+    def run(self):
+        """Steps 0-5 for this project"""
+        self.log(f"🔥 Starting Auto Runner for: {self.container_name}")
+        self.log(f"   Parser: {self.parser_jar}")
+        self.log(f"   Output: {self.output_dir}/{self.container_name}")
+        try:
+            self._run_steps()
+        finally:
+            with self.session_lock:
+                for session in self.sessions.values(): session.close()
+                self.sessions.clear()
+            if self.report_store:
+                self.report_store.close()
+                self.report_store = None
+            force_cleanup(self.scratch_dir)
+            self.trace.print_table(self.out)
+            if self.trace.keep_events:
+                trace_path = os.path.join(self.output_dir, self.container_name, f"trace_{time.strftime('%Y%m%d-%H%M%S')}.json")
+                self.trace.export_chrome(trace_path)
+                self.log(f"   📈 Trace written to {trace_path} (open in ui.perfetto.dev or chrome://tracing)")
+
+    def _run_steps(self):
+        if self.container_limits: self.apply_container_limits(self.container_name)
+
+        # 0. Pre-check
+        self.phase = "prepare"
+        with self.trace.span("step0 check tests"):
+            self.step0_check_tests_existence()
 
-def step1_prepare_environment():
-    """Step 1: Put Parser into container and modify POM or Init Gradle"""
-    global MVN_EXECUTABLE, BUILD_SYSTEM
-    print(f"\n📦 Step 1: Preparing Environment for [{CONTAINER_NAME}]...")
+        # 1. Preparation
+        with self.trace.span("step1 prepare"):
+            self.step1_prepare_environment()
+        if self.batch_mode:
+            with self.trace.span("step1b batch listener"): self.step1b_prepare_batch_mode()
+        if self.compile_once:
+            with self.trace.span("step1c compile once"): self.step1c_compile_once()
     
-    # Detect Build System
-    if run_cmd(f"docker exec -w {REMOTE_WORKDIR} {CONTAINER_NAME} test -f pom.xml").returncode == 0:
-        BUILD_SYSTEM = "maven"
-        print("   ✅ Detected Maven project.")
-    elif run_cmd(f"docker exec -w {REMOTE_WORKDIR} {CONTAINER_NAME} test -f build.gradle").returncode == 0 or \
-         run_cmd(f"docker exec -w {REMOTE_WORKDIR} {CONTAINER_NAME} test -f build.gradle.kts").returncode == 0:
-        BUILD_SYSTEM = "gradle"
-        print("   ✅ Detected Gradle project.")
-    else:
-        print("   ⚠️ Could not detect pom.xml or build.gradle. Defaulting to Maven.")
-        BUILD_SYSTEM = "maven"
-
-    # Check for mvnw (only if Maven)
-    if BUILD_SYSTEM == "maven":
-        res = run_cmd(f"docker exec -w {REMOTE_WORKDIR} {CONTAINER_NAME} test -f mvnw")
-        if res.returncode == 0:
-            print("   ✅ Maven Wrapper (mvnw) detected. Using ./mvnw")
-            MVN_EXECUTABLE = "./mvnw"
-        else:
-            print("   ℹ️ Maven Wrapper not found. Using system mvn")
-            MVN_EXECUTABLE = "mvn"
+        # 2. Identification
+        self.phase = "parse"
+        with self.trace.span("step2 parser"):
+            pts, nonpts = self.step2_run_parser_and_get_tests()
+        self.log(f"📊 Found: {len(pts)} PTs, {len(nonpts)} Non-PTs")
     
-    # 1.1 Upload Parser JAR to container root directory (/app)
-    print(f"   Uploading {PARSER_JAR_NAME}...")
-    if not os.path.exists(PARSER_JAR_NAME):
-        print(f"❌ Error: Jar file '{PARSER_JAR_NAME}' not found locally!")
-        sys.exit(1)
+        if not pts and not nonpts:
+            self.log("❌ No tests found. Exiting.")
+            self.phase = "no tests"
+            return
 
-    run_cmd(f"docker cp {PARSER_JAR_NAME} {CONTAINER_NAME}:{REMOTE_WORKDIR}/parser.jar")
+        if self.incremental:
+            with self.trace.span("step2a snapshot"):
+                self.source_snapshot = self.snapshot_sources(pts + nonpts)
 
-    # 1.2 Inject JaCoCo
-    if BUILD_SYSTEM == "maven":
-        print("   Injecting JaCoCo into pom.xml...")
-        # First clean up any local remaining temp files
-        if os.path.exists("./temp_pom.xml"): os.remove("./temp_pom.xml")
-        
-        res = run_cmd(f"docker cp {CONTAINER_NAME}:{REMOTE_WORKDIR}/pom.xml ./temp_pom.xml")
-        if res.returncode != 0:
-            print(f"❌ Failed to copy pom.xml from container. Is container '{CONTAINER_NAME}' running?")
-            sys.exit(1)
+        self.ledger = RunLedger.open(self.container_name, self.output_dir)
+        self.ledger.start_run(self.options)
+        if self.store_reports and not self.exec_only:
+            try:
+                self.report_store = ReportStore.open(self.container_name, self.output_dir, self.store_reports)
+            except (RuntimeError, ValueError) as e:
+                raise RunnerError(f"Cannot open the report store: {e}")
+        if self.source_snapshot:
+            self.invalidate_changed_tests("pt", pts)
+            self.invalidate_changed_tests("nonpt", nonpts)
+
+        # 3. Sampling
+        self.phase = "plan"
+        with self.trace.span("step2b sampling"):
+            pts, selected_nonpts = self.step2b_plan_sample(pts, nonpts)
+        # Register both categories up front so the ledger's ETA covers the whole plan
+        self.register_tests(pts, "pt")
+        self.register_tests(selected_nonpts, "nonpt")
         
+        # 4. Execution
+        workers, snapshot_image = None, None
         try:
-            inject_jacoco_into_pom("./temp_pom.xml") # Call pom_modifier.py
-            run_cmd(f"docker cp ./temp_pom.xml {CONTAINER_NAME}:{REMOTE_WORKDIR}/pom.xml")
-            print("   ✅ JaCoCo injected.")
-        except Exception as e:
-            print(f"❌ POM modification failed: {e}")
-            sys.exit(1)
+            if self.workers > 1:
+                with self.trace.span("workers start"):
+                    workers, snapshot_image = self.start_worker_containers(self.workers)
+            self.phase = "pt"
+            if pts:
+                with self.trace.span("step3 pt"): self.step3_run_tests_loop(pts, "pt", workers, self.batch_mode)
+            self.phase = "nonpt"
+            if selected_nonpts:
+                with self.trace.span("step3 nonpt"): self.step3_run_tests_loop(selected_nonpts, "nonpt", workers, self.batch_mode)
         finally:
-            if os.path.exists("./temp_pom.xml"): os.remove("./temp_pom.xml")
-            
-    elif BUILD_SYSTEM == "gradle":
-        print("   Creating Gradle init script for JaCoCo...")
-        init_script_content = """
-allprojects {
-    apply plugin: 'jacoco'
-    
-    tasks.withType(Test) {
-        finalizedBy 'jacocoTestReport'
-    }
+            if workers:
+                with self.trace.span("workers stop"): self.stop_worker_containers(workers, snapshot_image)
+            if self.gradle_daemon and self.build_system == "gradle":
+                self.container_exec(self.container_name, "./gradlew --stop", silent=True)
+            self.ledger.finish_run()
+            print_summary(self.ledger, self.container_name, self.out)
+
+        # 5. Class files for offline report generation
+        if self.exec_only:
+            self.phase = "classes"
+            with self.trace.span("step4 classes"): self.step4_collect_class_dirs()
     
-    tasks.withType(JacocoReport) {
-        reports {
-            xml.required = true
-            csv.required = false
-            html.required = false
-        }
-    }
-}
-"""
-        with open("jacoco_init.gradle", "w") as f:
-            f.write(init_script_content)
-            
-        run_cmd(f"docker cp jacoco_init.gradle {CONTAINER_NAME}:{REMOTE_WORKDIR}/jacoco_init.gradle")
-        print("   ✅ Gradle init script uploaded.")
+        self.phase = "done"
+        self.log(f"\n🎉 Finished {self.container_name}!")
+
+    def snapshot_sources(self, test_ids):
+        """Step 2a (--incremental): hash the project's sources and build files in the container"""
+        res = self.container_exec(self.container_name, SNAPSHOT_SCRIPT, silent=True)
+        if res.returncode != 0 or not res.stdout.strip():
+            self.log(f"   ⚠️ Could not hash the project files, running without --incremental: {res.stderr.strip()}")
+            return None
+        snapshot = SourceSnapshot(res.stdout, test_ids)
+        self.log(f"   🧾 Hashed {snapshot.files} project files ({len(snapshot.main)} main, {len(snapshot.tests)} test sources)")
+        return snapshot
+
+    def invalidate_changed_tests(self, category, test_list):
+        """--incremental: put ok tests whose inputs changed since their last run back to pending and drop their old reports"""
+        states = self.ledger.states(category)
+        done = [t for t in test_list if states.get(t) == "ok"]
+        if not done:
+            return
+        stale = self.source_snapshot.changed(done, self.ledger.inputs(category))
+        for test_id in stale:
+            self.discard_report(category, test_id)
+        self.ledger.reset(category, stale)
+        self.log(f"   ♻️ {category}: reusing {len(done) - len(stale)} reports with unchanged inputs, "
+                 f"{len(stale)} tests changed (or were never fingerprinted) and run again")
+
+    def step2b_plan_sample(self, pts, nonpts):
+        """Step 2b: Seeded, stratified sample of the tests that fits --time-budget (see sample_planner.py)
+
+        Only tests the ledger still has to run count against the budget. With a budget but
+        no recorded durations, the first --probe-tests PTs of the plan run first to get some.
+        """
+        path = plan_path(self.container_name, self.output_dir)
+        self.plan_order = True
+        seed = self.sample_seed
+        if seed is None:
+            seed = (load_plan(path) or {}).get("seed")
+            if seed is not None:
+                self.log(f"   🎲 Reusing sampling seed {seed} of {path}")
+            else:
+                seed = random.randrange(2 ** 32)
+
+        def plan():
+            if not self.ledger.durations():
+                return plan_sample(pts, nonpts, self.sample_ratio, seed, None, self.time_budget, self.workers, self.stratify)
+            to_run = set(self.ledger.select("pt", pts, self.retry_failed, self.only_status))
+            to_run.update(self.ledger.select("nonpt", nonpts, self.retry_failed, self.only_status))
+            estimates = {t: s if t in to_run else 0.0 for t, s in self.ledger.estimates(pts + nonpts).items()}
+            return plan_sample(pts, nonpts, self.sample_ratio, seed, estimates, self.time_budget, self.workers, self.stratify)
+
+        sample = plan()
+        if self.time_budget and not sample.estimated and self.probe_tests > 0 and sample.pts:
+            probe = sample.pts[:self.probe_tests]
+            self.log(f"   🔬 No test durations recorded yet, probing the first {len(probe)} PTs of the plan...")
+            with self.trace.span("step2b probe"):
+                self.step3_run_tests_loop(probe, "pt")
+            sample = plan()
+        save_plan(path, sample)
+        for line in sample.describe():
+            self.log(line)
+        return sample.pts, sample.nonpts
+
+    def get_session(self, container):
+        """Engine API session for `container` (one per container, shared by all callers)"""
+        with self.session_lock:
+            if container not in self.sessions:
+                self.sessions[container] = ContainerSession(container, self.remote_workdir, self.engine_socket or None)
+            return self.sessions[container]
+
+    def container_exec(self, container, cmd, silent=False, env=None, log_file=None, timeout=None):
+        """Run a shell command inside the container (docker exec, or the Engine API session)
 
-def step2_run_parser_and_get_tests():
-    """Step 2: Run Parser locally (to avoid Java version mismatch in container)"""
-    print("\n🧠 Step 2: Running Parser locally...")
+        `timeout` only bounds the docker CLI call on the host; test commands kill their
+        in-container process tree themselves (see with_timeout).
+        """
+        if self.engine_api:
+            if not silent: self.log(f"👉 [{container}] {cmd}")
+            with self.trace.span("engine exec", "cmd"):
+                try:
+                    return self.get_session(container).exec(cmd, env=env, log_file=log_file)
+                except (DockerAPIError, OSError) as e:
+                    return subprocess.CompletedProcess(cmd, 1, "", str(e))
+
+        env_opts = "".join(f" -e {shlex.quote(f'{k}={v}')}" for k, v in (env or {}).items())
+        docker_cmd = f"docker exec{env_opts} -w {self.remote_workdir} {container} sh -c {shlex.quote(cmd)}"
+        if not log_file:
+            return self.run_cmd(docker_cmd, silent, timeout)
+
+        # Stream the output to the log file and keep only its tail in memory
+        if not silent: self.log(f"👉 {docker_cmd}")
+        tail = OutputTail(STREAM_TAIL_BYTES)
+        with self.trace.span("docker exec", "cmd"), open(log_file, "ab") as log:
+            proc = subprocess.Popen(docker_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            for chunk in iter(lambda: proc.stdout.read(64 * 1024), b""):
+                log.write(chunk)
+                tail.write(chunk)
+            proc.wait()
+        return subprocess.CompletedProcess(docker_cmd, proc.returncode, tail.text(), "")
+
+    def copy_from_container(self, container, remote_path, local_path, silent=False):
+        """docker cp container:remote_path local_path"""
+        with self.trace.span("copy from container", "transfer") as span:
+            if self.engine_api:
+                if not silent: self.log(f"👉 [{container}] copy {remote_path} -> {local_path}")
+                try:
+                    span["bytes"] = self.get_session(container).copy_from(remote_path, local_path)
+                    return subprocess.CompletedProcess(remote_path, 0, "", "")
+                except (DockerAPIError, OSError, tarfile.TarError) as e:
+                    return subprocess.CompletedProcess(remote_path, 1, "", str(e))
+            cmd = f"docker cp {container}:{remote_path} {local_path}"
+            if not silent: self.log(f"👉 {cmd}")
+            res = run_cmd(cmd, silent=True)
+            if res.returncode == 0 and os.path.exists(local_path):
+                span["bytes"] = path_size(local_path)
+            return res
+
+    def copy_to_container(self, local_path, container, remote_path, silent=False):
+        """docker cp local_path container:remote_path"""
+        with self.trace.span("copy to container", "transfer") as span:
+            if self.engine_api:
+                if not silent: self.log(f"👉 [{container}] copy {local_path} -> {remote_path}")
+                try:
+                    span["bytes"] = self.get_session(container).copy_to(local_path, remote_path)
+                    return subprocess.CompletedProcess(local_path, 0, "", "")
+                except (DockerAPIError, OSError) as e:
+                    return subprocess.CompletedProcess(local_path, 1, "", str(e))
+            cmd = f"docker cp {local_path} {container}:{remote_path}"
+            if not silent: self.log(f"👉 {cmd}")
+            res = run_cmd(cmd, silent=True)
+            if res.returncode == 0:
+                span["bytes"] = path_size(local_path)
+            return res
+
+    def step0_check_tests_existence(self):
+        """Step 0: Check if tests exist in the container"""
+        self.log(f"\n🔍 Step 0: Checking for tests in {self.container_name}...")
     
-    # 2.1 Copy project from container to local temp
-    # Use a unique temp dir to avoid conflicts with previous failed runs
-    import time
-    local_project_path = f"./temp_project_source_{int(time.time())}"
-    # local_project_path = "./temp_project_source"
-    # force_cleanup(local_project_path)
-    os.makedirs(local_project_path, exist_ok=True)
+        # Count Test files
+        res_count = self.container_exec(self.container_name, "find . -name '*Test.java' | wc -l", silent=True)
+        count = int(res_count.stdout.strip()) if res_count.stdout.strip().isdigit() else 0
     
-    print(f"   Copying project from {CONTAINER_NAME}:{REMOTE_WORKDIR} to {local_project_path} (using tar to exclude target)...")
+        self.log(f"   ℹ️ Found approximately {count} Test.java files.")
     
-    # Use tar inside container to package source code, excluding target directories
-    # This avoids permission issues and speeds up transfer
-    tar_remote_path = f"{REMOTE_WORKDIR}/project_source.tar"
-    tar_local_path = f"./temp_project_source_{int(time.time())}.tar"
+        if count == 0:
+            raise RunnerError("No *Test.java files found in the container. Please check the working directory or project structure.")
+        else:
+            self.log("   ✅ Tests detected.")
+
+    def step1_prepare_environment(self):
+        """Step 1: Put Parser into container and modify POM or Init Gradle"""
+        self.log(f"\n📦 Step 1: Preparing Environment for [{self.container_name}]...")
     
-    # Create tarball inside container
-    # Exclude target, .git, and hidden files to keep it clean
-    # Note: --exclude pattern matches the file name component
-    tar_cmd = f"docker exec -w {REMOTE_WORKDIR} {CONTAINER_NAME} tar -cf project_source.tar --exclude='target' --exclude='.git' ."
-    res = run_cmd(tar_cmd)
-    if res.returncode != 0:
-        print(f"❌ Failed to create tarball in container: {res.stderr}")
-        return [], []
+        # Detect Build System
+        if self.container_exec(self.container_name, "test -f pom.xml").returncode == 0:
+            self.build_system = "maven"
+            self.log("   ✅ Detected Maven project.")
+        elif self.container_exec(self.container_name, "test -f build.gradle").returncode == 0 or \
+             self.container_exec(self.container_name, "test -f build.gradle.kts").returncode == 0:
+            self.build_system = "gradle"
+            self.log("   ✅ Detected Gradle project.")
+        else:
+            self.log("   ⚠️ Could not detect pom.xml or build.gradle. Defaulting to Maven.")
+            self.build_system = "maven"
+
+        # Check for mvnw (only if Maven)
+        if self.build_system == "maven":
+            res = self.container_exec(self.container_name, "test -f mvnw")
+            if res.returncode == 0:
+                self.log("   ✅ Maven Wrapper (mvnw) detected. Using ./mvnw")
+                self.mvn_executable = "./mvnw"
+            else:
+                self.log("   ℹ️ Maven Wrapper not found. Using system mvn")
+                self.mvn_executable = "mvn"
+    
+        # 1.1 Upload Parser JAR to container root directory (/app)
+        self.log(f"   Uploading {self.parser_jar}...")
+        if not os.path.exists(self.parser_jar):
+            raise RunnerError(f"Jar file '{self.parser_jar}' not found locally!")
+
+        self.copy_to_container(self.parser_jar, self.container_name, f"{self.remote_workdir}/parser.jar")
+
+        # 1.2 Inject JaCoCo
+        if self.build_system == "maven":
+            self.log("   Injecting JaCoCo into pom.xml...")
+            # First clean up any local remaining temp files
+            pom_path = self.temp_path("pom.xml")
+            if os.path.exists(pom_path): os.remove(pom_path)
+        
+            res = self.copy_from_container(self.container_name, f"{self.remote_workdir}/pom.xml", pom_path)
+            if res.returncode != 0:
+                raise RunnerError(f"Failed to copy pom.xml from container. Is container '{self.container_name}' running?")
         
-    # Copy tarball to local
-    run_cmd(f"docker cp {CONTAINER_NAME}:{tar_remote_path} {tar_local_path}")
+            try:
+                inject_jacoco_into_pom(pom_path) # Call pom_modifier.py
+                self.copy_to_container(pom_path, self.container_name, f"{self.remote_workdir}/pom.xml")
+                self.log("   ✅ JaCoCo injected.")
+            except Exception as e:
+                raise RunnerError(f"POM modification failed: {e}")
+            finally:
+                if os.path.exists(pom_path): os.remove(pom_path)
+
+            if self.fast_profile:
+                self.inject_fast_profile_into_container_poms()
+                self.maven_profile_args = f"-P{FAST_PROFILE_ID}"
+            
+        elif self.build_system == "gradle":
+            self.log("   Creating Gradle init script for JaCoCo...")
+            init_script_content = """
+    allprojects {
+        apply plugin: 'jacoco'
     
-    # Remove tarball from container to save space
-    run_cmd(f"docker exec {CONTAINER_NAME} rm {tar_remote_path}", silent=True)
+        tasks.withType(Test) {
+            finalizedBy 'jacocoTestReport'
+        }
     
-    # Extract tarball locally
-    if os.path.exists(tar_local_path):
-        run_cmd(f"tar -xf {tar_local_path} -C {local_project_path}")
-        os.remove(tar_local_path)
-    else:
-        print("❌ Failed to retrieve tarball.")
-        return [], []
+        tasks.withType(JacocoReport) {
+            reports {
+                xml.required = true
+                csv.required = false
+                html.required = false
+            }
+        }
+    }
+    """
+            if self.batch_mode:
+                # Put the per-test dump listener on every test runtime classpath
+                init_script_content += f"""
+    allprojects {{
+        plugins.withType(JavaPlugin) {{
+            dependencies {{
+                testRuntimeOnly files('{self.remote_workdir}/ptcov-listener.jar')
+            }}
+        }}
+    }}
+    """
+            if self.gradle_daemon:
+                # Warm daemon mode: every run is the same invocation (so the configuration cache
+                # is hit) and the test filter comes from the environment when the test task runs.
+                # Test results must then never be up to date or come from the build cache.
+                init_script_content += """
+    allprojects {
+        tasks.withType(Test).configureEach {
+            outputs.upToDateWhen { false }
+            outputs.doNotCacheIf('per-test coverage run') { true }
+            doFirst { task ->
+                def patterns = System.getenv('PTCOV_TEST_FILTER')
+                if (patterns) {
+                    patterns.split(',').each { task.filter.includeTestsMatching(it) }
+                    task.filter.failOnNoMatchingTests = false
+                }
+            }
+        }
+    }
+    """
+            with open(self.temp_path("jacoco_init.gradle"), "w") as f:
+                f.write(init_script_content)
+            
+            self.copy_to_container(self.temp_path("jacoco_init.gradle"), self.container_name, f"{self.remote_workdir}/jacoco_init.gradle")
+            self.log("   ✅ Gradle init script uploaded.")
+            if self.gradle_daemon:
+                self.start_gradle_daemon()
+
+        # 1.3 Locate the JaCoCo outputs of every module once
+        self.prepare_report_index()
+
+    def inject_fast_profile_into_container_poms(self):
+        """Add the pt-coverage-fast profile to the root POM and every reactor module POM in the container
+
+        The reactor is walked through <modules> (see pom_modifier.module_poms), so other
+        pom.xml files in the tree, e.g. test fixtures under src/test/resources or src/it,
+        are left untouched.
+        """
+        self.log(f"   Injecting {FAST_PROFILE_ID} profile into the reactor POMs...")
+        pom_path = self.temp_path("pom.xml")
+        pending, seen, injected = ["pom.xml"], set(), 0
+        while pending:
+            remote_pom = pending.pop(0)
+            if remote_pom in seen or remote_pom.startswith(".."):
+                continue
+            seen.add(remote_pom)
+            if os.path.exists(pom_path): os.remove(pom_path)
+            if self.copy_from_container(self.container_name, f"{self.remote_workdir}/{remote_pom}", pom_path, silent=True).returncode != 0:
+                self.log(f"   ⚠️ Could not copy {remote_pom}, skipping.")
+                continue
+            try:
+                base = os.path.dirname(remote_pom)
+                pending.extend(os.path.normpath(os.path.join(base, child)) for child in module_poms(pom_path))
+                inject_fast_profile(pom_path)
+                self.copy_to_container(pom_path, self.container_name, f"{self.remote_workdir}/{remote_pom}", silent=True)
+                injected += 1
+            except Exception as e:
+                # A module POM we cannot parse just keeps its plugins bound
+                self.log(f"   ⚠️ Fast profile injection failed for {remote_pom}: {e}")
+            finally:
+                if os.path.exists(pom_path): os.remove(pom_path)
+        self.log(f"   ✅ Fast profile injected into {injected} POMs.")
+
+    def step1b_prepare_batch_mode(self):
+        """Step 1b: Upload JaCoCo CLI and compile the per-test dump listener inside the container"""
+        self.log(f"\n🧩 Step 1b: Preparing batch mode ({self.batch_mode}) for [{self.container_name}]...")
+        if not os.path.exists(self.jacoco_cli_jar):
+            raise RunnerError(f"JaCoCo CLI jar '{self.jacoco_cli_jar}' not found locally!")
+        self.copy_to_container(self.jacoco_cli_jar, self.container_name, f"{self.remote_workdir}/jacococli.jar")
+
+        with open(self.temp_path("JacocoPerTestListener.java"), "w") as f:
+            f.write(batch_listener.LISTENER_SOURCE)
+        self.copy_to_container(self.temp_path("JacocoPerTestListener.java"), self.container_name, "/tmp/JacocoPerTestListener.java")
+        os.remove(self.temp_path("JacocoPerTestListener.java"))
+        # Converts all per-test dumps of a batch in one JVM (see offline_report.py)
+        with open(self.temp_path("BulkReport.java"), "w") as f:
+            f.write(BULK_REPORT_SOURCE)
+        self.copy_to_container(self.temp_path("BulkReport.java"), self.container_name, "/tmp/BulkReport.java")
+        os.remove(self.temp_path("BulkReport.java"))
+
+        script = batch_listener.BUILD_SCRIPT.format(
+            src="/tmp/JacocoPerTestListener.java", cls=batch_listener.LISTENER_CLASS,
+            jar=f"{self.remote_workdir}/ptcov-listener.jar", cli=f"{self.remote_workdir}/jacococli.jar",
+            bulk_src="/tmp/BulkReport.java", bulk_jar=f"{self.remote_workdir}/ptcov-bulk.jar")
+        res = self.container_exec(self.container_name, script, silent=True)
+        if res.returncode == 3:
+            # The junit-platform jars only show up in the caches after the first build
+            self.log(f"   ℹ️ {res.stdout.strip()} - warming up dependency caches with one build...")
+            if self.build_system == "maven":
+                warm = f"{self.mvn_executable} {self.maven_profile_args} test -Dtest=NoSuchPtCoverageTest -DfailIfNoTests=false -Dsurefire.failIfNoSpecifiedTests=false -Drat.skip=true"
+            else:
+                warm = "./gradlew test --tests NoSuchPtCoverageTest -I jacoco_init.gradle --no-daemon"
+            self.container_exec(self.container_name, warm, silent=True)
+            res = self.container_exec(self.container_name, script, silent=True)
+        if res.returncode != 0:
+            raise RunnerError(f"Failed to build the batch listener:\n{res.stdout}{res.stderr}")
+        self.log("   ✅ Batch listener and report generator compiled.")
+
+    def step1c_compile_once(self):
+        """Step 1c: Run test-compile once so that later test runs can skip the compile phases"""
+        self.log(f"\n🔨 Step 1c: Compiling [{self.container_name}] once (test-compile)...")
+        if self.build_system != "maven":
+            self.log("   ⚠️ Compile-once mode is only supported for Maven projects. Using the normal command.")
+            self.compile_once = False
+            return
+        start = time.monotonic()
+        res = self.container_exec(self.container_name, f"{self.mvn_executable} {self.maven_profile_args} test-compile -Drat.skip=true && touch {COMPILE_STAMP}", silent=True)
+        if res.returncode != 0:
+            self.log(f"   ⚠️ test-compile failed, falling back to the normal command:\n{res.stdout[-2000:]}")
+            self.compile_once = False
+            return
+        self.log(f"   ✅ Compiled in {time.monotonic() - start:.1f}s.")
+
+    def start_gradle_daemon(self):
+        """Warm Gradle mode: start the daemon of the project container and check the cache flags"""
+        self.log("   Starting a warm Gradle daemon...")
+        start = time.monotonic()
+        cmd = f"./gradlew help -I jacoco_init.gradle --daemon {self.gradle_cache_flags} {self.gradle_jvm_args()}"
+        res = self.container_exec(self.container_name, cmd, silent=True)
+        if res.returncode != 0 and "--configuration-cache" in res.stdout + res.stderr:
+            # Gradle older than 6.6 has no configuration cache
+            self.log("   ℹ️ This Gradle version has no configuration cache, using only the build cache.")
+            self.gradle_cache_flags = "--build-cache"
+            res = self.container_exec(self.container_name, f"./gradlew help -I jacoco_init.gradle --daemon --build-cache {self.gradle_jvm_args()}", silent=True)
+        if res.returncode != 0:
+            self.log(f"   ⚠️ Could not start the Gradle daemon, using --no-daemon builds:\n{(res.stdout + res.stderr)[-2000:]}")
+            self.gradle_daemon = False
+            return
+        self.log(f"   ✅ Gradle daemon ready in {time.monotonic() - start:.1f}s.")
+
+    def gradle_jvm_args(self):
+        return f"-Dorg.gradle.jvmargs=-Xmx{self.daemon_heap}" if self.daemon_heap else ""
+
+    def warm_gradle_command(self, filters, tasks=""):
+        """Warm Gradle mode: (command, env) of a daemon build running the given test filters
+
+        The filters go through PTCOV_TEST_FILTER (see the init script), so the command line
+        is the same for every test. The daemon's RSS is reported after the build.
+        """
+        cmd = (f"./gradlew test {tasks} -I jacoco_init.gradle --daemon {self.gradle_cache_flags} {self.gradle_jvm_args()}; "
+               f"rc=$?; {DAEMON_RSS_PROBE}; exit $rc")
+        return cmd, {"PTCOV_TEST_FILTER": ",".join(filters)}
+
+    def check_gradle_daemon(self, container, res):
+        """Warm Gradle mode: stop the container's daemon after --daemon-max-runs builds, above
+        --daemon-max-rss, or after a timeout (the killed client leaves the build running in it).
+        The next build starts a fresh daemon, as it also does after the OOM killer took the old one."""
+        if not self.gradle_daemon: return
+        rss_mb = sum(int(kb) for kb in re.findall(r"PTCOV_DAEMON_RSS=(\d+)", res.stdout)) // 1024
+        with self.log_lock:
+            runs = self.daemon_runs[container] = self.daemon_runs.get(container, 0) + 1
+        reason = None
+        if "PTCOV_TIMEOUT" in res.stdout:
+            reason = "after a timeout"
+        elif self.daemon_max_rss and rss_mb > self.daemon_max_rss:
+            reason = f"{rss_mb} MB RSS"
+        elif self.daemon_max_runs and runs >= self.daemon_max_runs:
+            reason = f"{runs} builds"
+        if reason:
+            self.log(f"   ♻️ Restarting the Gradle daemon of {container} ({reason})")
+            self.container_exec(container, "./gradlew --stop", silent=True)
+            with self.log_lock:
+                self.daemon_runs[container] = 0
+
+    def maven_test_command(self, selector, extra="", force_full=False, report=True):
+        """Build the in-container Maven command for one test run; returns (kind, command)
+
+        "full" runs the test lifecycle as before. "fast" (compile-once mode) runs only the
+        jacoco and surefire goals offline, recompiling first if a source or POM is newer
+        than the compile stamp. report=False leaves out jacoco:report (batch mode converts
+        the listener's dumps itself).
+        """
+        report = report and not self.exec_only
+        if not self.compile_once or force_full:
+            # Without a report stop the lifecycle before the test phase (and its bound jacoco:report);
+            # prepare-agent has already set argLine for the surefire:test goal that follows
+            phases = "test" if report else "test-compile surefire:test"
+            return "full", f"{self.mvn_executable} {self.maven_profile_args} {phases} -Dtest={selector} -DfailIfNoTests=false -Drat.skip=true {extra}"
+
+        report_goal = " jacoco:report" if report else ""
+        goals = (f"{self.mvn_executable} {self.maven_profile_args} -o jacoco:prepare-agent surefire:test{report_goal} -Dtest={selector} "
+                 f"-DfailIfNoTests=false -Dsurefire.failIfNoSpecifiedTests=false {extra}")
+        # Build outputs, VCS data and node_modules are pruned rather than walked and filtered out
+        stale = (f"find . -type d \\( -name node_modules -o -name .git -o -name target -not -path '*/src/*' \\) -prune -o "
+                 f"-newer {COMPILE_STAMP} -type f \\( -path '*/src/*' -o -name pom.xml \\) -print -quit")
+        script = (f'if [ ! -f {COMPILE_STAMP} ] || [ -n "$({stale})" ]; then echo PTCOV_RECOMPILE; '
+                  f'{self.mvn_executable} {self.maven_profile_args} -o -q test-compile -Drat.skip=true && touch {COMPILE_STAMP} || exit 1; fi; {goals}')
+        return "fast", script
+
+    def run_maven_tests(self, container, selector, env=None, extra="", collect=True, log_name=None, timeout=0, stage=None, report=True):
+        """Run a Maven test selector, timing it and handling the compile-once fallbacks"""
+        # The first run in compile-once mode uses the full command as a baseline for the savings report;
+        # it is claimed under the lock so concurrent workers do not all take the full path
+        with self.log_lock:
+            force_full = self.compile_once and not self.full_baseline_claimed
+            if force_full: self.full_baseline_claimed = True
+        kind, cmd = self.maven_test_command(selector, extra, force_full=force_full, report=report)
+        start = time.monotonic()
+        res = self.run_test_command(container, cmd, env, collect, log_name, timeout, stage)
+        elapsed = time.monotonic() - start
+
+        if kind == "fast" and res.returncode != 0 and "Could not resolve dependencies" in res.stdout:
+            # Goals-only builds cannot resolve reactor siblings in some multi-module projects
+            self.log("   ⚠️ Offline goals-only run could not resolve dependencies. Disabling compile-once mode.")
+            self.compile_once = False
+            return self.run_maven_tests(container, selector, env, extra, collect, log_name, timeout, stage, report)
+
+        if "PTCOV_RECOMPILE" in res.stdout:
+            self.log("   ℹ️ Sources changed since the last compile, recompiled.")
+        elif self.compile_once or kind == "fast":
+            with self.log_lock:
+                self.compile_timings[kind].append(elapsed)
+        return res
+
+    def report_compile_once_savings(self):
+        """Print the median per-test time of goals-only runs compared with the full lifecycle command
+
+        The full baseline is usually a single run that also compiles the project, so the
+        saving is an estimate (an upper bound when the compile dominates that run).
+        """
+        full, fast = self.compile_timings["full"], self.compile_timings["fast"]
+        if not full or not fast: return
+        med_full = statistics.median(full)
+        med_fast = statistics.median(fast)
+        self.log(f"   ⏱️ Compile-once: median {med_fast:.1f}s/test (n={len(fast)}) vs full command {med_full:.1f}s/test "
+                 f"(n={len(full)}, incl. compilation), estimated saving {med_full - med_fast:.1f}s/test "
+                 f"(~{(med_full - med_fast) * len(fast) / 60:.1f} min so far)")
+
+    def test_source_fingerprint(self):
+        """Hash of the paths, sizes and mtimes of all test sources in the container ("" if unavailable)
+
+        The files are the test sources of SOURCE_FIND (same filter). Build files are left out
+        on purpose: step 1 rewrites pom.xml on every run.
+        """
+        script = (f"{TEST_SOURCE_LISTING} > /tmp/ptcov-fp || exit 1\n"
+                  "LC_ALL=C sort /tmp/ptcov-fp | sha256sum; rm -f /tmp/ptcov-fp")
+        res = self.container_exec(self.container_name, script, silent=True)
+        if res.returncode != 0 or not res.stdout.strip():
+            return ""
+        # The parser itself is part of the input
+        digest = hashlib.sha256(res.stdout.split()[0].encode("utf-8"))
+        with open(self.parser_jar, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def step2_run_parser_and_get_tests(self):
+        """Step 2: Run Parser locally, or reuse its result if the test sources did not change"""
+        self.log("\n🧠 Step 2: Running Parser locally...")
+
+        fingerprint = "" if self.refresh_parser else self.test_source_fingerprint()
+        cache_path = os.path.join(self.output_dir, self.container_name, "parser_cache", f"{fingerprint}.json")
+        if fingerprint and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                cached = json.load(f)
+            self.log(f"   ✅ Test sources unchanged ({fingerprint[:12]}), reusing cached parser result.")
+            return cached["pts"], cached["nonpts"]
 
-    # Debug: Check if pom.xml exists
-    if not os.path.exists(os.path.join(local_project_path, "pom.xml")):
-        print(f"⚠️ Warning: pom.xml not found in {local_project_path}")
-        run_cmd(f"ls -F {local_project_path}")
+        pts, nonpts = self.run_parser_on_project_source()
+        if fingerprint and (pts or nonpts):
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path + ".tmp", "w") as f:
+                json.dump({"fingerprint": fingerprint, "pts": pts, "nonpts": nonpts}, f)
+            os.replace(cache_path + ".tmp", cache_path)
+        return pts, nonpts
+
+    def stream_project_source(self, local_project_path):
+        """Extract the parser's inputs (test sources and build files) into local_project_path
+
+        `tar` runs inside the container and writes to stdout; the stream is unpacked on the
+        fly, so no tarball is written on either side.
+        """
+        tar_cmd = f"{SOURCE_FIND} | tar -c{'z' if self.compress_transfer else ''}f - -T -"
+        start = time.monotonic()
+        if self.engine_api:
+            read_fd, write_fd = os.pipe()
+            stream, sink = os.fdopen(read_fd, "rb"), os.fdopen(write_fd, "wb")
+            result = {}
+            def produce():
+                try:
+                    result["res"] = self.get_session(self.container_name).exec_stream(tar_cmd, sink)
+                except (DockerAPIError, OSError) as e:
+                    result["res"] = subprocess.CompletedProcess(tar_cmd, 1, "", str(e))
+                finally:
+                    sink.close()
+            producer = threading.Thread(target=produce, daemon=True)
+            producer.start()
+        else:
+            # stderr goes to a file: a full stderr pipe would stall tar while we only read stdout
+            err_file = tempfile.TemporaryFile()
+            proc = subprocess.Popen(["docker", "exec", "-w", self.remote_workdir, self.container_name, "sh", "-c", tar_cmd],
+                                    stdout=subprocess.PIPE, stderr=err_file)
+            stream = proc.stdout
+
+        counter = CountingReader(stream)
+        files, error = 0, ""
+        try:
+            with tarfile.open(fileobj=counter, mode="r|gz" if self.compress_transfer else "r|") as tar:
+                for member in tar:
+                    name = os.path.normpath(member.name)
+                    if name.startswith("..") or os.path.isabs(name):
+                        continue
+                    target = os.path.join(local_project_path, name)
+                    if member.isdir():
+                        os.makedirs(target, exist_ok=True)
+                    elif member.isfile():
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        with tar.extractfile(member) as src, open(target, "wb") as f:
+                            shutil.copyfileobj(src, f, 1024 * 1024)
+                        files += 1
+        except (tarfile.TarError, OSError) as e:
+            error = str(e)
+        finally:
+            stream.close()
+
+        if self.engine_api:
+            producer.join()
+            res = result["res"]
+            returncode, stderr = res.returncode, res.stderr
+        else:
+            if error: proc.kill()
+            returncode = proc.wait()
+            err_file.seek(0)
+            stderr = err_file.read().decode("utf-8", errors="ignore")
+            err_file.close()
+
+        elapsed = time.monotonic() - start
+        self.trace.record("parser source stream", start, elapsed, "transfer", counter.count)
+        if error or (returncode != 0 and files == 0):
+            self.log(f"❌ Failed to stream project source from container: {error or stderr.strip()}")
+            return False
+        if returncode != 0:
+            # e.g. GNU tar's "file changed as we read it"
+            self.log(f"   ⚠️ tar exited with {returncode}: {stderr.strip()[-500:]}")
+        self.log(f"   ✅ Streamed {files} files, {counter.count / 1e6:.1f} MB{' (gzip)' if self.compress_transfer else ''} in {elapsed:.1f}s")
+        return True
+
+    def run_parser_on_project_source(self):
+        """Copy the project source out of the container and run the parser jar on it (to avoid Java version mismatch in container)"""
+        # 2.1 Stream the parser's inputs from the container into a local temp dir
+        # Use a unique temp dir to avoid conflicts with previous failed runs
+        local_project_path = self.temp_path(f"project_source_{int(time.time())}")
+        os.makedirs(local_project_path, exist_ok=True)
+
+        self.log(f"   Streaming test sources from {self.container_name}:{self.remote_workdir} to {local_project_path}...")
+        if not self.stream_project_source(local_project_path):
+            force_cleanup(local_project_path)
+            return [], []
+
+        # Debug: Check if pom.xml exists
+        if not os.path.exists(os.path.join(local_project_path, "pom.xml")):
+            self.log(f"⚠️ Warning: pom.xml not found in {local_project_path}")
+            self.run_cmd(f"ls -F {local_project_path}")
     
-    # 2.2 Execute Parser locally
-    cmd = f"java -jar {PARSER_JAR_NAME} {local_project_path} ./temp_tests.json"
+        # 2.2 Execute Parser locally
+        tests_json = self.temp_path("tests.json")
+        cmd = f"java -jar {self.parser_jar} {local_project_path} {tests_json}"
     
-    res = run_cmd(cmd)
-    if res.returncode != 0:
-        print(f"❌ Parser Execution Failed:\n{res.stderr}")
-        force_cleanup(local_project_path)
-        return [], []
+        res = self.run_cmd(cmd)
+        if res.returncode != 0:
+            self.log(f"❌ Parser Execution Failed:\n{res.stderr}")
+            force_cleanup(local_project_path)
+            return [], []
         
-    # 2.3 Parse JSON
-    if not os.path.exists("./temp_tests.json"):
-        print("❌ Failed to generate JSON.")
-        print(f"STDOUT: {res.stdout}")
-        print(f"STDERR: {res.stderr}")
-        force_cleanup(local_project_path)
-        return [], []
+        # 2.3 Parse JSON
+        if not os.path.exists(tests_json):
+            self.log("❌ Failed to generate JSON.")
+            self.log(f"STDOUT: {res.stdout}")
+            self.log(f"STDERR: {res.stderr}")
+            force_cleanup(local_project_path)
+            return [], []
 
-    with open("./temp_tests.json", 'r') as f:
-        data = json.load(f)
+        with open(tests_json, 'r') as f:
+            data = json.load(f)
     
-    os.remove("./temp_tests.json")
-    force_cleanup(local_project_path)
+        os.remove(tests_json)
+        force_cleanup(local_project_path)
     
-    pts = []
-    nonpts = []
+        pts = []
+        nonpts = []
     
-    for item in data:
-        file_path = item.get("filePath", "")
-        method_name = item.get("methodName", "")
-        annotations = item.get("annotations", [])
+        for item in data:
+            file_path = item.get("filePath", "")
+            method_name = item.get("methodName", "")
+            annotations = item.get("annotations", [])
         
-        class_name = extract_class_name(file_path)
-        test_id = f"{class_name}#{method_name}"
+            class_name = extract_class_name(file_path)
+            test_id = f"{class_name}#{method_name}"
         
-        if "ParameterizedTest" in annotations:
-            pts.append(test_id)
-        else:
-            nonpts.append(test_id)
+            if "ParameterizedTest" in annotations:
+                pts.append(test_id)
+            else:
+                nonpts.append(test_id)
             
-    return list(set(pts)), list(set(nonpts))
+        return sorted(set(pts)), sorted(set(nonpts))
 
-def step3_run_tests_loop(test_list, category):
-    """Step 3: Loop through tests and save XML"""
-    print(f"\n🚀 Step 3: Running {len(test_list)} {category} tests...")
-    
-    # Create a subdirectory for current project to prevent different projects from mixing
-    # e.g. ./experiment_data/sag-commons-math/pt/
-    # This way when you run multiple projects, data is isolated
-    project_output_dir = os.path.join(OUTPUT_DIR, CONTAINER_NAME, category)
-    
-    for i, test_id in enumerate(test_list):
-        safe_name = test_id.replace("#", "_").replace(".", "_")
-        local_xml = os.path.join(project_output_dir, f"{safe_name}.xml")
-        
-        if os.path.exists(local_xml):
-            print(f"   [{i+1}/{len(test_list)}] Skipping {test_id} (Done)")
-            continue
+    def report_index_path(self):
+        return os.path.join(self.output_dir, self.container_name, "report_index.json")
 
-        print(f"   [{i+1}/{len(test_list)}] Running: {test_id}")
-        
-        # Clean up any existing jacoco.xml, jacocoTestReport.xml AND *.exec files to prevent accumulation
-        run_cmd(f"docker exec -w {REMOTE_WORKDIR} {CONTAINER_NAME} find . -name jacoco.xml -delete", silent=True)
-        run_cmd(f"docker exec -w {REMOTE_WORKDIR} {CONTAINER_NAME} find . -name jacocoTestReport.xml -delete", silent=True)
-        run_cmd(f"docker exec -w {REMOTE_WORKDIR} {CONTAINER_NAME} find . -name '*.exec' -delete", silent=True)
-        
-        if BUILD_SYSTEM == "maven":
-            mvn_cmd = f"docker exec -w {REMOTE_WORKDIR} {CONTAINER_NAME} {MVN_EXECUTABLE} test -Dtest={test_id} -DfailIfNoTests=false -Drat.skip=true"
-            res = run_cmd(mvn_cmd, silent=True)
-        elif BUILD_SYSTEM == "gradle":
+    def prepare_report_index(self):
+        """Work out (or reload) where each module writes its JaCoCo XML and .exec files"""
+        index_path = self.report_index_path()
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+            if index.get("build_system") == self.build_system:
+                self.report_index = index
+                self.log(f"   ✅ Reusing report index ({len(index['reports'])} report locations).")
+                return
+
+        # Derive the locations from the module layout: one build file per module
+        if self.build_system == "maven":
+            find_build_files = "find . -name pom.xml -not -path '*/target/*' -not -path '*/node_modules/*'"
+            report_rel, exec_rel = "target/site/jacoco/jacoco.xml", "target/jacoco.exec"
+        else:
+            find_build_files = "find . \\( -name build.gradle -o -name build.gradle.kts \\) -not -path '*/build/*' -not -path '*/.gradle/*' -not -path '*/node_modules/*'"
+            report_rel, exec_rel = "build/reports/jacoco/test/jacocoTestReport.xml", "build/jacoco/test.exec"
+        res = self.container_exec(self.container_name, find_build_files, silent=True)
+        modules = sorted({os.path.dirname(p.strip()) for p in res.stdout.splitlines() if p.strip()}, key=lambda d: (d.count("/"), d))
+
+        self.report_index = {
+            "build_system": self.build_system,
+            "reports": [f"{m}/{report_rel}" for m in modules],
+            "execs": [f"{m}/{exec_rel}" for m in modules],
+            # Becomes true once a report was actually found at an indexed location
+            "verified": False,
+        }
+        self.save_report_index()
+        self.log(f"   ✅ Report index built for {len(modules)} modules.")
+
+    def save_report_index(self):
+        with self.log_lock:
+            os.makedirs(os.path.dirname(self.report_index_path()), exist_ok=True)
+            with open(self.report_index_path(), "w") as f:
+                json.dump(self.report_index, f, indent=2)
+
+    def probe_report_locations(self, container):
+        """Full-tree search for reports, used until the index is known to be right"""
+        res = self.container_exec(container, "find . \\( -name jacoco.xml -o -name jacocoTestReport.xml -o -name '*.exec' \\) -not -path '*/node_modules/*'", silent=True)
+        found = [p.strip() for p in res.stdout.splitlines() if p.strip()]
+        reports = [p for p in found if not p.endswith(".exec")]
+        execs = [p for p in found if p.endswith(".exec")]
+        # In exec-only mode no XML is generated, so the .exec files are what we are looking for
+        wanted = execs if self.exec_only else reports
+        if wanted:
+            with self.log_lock:
+                self.report_index["reports"] = reports + [p for p in self.report_index["reports"] if p not in reports]
+                self.report_index["execs"] = execs + [p for p in self.report_index["execs"] if p not in execs]
+                self.report_index["verified"] = True
+            self.save_report_index()
+            self.log(f"   ℹ️ Report index updated from probe: {wanted[0]}")
+        return wanted[0] if wanted else ""
+
+    def exec_collect_script(self, stage=None):
+        """Shell snippet merging all indexed .exec files into MERGED_EXEC (exec files can be concatenated)"""
+        execs = " ".join(shlex.quote(p) for p in self.report_index["execs"])
+        return (f'rm -f {MERGED_EXEC}; for f in {execs}; do if [ -f "$f" ]; then cat "$f" >> {MERGED_EXEC}; fi; done\n'
+                f'if [ -s {MERGED_EXEC} ]; then f={MERGED_EXEC}; {stage_script(stage)}echo "PTCOV_REPORT=$f"; fi\n')
+
+    def run_test_command(self, container, cmd, env=None, collect=True, log_name=None, timeout=0, stage=None):
+        """Run a build command in one container exec that also cleans and locates the indexed reports
+
+        In exec-only mode the located "report" is the merged .exec of all modules.
+        With --stream-logs the build output goes to OUTPUT_DIR/<container>/logs/<log_name>.log
+        and only its tail is kept in memory. With a timeout (seconds) the build's process
+        tree is killed inside the container once it runs too long. With a stage path the
+        located report is moved there (--pipeline).
+        """
+        with self.log_lock:
+            collected = self.collected_stage.pop(container, [])
+        clean = " ".join(shlex.quote(p) for p in self.report_index["reports"] + self.report_index["execs"] + collected)
+        if timeout:
+            script = f"rm -f {clean}\n" + with_timeout(cmd, timeout)
+        else:
+            script = f"rm -f {clean}\n( {cmd} )\nrc=$?\n"
+        if collect and self.exec_only:
+            script += self.exec_collect_script(stage)
+        elif collect:
+            reports = " ".join(shlex.quote(p) for p in self.report_index["reports"])
+            script += f'for f in {reports}; do if [ -f "$f" ]; then {stage_script(stage)}echo "PTCOV_REPORT=$f"; break; fi; done\n'
+        script += "exit $rc"
+        log_file = None
+        if self.stream_logs and log_name:
+            log_dir = os.path.join(self.output_dir, self.container_name, "logs")
+            os.makedirs(log_dir, exist_ok=True)
+            log_file = os.path.join(log_dir, f"{log_name}.log")
+            if os.path.exists(log_file): os.remove(log_file)
+        # The host-side limit is only a backstop in case docker exec itself hangs
+        host_timeout = timeout + HOST_TIMEOUT_GRACE if timeout else None
+        return self.container_exec(container, script, silent=True, env=env, log_file=log_file, timeout=host_timeout)
+
+    def run_single_test(self, container, test_id, local_xml, stage=False):
+        """Run one test inside `container` and copy its JaCoCo XML (or .exec in exec-only mode) next to local_xml
+
+        Returns the outcome for the run ledger (see test_outcome). With stage=True (--pipeline)
+        the report is only moved to COLLECT_DIR inside the container and the arguments of
+        collect_report are returned instead, for a collector thread to finish the job.
+        """
+        started = time.monotonic()
+        stage_path = None
+        if stage:
+            stage_path = f"{COLLECT_DIR}/{safe_test_name(test_id)}{'.exec' if self.exec_only else '.xml'}"
+        if self.build_system == "maven":
+            res = self.run_maven_tests(container, test_id, log_name=safe_test_name(test_id), timeout=self.test_timeout, stage=stage_path)
+        elif self.build_system == "gradle":
             # Gradle test filter uses dots instead of #
             gradle_filter = test_id.replace("#", ".")
             # Use ./gradlew if available, else gradle
             # We assume gradlew is present for Gradle projects usually
             # Use --no-daemon to prevent OOM issues in Docker
-            gradle_cmd = f"docker exec -w {REMOTE_WORKDIR} {CONTAINER_NAME} ./gradlew test --tests {gradle_filter} jacocoTestReport -I jacoco_init.gradle --no-daemon"
-            res = run_cmd(gradle_cmd, silent=True)
+            report_task = "-x jacocoTestReport" if self.exec_only else "jacocoTestReport"
+            gradle_cmd, env = f"./gradlew test --tests {gradle_filter} {report_task} -I jacoco_init.gradle --no-daemon", None
+            if self.gradle_daemon:
+                gradle_cmd, env = self.warm_gradle_command([gradle_filter], report_task)
+            res = self.run_test_command(container, gradle_cmd, env=env, log_name=safe_test_name(test_id), timeout=self.test_timeout, stage=stage_path)
+            self.check_gradle_daemon(container, res)
+        phases = {"run": time.monotonic() - started}
 
-        if res.returncode != 0:
-            print(f"   ❌ Build/Test Failed for {test_id}. See build_failures.log")
-            with open("build_failures.log", "a") as log_file:
-                log_file.write(f"=== {test_id} ===\n")
-                log_file.write(res.stdout)
-                log_file.write(res.stderr)
-                log_file.write("\n==================\n")
-        
-        # Find the generated jacoco.xml (it should be in one of the modules)
-        # For Gradle it is usually build/reports/jacoco/test/jacocoTestReport.xml
-        find_res = run_cmd(f"docker exec -w {REMOTE_WORKDIR} {CONTAINER_NAME} find . -name jacoco.xml -o -name jacocoTestReport.xml | head -n 1", silent=True)
-        remote_path = find_res.stdout.strip()
-        
+        if "PTCOV_TIMEOUT" in res.stdout:
+            self.log(f"   ⏰ {test_id} timed out after {self.test_timeout}s, build process tree killed.")
+        elif res.returncode != 0:
+            self.log(f"   ❌ Build/Test Failed for {test_id}. See: python run_ledger.py failures {self.container_name}")
+    
+        start = time.monotonic()
+        # The report location comes from the index (printed by the same container command)
+        remote_path = ""
+        for line in res.stdout.splitlines():
+            if line.startswith("PTCOV_REPORT="):
+                remote_path = line[len("PTCOV_REPORT="):].strip()
+                if not self.report_index["verified"]:
+                    self.report_index["verified"] = True
+                    self.save_report_index()
+        if not remote_path and not self.report_index["verified"]:
+            remote_path = self.probe_report_locations(container)
+            if remote_path and self.exec_only:
+                # The probe fixed the index; merge the .exec files it found
+                res = self.container_exec(container, self.exec_collect_script(stage_path), silent=True)
+                remote_path = (stage_path or MERGED_EXEC) if "PTCOV_REPORT=" in res.stdout else ""
+            elif remote_path and stage_path:
+                moved = self.container_exec(container, f"f={shlex.quote(remote_path)}; {stage_script(stage_path)}", silent=True)
+                remote_path = stage_path if moved.returncode == 0 else ""
+        phases["locate"] = time.monotonic() - start
+
+        job = (container, test_id, local_xml, res, remote_path, started, phases)
+        return job if stage else self.collect_report(*job)
+
+    def collect_report(self, container, test_id, local_xml, res, remote_path, started, phases):
+        """Copy the report of a finished test run out of the container; returns the ledger outcome"""
+        start = time.monotonic()
+        local_path = local_xml[:-len(".xml")] + ".exec" if self.exec_only else local_xml
         if remote_path:
-            # print(f"   📄 Found report: {remote_path}")
+            # self.log(f"   📄 Found report: {remote_path}")
             if remote_path.startswith("./"): remote_path = remote_path[2:]
-            os.makedirs(os.path.dirname(local_xml), exist_ok=True)
-            run_cmd(f"docker cp {CONTAINER_NAME}:{REMOTE_WORKDIR}/{remote_path} {local_xml}", silent=True)
+            if not remote_path.startswith("/"): remote_path = f"{self.remote_workdir}/{remote_path}"
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            # Copy to a per-container partial file first, so an interrupted copy is never
+            # mistaken for a finished report by the resume check
+            part_path = f"{local_path}.{container}.part"
+            self.copy_from_container(container, remote_path, part_path, silent=True)
+            if os.path.exists(part_path):
+                os.replace(part_path, local_path)
+            if remote_path.startswith(COLLECT_DIR):
+                with self.log_lock:
+                    self.collected_stage.setdefault(container, []).append(remote_path)
+        phases["collect"] = phases.pop("locate", 0.0) + time.monotonic() - start
+        if not os.path.exists(local_path):
+            self.log(f"   ⚠️ No {'exec' if self.exec_only else 'XML'} for {test_id}")
+        self.trace_test_phases(res, started, phases)
+        return test_outcome(res, local_path, phases)
+
+    def run_test_batch(self, container, batch):
+        """Run a batch of (index, test_id, local_xml) in one test JVM, one JaCoCo dump per test
+
+        Returns {test_id: outcome} for the run ledger; batch timings are split evenly over its tests.
+        """
+        started = time.monotonic()
+        # Clean up dumps of the previous batch (indexed reports are cleaned by the test command itself)
+        self.container_exec(container, f"rm -rf {BATCH_DUMP_DIR} && mkdir -p {BATCH_DUMP_DIR}", silent=True)
+
+        env = {"PTCOV_DUMP_DIR": BATCH_DUMP_DIR}
+        log_name = f"batch_{safe_test_name(batch[0][1])}"
+        # The per-test limit scales with the batch size
+        timeout = self.test_timeout * len(batch)
+        if self.build_system == "maven":
+            # Surefire selects several methods of a class with Class#m1+m2, classes separated by commas
+            by_class = OrderedDict()
+            for _, test_id, _ in batch:
+                cls, method = test_id.split("#", 1)
+                by_class.setdefault(cls, []).append(method)
+            selector = ",".join(f"{cls}#{'+'.join(methods)}" for cls, methods in by_class.items())
+            res = self.run_maven_tests(container, shlex.quote(selector), env=env, collect=False, log_name=log_name, timeout=timeout,
+                                       extra=f"-Dmaven.test.additionalClasspath={self.remote_workdir}/ptcov-listener.jar", report=False)
+        elif self.build_system == "gradle":
+            # The init script chains jacocoTestReport after every test task; the dumps are converted below instead
+            if self.gradle_daemon:
+                cmd, filter_env = self.warm_gradle_command([test_id.replace('#', '.') for _, test_id, _ in batch], "-x jacocoTestReport")
+                env = dict(env, **filter_env)
+            else:
+                filters = " ".join(f"--tests {shlex.quote(test_id.replace('#', '.'))}" for _, test_id, _ in batch)
+                cmd = f"./gradlew test {filters} -x jacocoTestReport -I jacoco_init.gradle --no-daemon"
+            res = self.run_test_command(container, cmd, env=env, collect=False, log_name=log_name, timeout=timeout)
+            self.check_gradle_daemon(container, res)
+        phases = {"run": time.monotonic() - started}
+
+        if "PTCOV_TIMEOUT" in res.stdout:
+            # Tests that finished before the limit still have their dumps
+            self.log(f"   ⏰ Batch of {len(batch)} tests timed out after {timeout}s, build process tree killed.")
+        elif res.returncode != 0:
+            self.log(f"   ❌ Build/Test Failed for batch of {len(batch)} tests. See: python run_ledger.py failures {self.container_name}")
+
+        # Convert every per-test .exec into XML inside the container (unless the reports are built
+        # offline), then copy all of them out at once
+        if not self.exec_only:
+            start = time.monotonic()
+            script = batch_listener.REPORT_SCRIPT.format(dump=BATCH_DUMP_DIR, tasks=BATCH_TASKS, cli=f"{self.remote_workdir}/jacococli.jar",
+                                                         bulk_jar=f"{self.remote_workdir}/ptcov-bulk.jar")
+            rep = self.container_exec(container, script, silent=True)
+            if rep.returncode != 0 or re.search(r"^done \d+ failed [1-9]", rep.stdout, re.M):
+                self.log(f"   ⚠️ Report generation for the batch had errors:\n{(rep.stdout + rep.stderr)[-2000:]}")
+            phases["report"] = time.monotonic() - start
+
+        start = time.monotonic()
+        local_dump = os.path.join(os.path.dirname(batch[0][2]), f".batch_{container}")
+        force_cleanup(local_dump)
+        self.copy_from_container(container, BATCH_DUMP_DIR, local_dump, silent=True)
+
+        ext = ".exec" if self.exec_only else ".xml"
+        targets = {}
+        for _, test_id, local_xml in batch:
+            dumped = os.path.join(local_dump, f"{safe_test_name(test_id)}{ext}")
+            targets[test_id] = local_xml[:-len(".xml")] + ext
+            if os.path.exists(dumped):
+                os.replace(dumped, targets[test_id])
+            else:
+                self.log(f"   ⚠️ No {ext[1:]} for {test_id}")
+        force_cleanup(local_dump)
+        phases["collect"] = time.monotonic() - start
+        self.trace_test_phases(res, started, phases, prefix="batch")
+
+        share = {k: v / len(batch) for k, v in phases.items()}
+        return {test_id: test_outcome(res, path, share) for test_id, path in targets.items()}
+
+    def trace_test_phases(self, res, started, phases, prefix="test"):
+        """Record the phases of a test (or batch) run as consecutive spans, plus surefire's own test time vs. build overhead"""
+        at = started
+        for name, seconds in phases.items():
+            self.trace.record(f"{prefix} {name}", at, seconds, "test")
+            at += seconds
+        in_tests = surefire_seconds(res.stdout)
+        if in_tests and "run" in phases:
+            self.trace.record(f"{prefix} surefire tests", started + max(0.0, phases["run"] - in_tests), in_tests, "test")
+            self.trace.record(f"{prefix} build overhead", started, max(0.0, phases["run"] - in_tests), "test")
+
+    def step4_collect_class_dirs(self):
+        """Step 4 (exec-only mode): copy the compiled main classes out once for offline report generation"""
+        self.log(f"\n📚 Step 4: Copying compiled classes of [{self.container_name}]...")
+        res = self.container_exec(self.container_name, "find . -type d \\( -path '*/target/classes' -o -path '*/build/classes/java/main' \\) -not -path '*/node_modules/*'", silent=True)
+        class_dirs = [d.strip() for d in res.stdout.splitlines() if d.strip()]
+        classes_root = os.path.join(self.output_dir, self.container_name, "classes")
+        force_cleanup(classes_root)
+        for d in class_dirs:
+            rel = d[2:] if d.startswith("./") else d
+            local_dir = os.path.join(classes_root, rel)
+            os.makedirs(os.path.dirname(local_dir), exist_ok=True)
+            self.copy_from_container(self.container_name, f"{self.remote_workdir}/{rel}", local_dir, silent=True)
+        self.log(f"   ✅ Copied {len(class_dirs)} class directories to {classes_root}")
+        self.log(f"   👉 Build the reports with: python offline_report.py {self.container_name} --input-root {self.output_dir}")
+
+    def start_worker_containers(self, count):
+        """Snapshot the prepared container and start `count` worker containers from it"""
+        image = f"ptcov-snapshot-{self.container_name}".lower()
+        self.log(f"\n🧬 Snapshotting {self.container_name} as {image} for {count} workers...")
+        res = self.run_cmd(f"docker commit {self.container_name} {image}")
+        if res.returncode != 0:
+            raise RunnerError(f"Failed to snapshot container: {res.stderr}")
+
+        workers = []
+        for i in range(count):
+            name = f"{self.container_name}-ptw{i}"
+            self.run_cmd(f"docker rm -f {name}", silent=True)
+            # Override the entrypoint so the worker stays alive regardless of the image's own command
+            limits = docker_limit_options(self.container_limits)
+            res = self.run_cmd(f"docker run -d --name {name} -w {self.remote_workdir} {limits} --entrypoint tail {image} -f /dev/null")
+            if res.returncode != 0:
+                self.log(f"   ⚠️ Failed to start worker {name}: {res.stderr.strip()}")
+                continue
+            workers.append(name)
+
+        if not workers:
+            raise RunnerError("No worker containers could be started.")
+        self.log(f"   ✅ Started {len(workers)} worker containers.")
+        return workers, image
+
+    def stop_worker_containers(self, workers, image):
+        """Remove worker containers and the snapshot image"""
+        self.log(f"\n🧹 Removing {len(workers)} worker containers...")
+        for name in workers:
+            with self.session_lock:
+                session = self.sessions.pop(name, None)
+            if session: session.close()
+            self.run_cmd(f"docker rm -f {name}", silent=True)
+        self.run_cmd(f"docker rmi {image}", silent=True)
+
+    def report_exists(self, category, test_id):
+        base = os.path.join(self.output_dir, self.container_name, category, safe_test_name(test_id))
+        if self.report_store is not None and self.report_store.has(category, safe_test_name(test_id)):
+            return True
+        return os.path.exists(f"{base}.xml") or (self.exec_only and os.path.exists(f"{base}.exec"))
+
+    def store_report(self, category, test_id):
+        """Move a test's freshly copied XML into the report store (--store-reports); on errors the loose file stays"""
+        if self.report_store is None: return
+        name = safe_test_name(test_id)
+        path = os.path.join(self.output_dir, self.container_name, category, f"{name}.xml")
+        if not os.path.exists(path): return
+        try:
+            self.report_store.put(category, name, path)
+        except (OSError, RuntimeError) as e:
+            self.log(f"   ⚠️ Could not store the report of {test_id}, keeping {path}: {e}")
+
+    def discard_report(self, category, test_id):
+        """Delete the report (and .exec) of a test, loose or stored"""
+        name = safe_test_name(test_id)
+        if self.report_store is not None:
+            self.report_store.remove(category, name)
+        base = os.path.join(self.output_dir, self.container_name, category, name)
+        for path in (f"{base}.xml", f"{base}.exec"):
+            if os.path.exists(path): os.remove(path)
+
+    def record_inputs(self, category, test_id):
+        """--incremental: fingerprint the inputs of a test that just finished ok"""
+        if not self.source_snapshot: return
+        covered = None
+        if not self.exec_only:
+            name = safe_test_name(test_id)
+            report = self.report_store.get(category, name) if self.report_store is not None else None
+            report = report or os.path.join(self.output_dir, self.container_name, category, f"{name}.xml")
+            try:
+                covered = covered_sources(report)
+            except Exception as e:
+                self.log(f"   ⚠️ Could not read the covered sources of {test_id}, fingerprinting all main sources: {e}")
+        self.ledger.record_inputs(category, test_id, self.source_snapshot.fingerprint(test_id, covered), covered)
+
+    def finish_test(self, category, test_id, outcome):
+        """Store the report of a finished test, fingerprint its inputs and record the outcome in the ledger"""
+        if outcome["state"] == "ok":
+            self.store_report(category, test_id)
+            self.record_inputs(category, test_id)
+        self.ledger.finish(category, test_id, **outcome)
+
+    def register_tests(self, test_list, category):
+        """Add tests to the run ledger; reports already on disk from before the ledger existed count as ok"""
+        self.ledger.register(category, test_list, done=lambda test_id: self.report_exists(category, test_id))
+
+    def schedule_jobs(self, job_list, workers):
+        """Order jobs by the duration estimates from earlier runs (see --order)
+
+        Longest-first keeps parallel workers evenly loaded at the end of a run (LPT);
+        shortest-first gives the most finished tests early. Without an explicit --order the
+        tests of a sample plan keep its order, so a run cut short still covered a stratified sample.
+        """
+        order = self.schedule_order
+        if order is None:
+            order = "none" if self.plan_order else "auto"
+        if order == "auto":
+            order = "longest" if workers else "none"
+        if order == "none" or len(job_list) < 2:
+            return job_list
+        estimates = self.ledger.estimates([test_id for job in job_list for _, test_id, _ in job])
+        cost = lambda job: sum(estimates[test_id] for _, test_id, _ in job)
+        ordered = sorted(job_list, key=cost, reverse=(order == "longest"))
+        total = sum(cost(job) for job in job_list)
+        if total:
+            self.log(f"   ⏱️ Scheduling {len(job_list)} jobs {order}-first, estimated {total / 60:.1f} min of test time"
+                     f"{f' (~{total / 60 / len(workers):.1f} min with {len(workers)} workers)' if workers else ''}")
+        return ordered
+
+    def step3_run_tests_loop(self, test_list, category, workers=None, batch_mode=None):
+        """Step 3: Loop through tests and save XML (in parallel when worker containers are given)
+
+        With batch_mode "class" (or "all") the tests of one class (or all pending tests)
+        share a single test JVM and per-test coverage comes from the dump listener.
+        With --pipeline (single-test mode) reports are collected, and optionally converted
+        to CSV, by a ReportPipeline while the next test runs.
+        """
+        self.log(f"\n🚀 Step 3: Running {len(test_list)} {category} tests...")
+    
+        # Create a subdirectory for current project to prevent different projects from mixing
+        # e.g. ./experiment_data/sag-commons-math/pt/
+        # This way when you run multiple projects, data is isolated
+        project_output_dir = os.path.join(self.output_dir, self.container_name, category)
+
+        # Resume from the ledger (reports from before the ledger existed count as done)
+        self.register_tests(test_list, category)
+        states = self.ledger.states(category)
+        selected = set(self.ledger.select(category, test_list, self.retry_failed, self.only_status))
+    
+        pending = []
+        for i, test_id in enumerate(test_list):
+            local_xml = os.path.join(project_output_dir, f"{safe_test_name(test_id)}.xml")
+            # A report deleted since it was recorded as ok is run again
+            lost = not self.only_status and states.get(test_id) == "ok" and not self.report_exists(category, test_id)
+            if test_id not in selected and not lost:
+                self.log(f"   [{i+1}/{len(test_list)}] Skipping {test_id} ({states.get(test_id, 'Done')})")
+                continue
+            pending.append((i, test_id, local_xml))
+
+        if batch_mode:
+            groups = OrderedDict()
+            for item in pending:
+                key = item[1].split("#", 1)[0] if batch_mode == "class" else "all"
+                groups.setdefault(key, []).append(item)
+            os.makedirs(project_output_dir, exist_ok=True)
+            job_list = list(groups.values())
         else:
-            print(f"   ⚠️ No XML for {test_id}")
+            job_list = [[item] for item in pending]
+
+        jobs = queue.Queue()
+        for job in self.schedule_jobs(job_list, workers):
+            jobs.put(job)
+
+        pipeline = None
+        if self.pipeline and not batch_mode:
+            containers = len(workers) if workers else 1
+            pipeline = ReportPipeline(self, category, collectors=min(4, containers), queue_size=2 * containers,
+                                      csv_root=self.convert_csv, convert_jobs=self.convert_jobs)
+            pipeline.start()
+            # Reports of earlier runs that never made it to CSV
+            pipeline.catch_up([os.path.join(project_output_dir, f"{safe_test_name(t)}.xml")
+                               for t in test_list if states.get(t) == "ok"])
+
+        def worker_loop(container):
+            while True:
+                try:
+                    batch = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                where = f" @ {container}" if workers else ""
+                for _, test_id, _ in batch:
+                    self.ledger.mark_running(category, test_id)
+                try:
+                    if batch_mode:
+                        first = batch[0][0]
+                        self.log(f"   [{first+1}/{len(test_list)}] Running batch of {len(batch)}: {batch[0][1].split('#')[0]}{where}")
+                        outcomes = self.run_test_batch(container, batch)
+                    else:
+                        i, test_id, local_xml = batch[0]
+                        self.log(f"   [{i+1}/{len(test_list)}] Running: {test_id}{where}")
+                        if pipeline:
+                            # The collector records the outcome once the report is on the host
+                            pipeline.submit(self.run_single_test(container, test_id, local_xml, stage=True))
+                            continue
+                        outcomes = {test_id: self.run_single_test(container, test_id, local_xml)}
+                except Exception as e:
+                    self.log(f"   ❌ Worker {container} crashed on {batch[0][1]}: {e}")
+                    outcomes = {test_id: {"state": "failed", "log": f"runner error: {e}"} for _, test_id, _ in batch}
+                for test_id, outcome in outcomes.items():
+                    self.finish_test(category, test_id, outcome)
+
+        try:
+            if not workers:
+                worker_loop(self.container_name)
+            else:
+                threads = [threading.Thread(target=worker_loop, args=(name,), daemon=True) for name in workers]
+                for t in threads: t.start()
+                for t in threads: t.join()
+        finally:
+            if pipeline: pipeline.close()
+        self.report_compile_once_savings()
+
+def add_runner_arguments(parser):
+    """Options shared by auto_runner.py and orchestrator.py"""
+    parser.add_argument("--jar", default="test-parser-1.0-SNAPSHOT-jar-with-dependencies.jar", help="Path to parser JAR")
+    parser.add_argument("--out", default="./experiment_data", help="Root output directory")
+    parser.add_argument("--ratio", type=float, default=3.0, help="Non-PT sampling ratio (default: 3.0)")
+    parser.add_argument("--workdir", default="/app", help="Remote working directory in container (default: /app)")
+    parser.add_argument("--batch", choices=["class", "all"], default=None, help="Run a whole test class (or all selected tests) in one test JVM with per-test JaCoCo dumps")
+    parser.add_argument("--jacoco-cli", default="jacococli.jar", help="Path to JaCoCo CLI jar (used by --batch)")
+    parser.add_argument("--compile-once", action="store_true", help="Maven only: run test-compile once, then only the surefire/jacoco goals offline per test")
+    parser.add_argument("--fast-profile", action="store_true", help=f"Maven only: inject and activate the {FAST_PROFILE_ID} profile (skips lint/report plugins, cheaper surefire forks)")
+    parser.add_argument("--engine-api", nargs="?", const="", default=None, metavar="SOCKET",
+                        help="Use the Docker Engine API over its Unix socket instead of the docker CLI (default socket: $DOCKER_HOST or /var/run/docker.sock)")
+    parser.add_argument("--stream-logs", action="store_true", help="Stream build output to OUTPUT_DIR/<container>/logs/<test>.log instead of keeping it in memory")
+    parser.add_argument("--exec-only", action="store_true", help="Collect only per-test jacoco .exec files and copy classes once; build reports later with offline_report.py")
+    parser.add_argument("--compress-transfer", action="store_true", help="gzip the test source stream of the parser step (helps on slow Docker hosts)")
+    parser.add_argument("--refresh-parser", action="store_true", help="Re-run the parser even if the test sources match a cached result")
+    parser.add_argument("--retry-failed", action="store_true", help="Also re-run tests recorded as failed, no-xml or timeout in the run ledger")
+    parser.add_argument("--only-status", default=None, metavar="STATES",
+                        help=f"Run only tests whose ledger state is in this comma-separated list ({', '.join(STATES)})")
+    parser.add_argument("--timeout", type=int, default=0, help="Per-test wall-clock limit in seconds; the build's process tree is killed in the container (default: no limit)")
+    parser.add_argument("--order", choices=["auto", "longest", "shortest", "none"], default=None,
+                        help="Order tests by durations from earlier runs (auto: longest-first with --workers, else as listed; "
+                             "default: the order of the sample plan)")
+    parser.add_argument("--trace", action="store_true", help="Write a Chrome trace-event JSON of all phases to OUTPUT_DIR/<container>/trace_<time>.json")
+    parser.add_argument("--workers", type=int, default=1, help="Number of cloned worker containers to run tests in parallel (default: 1)")
+    parser.add_argument("--pipeline", action="store_true", help="Copy each report out (and convert it with --convert-csv) in the background while the next test runs")
+    parser.add_argument("--convert-csv", nargs="?", const="coverage_csvs", default=None, metavar="CSV_ROOT",
+                        help="With --pipeline: convert collected XMLs to CSV as xml_validator does (default root: coverage_csvs)")
+    parser.add_argument("--convert-jobs", type=int, default=1, help="Converter processes for --convert-csv (default: 1)")
+    parser.add_argument("--gradle-daemon", action="store_true",
+                        help="Gradle only: reuse one warm daemon per container with the configuration and build cache instead of --no-daemon builds")
+    parser.add_argument("--daemon-max-runs", type=int, default=50, help="Restart the warm Gradle daemon after this many builds (default: 50, 0 = never)")
+    parser.add_argument("--daemon-max-rss", type=int, default=0, help="Restart the warm Gradle daemon once its RSS exceeds this many MB (default: no limit)")
+    parser.add_argument("--daemon-heap", default=None, help="Maximum heap of the warm Gradle daemon, e.g. 2g (default: Gradle's own)")
+    parser.add_argument("--seed", type=int, default=None, help="Sampling seed (default: the seed of OUTPUT_DIR/<container>/sample_plan.json, else random)")
+    parser.add_argument("--time-budget", default=None, help="Wall-clock budget per project, e.g. 12h or 1h30m: PTs and Non-PTs are sampled down to fit it")
+    parser.add_argument("--stratify", choices=STRATA, default="class", help="Spread the sample over test classes or packages (default: class)")
+    parser.add_argument("--probe-tests", type=int, default=5, help="With --time-budget and no recorded durations: PTs to run first to estimate costs (default: 5)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Fingerprint each test's sources, covered classes and build files; later runs re-run only tests whose inputs changed")
+    parser.add_argument("--store-reports", nargs="?", const="gzip", default=None, choices=["gzip", "zstd"],
+                        help="Keep XML reports deduplicated and compressed in OUTPUT_DIR/<container>/reports/ (default codec: gzip)")
+
+def runner_options(parser, args):
+    """ProjectRunner keyword arguments from parsed command line arguments"""
+    only_status = None
+    if args.only_status:
+        only_status = [st.strip() for st in args.only_status.split(",") if st.strip()]
+        unknown = [st for st in only_status if st not in STATES]
+        if unknown:
+            parser.error(f"unknown ledger state(s): {', '.join(unknown)}")
+    return {
+        "parser_jar": args.jar,
+        "output_dir": args.out,
+        "sample_ratio": args.ratio,
+        "remote_workdir": args.workdir,
+        "workers": args.workers,
+        "batch_mode": args.batch,
+        "jacoco_cli_jar": args.jacoco_cli,
+        "compile_once": args.compile_once,
+        "fast_profile": args.fast_profile,
+        "engine_api": args.engine_api is not None,
+        "engine_socket": args.engine_api or "",
+        "stream_logs": args.stream_logs,
+        "exec_only": args.exec_only,
+        "refresh_parser": args.refresh_parser,
+        "compress_transfer": args.compress_transfer,
+        "retry_failed": args.retry_failed,
+        "only_status": only_status,
+        "test_timeout": args.timeout,
+        "schedule_order": args.order,
+        "trace": args.trace,
+        "pipeline": args.pipeline,
+        "convert_csv": args.convert_csv,
+        "convert_jobs": args.convert_jobs,
+        "store_reports": args.store_reports,
+        "gradle_daemon": args.gradle_daemon,
+        "daemon_max_runs": args.daemon_max_runs,
+        "daemon_max_rss": args.daemon_max_rss,
+        "daemon_heap": args.daemon_heap,
+        "sample_seed": args.seed,
+        "time_budget": args.time_budget,
+        "stratify": args.stratify,
+        "probe_tests": args.probe_tests,
+        "incremental": args.incremental,
+    }
 
 if __name__ == "__main__":
     # === Parameter parsing ===
@@ -299,49 +1549,15 @@ if __name__ == "__main__":
     parser.add_argument("container_name", help="The Docker container name (e.g., sag-commons-math)")
     
     # Optional parameters
-    parser.add_argument("--jar", default="test-parser-1.0-SNAPSHOT-jar-with-dependencies.jar", help="Path to parser JAR")
-    parser.add_argument("--out", default="./experiment_data", help="Root output directory")
-    parser.add_argument("--ratio", type=float, default=3.0, help="Non-PT sampling ratio (default: 3.0)")
-    parser.add_argument("--workdir", default="/app", help="Remote working directory in container (default: /app)")
-    
+    add_runner_arguments(parser)
     args = parser.parse_args()
-    
-    # Assign to global variables
-    CONTAINER_NAME = args.container_name
-    PARSER_JAR_NAME = args.jar
-    OUTPUT_DIR = args.out
-    SAMPLE_RATIO = args.ratio
-    REMOTE_WORKDIR = args.workdir
-
-    print(f"🔥 Starting Auto Runner for: {CONTAINER_NAME}")
-    print(f"   Parser: {PARSER_JAR_NAME}")
-    print(f"   Output: {OUTPUT_DIR}/{CONTAINER_NAME}")
-
-    # 0. Pre-check
-    step0_check_tests_existence()
-
-    # 1. Preparation
-    step1_prepare_environment()
-    
-    # 2. Identification
-    pts, nonpts = step2_run_parser_and_get_tests()
-    print(f"📊 Found: {len(pts)} PTs, {len(nonpts)} Non-PTs")
-    
-    if not pts and not nonpts:
-        print("❌ No tests found. Exiting.")
-        sys.exit(0)
-
-    # 3. Sampling
-    target_count = int(len(pts) * SAMPLE_RATIO)
-    if nonpts:
-        selected_nonpts = random.sample(nonpts, min(len(nonpts), max(1, target_count)))
-    else:
-        selected_nonpts = []
-        
-    print(f"🎯 Plan: Run {len(pts)} PTs + {len(selected_nonpts)} Non-PTs")
-        
-    # 4. Execution
-    if pts: step3_run_tests_loop(pts, "pt")
-    if selected_nonpts: step3_run_tests_loop(selected_nonpts, "nonpt")
-    
-    print(f"\n🎉 Finished {CONTAINER_NAME}!")
\ No newline at end of file
+
+    try:
+        runner = ProjectRunner(args.container_name, **runner_options(parser, args))
+    except ValueError as e: # e.g. an invalid --time-budget
+        parser.error(str(e))
+    try:
+        runner.run()
+    except RunnerError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,151 @@
+# JUnit Platform listener used by auto_runner's batch mode.
+#
+# The listener is compiled inside the container (against the junit-platform jars
+# already present in the local Maven/Gradle caches) and put on the test runtime
+# classpath. At each test boundary it resets the JaCoCo agent and dumps the
+# execution data of that single test to <PTCOV_DUMP_DIR>/<safe test name>.exec
+# (auto_runner's safe_test_name of Class#method, nested classes as Outer.Inner),
+# so one JVM can run many tests and still produce per-test coverage.
+#
+# Coverage recorded while a test class starts (static initializers, @BeforeAll) is
+# kept per class and added to the dump of each of its tests. Static initializers of
+# other classes only run once per JVM, so they count for the first test reaching
+# them. Coverage of @AfterAll methods is dropped.
+
+LISTENER_CLASS = "ptcoverage.JacocoPerTestListener"
+
+LISTENER_SOURCE = """
+package ptcoverage;
+
+import java.io.ByteArrayOutputStream;
+import java.io.FileOutputStream;
+import java.io.OutputStream;
+import java.lang.reflect.Method;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.util.ArrayDeque;
+import java.util.Deque;
+
+import org.junit.platform.engine.TestExecutionResult;
+import org.junit.platform.engine.TestSource;
+import org.junit.platform.engine.support.descriptor.ClassSource;
+import org.junit.platform.engine.support.descriptor.MethodSource;
+import org.junit.platform.launcher.TestExecutionListener;
+import org.junit.platform.launcher.TestIdentifier;
+
+public class JacocoPerTestListener implements TestExecutionListener {
+
+    private final Path dumpDir;
+    private Object agent;
+    private Method getExecutionData;
+    // Coverage recorded by the running test class and its enclosing classes (outermost first)
+    private final Deque<ByteArrayOutputStream> classData = new ArrayDeque<>();
+
+    public JacocoPerTestListener() {
+        String dir = System.getenv("PTCOV_DUMP_DIR");
+        dumpDir = Paths.get(dir != null ? dir : "/tmp/ptcov-exec");
+        try {
+            // Access the agent reflectively so the listener does not need jacoco on its compile classpath
+            ClassLoader loader = ClassLoader.getSystemClassLoader();
+            Class<?> rt = Class.forName("org.jacoco.agent.rt.RT", true, loader);
+            Class<?> iAgent = Class.forName("org.jacoco.agent.rt.IAgent", true, loader);
+            agent = rt.getMethod("getAgent").invoke(null);
+            getExecutionData = iAgent.getMethod("getExecutionData", boolean.class);
+            Files.createDirectories(dumpDir);
+        } catch (Throwable t) {
+            System.err.println("[ptcov] JaCoCo agent not available, per-test dumps disabled: " + t);
+            agent = null;
+        }
+    }
+
+    private static boolean isClass(TestIdentifier id) {
+        return id.isContainer() && id.getSource().orElse(null) instanceof ClassSource;
+    }
+
+    // Same as auto_runner's safe_test_name
+    private static String safeName(String testId) {
+        return testId.replace('#', '_').replace('.', '_');
+    }
+
+    // Execution data since the last call; resets the agent
+    private byte[] collect() throws Exception {
+        return (byte[]) getExecutionData.invoke(agent, true);
+    }
+
+    @Override
+    public void executionStarted(TestIdentifier id) {
+        if (agent == null || !(id.isTest() || isClass(id))) return;
+        try {
+            // What ran since the last boundary belongs to the enclosing class (nothing outside of one)
+            byte[] data = collect();
+            if (!classData.isEmpty()) classData.peekLast().write(data, 0, data.length);
+            if (isClass(id)) classData.addLast(new ByteArrayOutputStream());
+        } catch (Throwable t) {
+            System.err.println("[ptcov] reset failed: " + t);
+        }
+    }
+
+    @Override
+    public void executionFinished(TestIdentifier id, TestExecutionResult result) {
+        if (agent == null || !(id.isTest() || isClass(id))) return;
+        byte[] data;
+        try {
+            data = collect();
+        } catch (Throwable t) {
+            System.err.println("[ptcov] dump failed for " + id.getDisplayName() + ": " + t);
+            return;
+        } finally {
+            if (isClass(id)) classData.pollLast();
+        }
+        TestSource source = id.getSource().orElse(null);
+        if (!id.isTest() || !(source instanceof MethodSource)) return;
+        MethodSource ms = (MethodSource) source;
+        // Nested classes are Outer$Inner in the bytecode but Outer.Inner in the parser's test ids
+        String testId = ms.getClassName().replace('$', '.') + "#" + ms.getMethodName();
+        Path out = dumpDir.resolve(safeName(testId) + ".exec");
+        // Append so that all invocations of a parameterized test merge into one session file
+        try (OutputStream os = new FileOutputStream(out.toFile(), true)) {
+            for (ByteArrayOutputStream shared : classData) shared.writeTo(os);
+            os.write(data);
+        } catch (Throwable t) {
+            System.err.println("[ptcov] dump failed for " + out + ": " + t);
+        }
+    }
+}
+"""
+
+# Compiles the listener into {jar} and offline_report's BulkReport into {bulk_jar}.
+# Needs the JDK of the container and the junit-platform jars from the local
+# repository caches (populated by a first build).
+BUILD_SCRIPT = """
+set -e
+find_jar() {{ find / \\( -path /proc -o -path /sys \\) -prune -o -name "$1-[0-9]*.jar" -not -name '*sources*' -not -name '*javadoc*' -print 2>/dev/null | sort | tail -n 1; }}
+CP=""
+for a in junit-platform-launcher junit-platform-engine junit-platform-commons opentest4j; do
+    J=$(find_jar $a)
+    if [ -z "$J" ]; then echo "MISSING $a"; exit 3; fi
+    CP="$CP:$J"
+done
+rm -rf /tmp/ptcov-listener && mkdir -p /tmp/ptcov-listener/META-INF/services
+javac -nowarn -d /tmp/ptcov-listener -cp "$CP" {src}
+echo {cls} > /tmp/ptcov-listener/META-INF/services/org.junit.platform.launcher.TestExecutionListener
+jar cf {jar} -C /tmp/ptcov-listener .
+rm -rf /tmp/ptcov-bulk && mkdir -p /tmp/ptcov-bulk
+javac -nowarn -d /tmp/ptcov-bulk -cp {cli} {bulk_src}
+jar cf {bulk_jar} -C /tmp/ptcov-bulk .
+"""
+
+# Turns every <dump>/*.exec into a sibling .xml in one JVM (BulkReport, which reads and
+# analyzes the compiled main classes of all modules once for the whole batch).
+REPORT_SCRIPT = """
+CF=""
+for d in $(find . -type d \\( -path '*/target/classes' -o -path '*/build/classes/java/main' \\) -not -path '*/node_modules/*'); do CF="$CF $d"; done
+: > {tasks}
+for f in {dump}/*.exec; do
+    [ -f "$f" ] || continue
+    printf '%s\\t%s\\n' "$f" "${{f%.exec}}.xml" >> {tasks}
+done
+[ -s {tasks} ] || exit 0
+java -cp {cli}:{bulk_jar} BulkReport {tasks} xml $CF
+"""
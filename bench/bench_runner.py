@@ -0,0 +1,127 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from auto_runner import ProjectRunner
+from run_ledger import RunLedger
+from results import new_results, add_case, save_results
+
+# End-to-end benchmark of auto_runner's per-test orchestration (step 3) against the
+# fake docker/mvn in bench/fakebin: container commands, report lookup and copies,
+# ledger updates and worker scheduling, with the build itself reduced to a sleep.
+#
+#   python bench/bench_runner.py --tests 100 --workers 1 4 --mvn-seconds 0.2 --docker-latency 0.02
+#
+# overhead_per_test_ms is what the runner adds on top of the simulated build:
+# (wall clock x containers - build seconds) / tests.
+
+CONTAINER = "ptcov-bench"
+
+def fake_environment(root, args):
+    """Environment variables for bench/fakebin/docker and mvn"""
+    return {
+        "PATH": os.path.join(BENCH_DIR, "fakebin") + os.pathsep + os.environ.get("PATH", ""),
+        "PTCOV_FAKE_ROOT": root,
+        "PTCOV_FAKE_WORKDIR": "/app",
+        "PTCOV_FAKE_DOCKER_LATENCY": str(args.docker_latency),
+        "PTCOV_FAKE_MVN_SECONDS": str(args.mvn_seconds),
+        "PTCOV_FAKE_MVN_JITTER": str(args.jitter),
+        "PTCOV_FAKE_REPORT": args.report,
+        "PTCOV_FAKE_FAIL_RATE": str(args.fail_rate),
+    }
+
+def create_container(root):
+    """A fake container holding a one-module Maven project"""
+    app = os.path.join(root, "containers", CONTAINER, "app")
+    os.makedirs(os.path.join(app, "src", "test", "java"), exist_ok=True)
+    with open(os.path.join(app, "pom.xml"), "w") as f:
+        f.write("<project><modelVersion>4.0.0</modelVersion><groupId>org.bench</groupId>"
+                "<artifactId>bench</artifactId><version>1.0</version></project>\n")
+
+def bench_case(root, args, workers):
+    """One timed step 3 over --tests tests; returns the metrics"""
+    shutil.rmtree(root, ignore_errors=True)
+    create_container(root)
+    output_dir = os.path.join(root, "experiment_data")
+    tests = [f"org.bench.C{i // args.methods_per_class}Test#test{i % args.methods_per_class}" for i in range(args.tests)]
+
+    with open(os.devnull, "w") as devnull:
+        runner = ProjectRunner(CONTAINER, output_dir=output_dir, workers=workers, compile_once=args.compile_once,
+                               test_timeout=args.timeout, stream_logs=args.stream_logs, pipeline=args.pipeline,
+                               convert_csv=os.path.join(root, "coverage_csvs") if args.convert_csv else None,
+                               store_reports=args.store_reports,
+                               out=None if args.verbose else devnull)
+        runner.ledger = RunLedger.open(CONTAINER, output_dir)
+        runner.ledger.start_run(runner.options)
+        runner.prepare_report_index()
+        if args.compile_once:
+            runner.step1c_compile_once()
+        worker_names, image = None, None
+        if workers > 1:
+            worker_names, image = runner.start_worker_containers(workers)
+        start = time.monotonic()
+        try:
+            runner.step3_run_tests_loop(tests, "pt", worker_names)
+            wall = time.monotonic() - start
+        finally:
+            if worker_names:
+                runner.stop_worker_containers(worker_names, image)
+            runner.ledger.finish_run()
+
+    states = runner.ledger.summary()["counts"].get("pt", {})
+    runner.ledger.close()
+    rows = {r["name"]: r for r in runner.trace.table()}
+    # Expected total of the simulated builds (the jitter is symmetric)
+    build = args.tests * args.mvn_seconds
+    containers = len(worker_names) if worker_names else 1
+    metrics = {
+        "wall_s": wall,
+        "tests_per_s": args.tests / wall,
+        "overhead_per_test_ms": max(0.0, wall * containers - build) / args.tests * 1000,
+        "ok": states.get("ok", 0),
+    }
+    for name in ("test run", "test collect", "docker exec", "copy from container"):
+        if name in rows:
+            key = name.replace(" ", "_")
+            metrics[f"{key}_p50_ms"] = rows[name]["p50"] * 1000
+            metrics[f"{key}_p95_ms"] = rows[name]["p95"] * 1000
+    return metrics
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark auto_runner orchestration overhead with a fake docker/mvn")
+    parser.add_argument("--tests", type=int, default=40, help="Tests per case (default: 40)")
+    parser.add_argument("--methods-per-class", type=int, default=5, help="Test methods per test class (default: 5)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="Worker container counts to run (default: 1)")
+    parser.add_argument("--mvn-seconds", type=float, default=0.2, help="Simulated build time per test (default: 0.2)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- share of random build time variation (default: 0)")
+    parser.add_argument("--docker-latency", type=float, default=0.02, help="Simulated latency of every docker CLI call (default: 0.02)")
+    parser.add_argument("--report", default="4,10,8,6", help="Report size packages,classes,methods,lines (default: 4,10,8,6)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of tests whose build fails (default: 0)")
+    parser.add_argument("--compile-once", action="store_true", help="Run the cases in compile-once mode")
+    parser.add_argument("--timeout", type=int, default=0, help="Per-test timeout (adds the watchdog to every test)")
+    parser.add_argument("--stream-logs", action="store_true", help="Stream build output to log files")
+    parser.add_argument("--pipeline", action="store_true", help="Collect reports in the background (auto_runner --pipeline)")
+    parser.add_argument("--convert-csv", action="store_true", help="With --pipeline: also convert the reports to CSV")
+    parser.add_argument("--store-reports", nargs="?", const="gzip", default=None, choices=["gzip", "zstd"],
+                        help="Keep the reports in the content-addressed store (auto_runner --store-reports)")
+    parser.add_argument("--verbose", action="store_true", help="Show the runner's messages")
+    parser.add_argument("--output", default=None, help="Results file (default: bench/results/runner_<commit>_<time>.json)")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="ptcov_bench_runner_")
+    os.environ.update(fake_environment(root, args))
+    params = {k: v for k, v in vars(args).items() if k not in ("workers", "verbose", "output")}
+    results = new_results("runner", params)
+    try:
+        print(f"🧪 Running {args.tests} tests per case against the fake docker in {root}...")
+        for workers in args.workers:
+            add_case(results, "step3", {"workers": workers}, bench_case(root, args, workers))
+        save_results(results, args.output)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
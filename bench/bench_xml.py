@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xml_validator
+from synthetic_jacoco import generate_project, layout_from_args, add_size_arguments
+from results import new_results, add_case, save_results
+
+# Throughput and peak memory of the XML -> CSV conversion on synthetic reports.
+#
+# Every case runs in a fresh (spawned) process, so its peak RSS is not inflated by
+# earlier cases; process_project with --jobs > 1 also counts its pool workers.
+#
+#   python bench/bench_xml.py --size large --tests 200 --jobs 4
+
+PROJECT = "bench-project"
+
+def _peak_rss_mb():
+    """Peak RSS of this process and of its (finished) children, in MB"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024 # ru_maxrss is in KB on Linux
+
+def _run_case(case, input_root, output_root, jobs, result_queue):
+    """Child process: runs one case and reports (seconds, rows, peak RSS before, peak RSS after)"""
+    project_dir = os.path.join(input_root, PROJECT)
+    reports = [os.path.join(root, f) for root, _, files in os.walk(project_dir) for f in files if f.endswith(".xml")]
+    baseline = _peak_rss_mb()
+    rows = 0
+    start = time.perf_counter()
+    if case == "parse_jacoco_xml":
+        for path in reports:
+            rows += len(xml_validator.parse_jacoco_xml(path))
+    elif case == "iter_jacoco_methods":
+        for path in reports:
+            rows += sum(1 for _ in xml_validator.iter_jacoco_methods(path))
+    elif case == "iter_jacoco_counters_line":
+        for path in reports:
+            rows += sum(1 for _ in xml_validator.iter_jacoco_counters(path, "line"))
+    elif case == "process_project":
+        shutil.rmtree(output_root, ignore_errors=True)
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                stats = xml_validator.process_project(PROJECT, input_root, output_root, jobs, force=True)
+            finally:
+                sys.stdout = stdout
+        rows = stats["converted"]
+    else:
+        raise ValueError(f"Unknown case: {case}")
+    result_queue.put((time.perf_counter() - start, rows, baseline, _peak_rss_mb()))
+
+def measure(case, input_root, output_root, jobs=1):
+    ctx = multiprocessing.get_context("spawn")
+    result_queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(case, input_root, output_root, jobs, result_queue))
+    proc.start()
+    result = result_queue.get()
+    proc.join()
+    return result
+
+CASES = ("parse_jacoco_xml", "iter_jacoco_methods", "iter_jacoco_counters_line", "process_project")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JaCoCo XML parsing and CSV conversion on synthetic reports")
+    parser.add_argument("--tests", type=int, default=50, help="Number of synthetic reports (default: 50)")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1], help="Worker counts for process_project (default: 1)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest counts (default: 3)")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--work-dir", default=None, help="Where to generate the reports (default: a temporary directory)")
+    parser.add_argument("--output", default=None, help="Results file (default: bench/results/xml_<commit>_<time>.json)")
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    layout = layout_from_args(args)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="ptcov_bench_xml_")
+    input_root = os.path.join(work_dir, "experiment_data")
+    output_root = os.path.join(work_dir, "coverage_csvs")
+    try:
+        print(f"🧪 Generating {args.tests} reports ({layout.method_count} methods each) in {input_root}...")
+        shutil.rmtree(os.path.join(input_root, PROJECT), ignore_errors=True)
+        count, total_bytes = generate_project(input_root, PROJECT, layout, args.tests, args.coverage)
+        mb = total_bytes / 1e6
+        print(f"   ✅ {mb:.1f} MB, {mb / count:.2f} MB per report")
+
+        packages, classes, methods, lines = layout.dimensions
+        results = new_results("xml", {"tests": args.tests, "packages": packages, "classes": classes, "methods": methods,
+                                      "lines": lines, "coverage": args.coverage, "repeat": args.repeat})
+        for case in args.cases:
+            for jobs in (args.jobs if case == "process_project" else [1]):
+                runs = [measure(case, input_root, output_root, jobs) for _ in range(max(1, args.repeat))]
+                seconds, rows, baseline, peak = min(runs, key=lambda r: r[0])
+                add_case(results, case, {"jobs": jobs} if case == "process_project" else {}, {
+                    "seconds": seconds,
+                    "reports_per_s": count / seconds,
+                    "mb_per_s": mb / seconds,
+                    "rows": rows,
+                    "peak_rss_mb": max(r[3] for r in runs),
+                    "peak_rss_delta_mb": max(r[3] - r[2] for r in runs),
+                })
+        save_results(results, args.output)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import glob
+import platform
+import argparse
+import subprocess
+
+# Benchmark results, one JSON file per benchmark run in bench/results/:
+#
+#   {"format": 1, "suite": "xml", "commit": "<git sha>", "dirty": false, "time": "...",
+#    "host": {...}, "params": {<run options>},
+#    "cases": [{"name": "parse_jacoco_xml", "params": {...}, "metrics": {"seconds": 1.2, ...}}, ...]}
+#
+# Cases of two runs are matched by name and params, so results taken on different
+# commits (same host and options) can be compared metric by metric.
+
+RESULTS_FORMAT = 1
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Metrics where a larger value is better; for everything else smaller is better
+HIGHER_IS_BETTER = ("per_s", "throughput")
+
+def git_commit(repo_dir=None):
+    """(commit sha, dirty) of the checkout the benchmark runs on; ("unknown", False) outside git"""
+    repo_dir = repo_dir or os.path.dirname(RESULTS_DIR)
+    try:
+        sha = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_dir, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo_dir,
+                                capture_output=True, text=True).stdout
+        return sha, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+def new_results(suite, params):
+    commit, dirty = git_commit()
+    return {
+        "format": RESULTS_FORMAT,
+        "suite": suite,
+        "commit": commit,
+        "dirty": dirty,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": {
+            "node": platform.node(),
+            "machine": platform.machine(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "params": params,
+        "cases": [],
+    }
+
+def add_case(results, name, params, metrics):
+    results["cases"].append({"name": name, "params": params, "metrics": metrics})
+    shown = "  ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items())
+    print(f"   📏 {name} {json.dumps(params, sort_keys=True)}: {shown}", flush=True)
+
+def save_results(results, path=None):
+    """Writes the results (default: bench/results/<suite>_<commit>_<time>.json) and returns the path"""
+    if not path:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        dirty = "-dirty" if results["dirty"] else ""
+        path = os.path.join(RESULTS_DIR, f"{results['suite']}_{results['commit'][:10]}{dirty}_{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results saved to {path}")
+    return path
+
+def load_results(ref, suite=None):
+    """Results from a file path, or the latest results file of a commit (sha prefix) in bench/results/"""
+    if os.path.exists(ref):
+        with open(ref) as f:
+            return json.load(f)
+    pattern = f"{suite or '*'}_{ref[:10]}*.json"
+    matches = sorted(glob.glob(os.path.join(RESULTS_DIR, pattern)), key=os.path.getmtime)
+    if not matches:
+        raise FileNotFoundError(f"No results for '{ref}' in {RESULTS_DIR}")
+    with open(matches[-1]) as f:
+        return json.load(f)
+
+def _case_key(case):
+    return case["name"], json.dumps(case["params"], sort_keys=True)
+
+def compare_results(base, head, threshold=5.0, out=None):
+    """Prints every shared metric of two result sets with its relative change; returns the number of regressions"""
+    print(f"📊 {base['suite']}: {base['commit'][:10]}{' (dirty)' if base['dirty'] else ''} -> "
+          f"{head['commit'][:10]}{' (dirty)' if head['dirty'] else ''}", file=out)
+    if base["host"] != head["host"]:
+        print(f"   ⚠️ Different hosts: {base['host']} vs {head['host']}", file=out)
+    if base["params"] != head["params"]:
+        print(f"   ⚠️ Different run options: {base['params']} vs {head['params']}", file=out)
+
+    base_cases = {_case_key(c): c for c in base["cases"]}
+    regressions = 0
+    for case in head["cases"]:
+        key = _case_key(case)
+        if key not in base_cases:
+            print(f"   {case['name']} {key[1]}: only in {head['commit'][:10]}", file=out)
+            continue
+        print(f"   {case['name']} {key[1]}", file=out)
+        old_metrics = base_cases[key]["metrics"]
+        for metric, new in case["metrics"].items():
+            old = old_metrics.get(metric)
+            if not isinstance(new, (int, float)) or not isinstance(old, (int, float)):
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            better = change > 0 if any(h in metric for h in HIGHER_IS_BETTER) else change < 0
+            mark = ""
+            if abs(change) >= threshold:
+                mark = "✅" if better else "❌"
+                regressions += not better
+            print(f"      {metric:<28} {old:>12.4g} {new:>12.4g} {change:>+8.1f}% {mark}", file=out)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List and compare benchmark results across commits")
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_parser = sub.add_parser("list", help="List stored results")
+    list_parser.add_argument("--suite", default=None)
+    compare_parser = sub.add_parser("compare", help="Compare two results (file paths or commit sha prefixes)")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument("--suite", default=None, help="Suite to look up when comparing by commit (xml, runner)")
+    compare_parser.add_argument("--threshold", type=float, default=5.0, help="Changes below this percentage are not flagged (default: 5)")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for path in sorted(glob.glob(os.path.join(RESULTS_DIR, f"{args.suite or '*'}_*.json")), key=os.path.getmtime):
+            with open(path) as f:
+                results = json.load(f)
+            print(f"   {results['time']}  {results['suite']:<8} {results['commit'][:10]}{'*' if results['dirty'] else ' '} "
+                  f"{len(results['cases'])} cases  {os.path.basename(path)}")
+    else:
+        regressions = compare_results(load_results(args.base, args.suite), load_results(args.head, args.suite), args.threshold)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,165 @@
+import os
+import sys
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auto_runner import safe_test_name
+
+# Synthetic JaCoCo XML reports for the benchmarks.
+#
+# A layout (packages x classes x methods x lines per method) is fixed by its
+# dimensions and a structure seed, so every report generated from it describes the
+# same project. Which methods a report covers depends on its own seed: a test covers
+# roughly `coverage` of the methods, and all lines of a covered method.
+
+XML_HEADER = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?><!DOCTYPE report PUBLIC '
+              '"-//JACOCO//DTD Report 1.1//EN" "report.dtd">')
+
+COUNTER_TYPES = ("INSTRUCTION", "BRANCH", "LINE", "COMPLEXITY", "METHOD")
+
+# Named report sizes: (packages, classes per package, methods per class, lines per method)
+SIZES = {
+    "small": (2, 5, 5, 4),
+    "medium": (8, 25, 10, 6),
+    "large": (20, 50, 15, 8),
+}
+
+class Layout:
+    """Structure of a synthetic project: per class its methods as (name, desc, first line, instructions per line, branches)"""
+
+    def __init__(self, packages, classes, methods, lines, structure_seed=0):
+        self.dimensions = (packages, classes, methods, lines)
+        rng = random.Random(structure_seed)
+        self.packages = []
+        for p in range(packages):
+            package = f"org/bench/p{p}"
+            class_list = []
+            for c in range(classes):
+                method_list = []
+                line = 10
+                for m in range(methods):
+                    insts = [rng.randint(2, 8) for _ in range(lines)]
+                    branches = 2 * rng.randint(0, 2)
+                    method_list.append((f"m{m}", "(I)Ljava/lang/String;" if m % 2 else "()V", line, insts, branches))
+                    line += lines + 2
+                class_list.append((f"{package}/C{c}", f"C{c}.java", method_list))
+            self.packages.append((package, class_list))
+
+    @property
+    def method_count(self):
+        packages, classes, methods, _ = self.dimensions
+        return packages * classes * methods
+
+def _counter(kind, missed, covered):
+    return f'<counter type="{kind}" missed="{missed}" covered="{covered}"/>'
+
+def _counters(totals):
+    return "".join(_counter(kind, *totals[kind]) for kind in COUNTER_TYPES if sum(totals[kind]))
+
+def _add(totals, other):
+    for kind in COUNTER_TYPES:
+        totals[kind][0] += other[kind][0]
+        totals[kind][1] += other[kind][1]
+
+def _empty_totals():
+    return {kind: [0, 0] for kind in COUNTER_TYPES}
+
+def iter_report_xml(layout, coverage=0.3, seed=0, name="bench"):
+    """Yields the XML of one report in chunks (one class or source file at a time)"""
+    rng = random.Random(seed)
+    yield XML_HEADER
+    yield f'<report name="{name}"><sessioninfo id="bench-{seed}" start="1700000000000" dump="1700000001000"/>'
+    report_totals = _empty_totals()
+    for package, class_list in layout.packages:
+        yield f'<package name="{package}">'
+        package_totals = _empty_totals()
+        sourcefiles = []
+        for class_name, source_name, method_list in class_list:
+            class_totals = _empty_totals()
+            parts = [f'<class name="{class_name}" sourcefilename="{source_name}">']
+            lines = []
+            for method, desc, first_line, insts, branches in method_list:
+                hit = rng.random() < coverage
+                inst = sum(insts)
+                cb = branches // 2 if hit else 0
+                complexity = 1 + branches // 2
+                totals = {
+                    "INSTRUCTION": [0, inst] if hit else [inst, 0],
+                    "BRANCH": [branches - cb, cb],
+                    "LINE": [0, len(insts)] if hit else [len(insts), 0],
+                    "COMPLEXITY": [complexity - 1 - cb, 1 + cb] if hit else [complexity, 0],
+                    "METHOD": [0, 1] if hit else [1, 0],
+                }
+                parts.append(f'<method name="{method}" desc="{desc}" line="{first_line}">{_counters(totals)}</method>')
+                _add(class_totals, totals)
+                for i, n in enumerate(insts):
+                    # All branches of a method sit on its first line
+                    mb, lcb = (branches - cb, cb) if i == 0 else (0, 0)
+                    lines.append(f'<line nr="{first_line + i}" mi="{0 if hit else n}" ci="{n if hit else 0}" mb="{mb}" cb="{lcb}"/>')
+            parts.append(_counters(class_totals) + "</class>")
+            yield "".join(parts)
+            sourcefiles.append(f'<sourcefile name="{source_name}">{"".join(lines)}{_counters(class_totals)}</sourcefile>')
+            _add(package_totals, class_totals)
+        # Like JaCoCo: all classes of a package first, then its source files
+        yield "".join(sourcefiles) + _counters(package_totals) + "</package>"
+        _add(report_totals, package_totals)
+    yield _counters(report_totals) + "</report>"
+
+def write_report(path, layout, coverage=0.3, seed=0, name="bench"):
+    """Writes one report (atomically); returns its size in bytes"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        for chunk in iter_report_xml(layout, coverage, seed, name):
+            f.write(chunk)
+    os.replace(path + ".tmp", path)
+    return os.path.getsize(path)
+
+def generate_project(input_root, project_name, layout, tests, coverage=0.3, pt_share=0.25, seed=0):
+    """
+    Writes `tests` reports in the auto_runner layout (<input_root>/<project>/{pt,nonpt}/<safe test name>.xml),
+    named after test ids like org.bench.p0.C0Test#test0.
+    Returns (number of reports, total bytes).
+    """
+    total = 0
+    pts = int(tests * pt_share)
+    for i in range(tests):
+        category = "pt" if i < pts else "nonpt"
+        test_id = f"org.bench.p{i % layout.dimensions[0]}.C{i % layout.dimensions[1]}Test#test{i}"
+        path = os.path.join(input_root, project_name, category, f"{safe_test_name(test_id)}.xml")
+        total += write_report(path, layout, coverage, seed * 1000003 + i, name=test_id)
+    return tests, total
+
+def layout_from_args(args):
+    """Layout from --size and the per-dimension overrides"""
+    packages, classes, methods, lines = SIZES[args.size]
+    return Layout(args.packages or packages, args.classes or classes, args.methods or methods,
+                  args.lines or lines, args.structure_seed)
+
+def add_size_arguments(parser):
+    """Report size options shared by the benchmark scripts"""
+    parser.add_argument("--size", choices=sorted(SIZES), default="medium", help="Preset report size (default: medium)")
+    parser.add_argument("--packages", type=int, default=None, help="Packages per report (overrides --size)")
+    parser.add_argument("--classes", type=int, default=None, help="Classes per package (overrides --size)")
+    parser.add_argument("--methods", type=int, default=None, help="Methods per class (overrides --size)")
+    parser.add_argument("--lines", type=int, default=None, help="Lines per method (overrides --size)")
+    parser.add_argument("--coverage", type=float, default=0.3, help="Share of methods a test covers (default: 0.3)")
+    parser.add_argument("--structure-seed", type=int, default=0, help="Seed of the project structure")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic JaCoCo XML reports")
+    parser.add_argument("output", help="Report file, or the input root for --tests")
+    parser.add_argument("--tests", type=int, default=0, help="Write this many reports as project --project under OUTPUT instead of one file")
+    parser.add_argument("--project", default="bench-project", help="Project name for --tests")
+    parser.add_argument("--seed", type=int, default=0, help="Coverage seed")
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    layout = layout_from_args(args)
+    if args.tests:
+        count, size = generate_project(args.output, args.project, layout, args.tests, args.coverage, seed=args.seed)
+        print(f"✅ Wrote {count} reports ({size / 1e6:.1f} MB) to {os.path.join(args.output, args.project)}")
+    else:
+        size = write_report(args.output, layout, args.coverage, args.seed)
+        print(f"✅ Wrote {args.output} ({layout.method_count} methods, {size / 1e6:.2f} MB)")
@@ -0,0 +1,113 @@
+import re
+import hashlib
+
+from xml_validator import iter_jacoco_counters
+
+# Input fingerprints of per-test coverage runs (auto_runner --incremental).
+#
+# After the parser step the runner hashes every source, resource and build file of the
+# project in the container (SNAPSHOT_SCRIPT). A test's fingerprint combines
+#   - the environment: build files, resources and test sources that are not themselves
+#     test classes (shared helpers), so any change there re-runs every test;
+#   - the source of the test's own class;
+#   - the main source files its last report covered (package/File.java as in JaCoCo),
+#     or all main sources when that is unknown (--exec-only).
+# The ledger keeps the fingerprint and covered files of every test's last ok run. When
+# the project image changes, only tests whose fingerprint differs run again; the other
+# reports are reused. Changes to main code the test never reached (e.g. a new class it
+# only starts using through a changed covered class) are caught through that class.
+
+# find expression pruning build output and tool directories: target/ and build/ next to a
+# pom.xml or build.gradle(.kts), .git, .gradle and node_modules. Packages named build or
+# target inside source trees have no build file beside them and are kept.
+PRUNE_OUTPUT_DIRS = ("\\( -type d \\( -name .git -o -name .gradle -o -name node_modules -o \\( \\( -name target -o -name build \\) "
+                     "-exec sh -c 'for f in \"$1\"/../pom.xml \"$1\"/../build.gradle \"$1\"/../build.gradle.kts; "
+                     "do [ -e \"$f\" ] && exit 0; done; exit 1' _ {} \\; \\) \\) -prune \\)")
+
+def find_files(predicate, action="-print"):
+    """find command (run in the project's working directory) for the files matching `predicate`
+    outside build output and tool directories"""
+    return f"find . {PRUNE_OUTPUT_DIRS} -o \\( {predicate} \\) -type f {action}"
+
+# "<sha256>  <path>" of all sources and build files (run in the project's working directory)
+SNAPSHOT_SCRIPT = (find_files("-path '*/src/*' -o -name pom.xml -o -name 'build.gradle*' -o -name 'settings.gradle*' "
+                              "-o -name gradle.properties -o -name '*.versions.toml'", "-print0")
+                   + " | LC_ALL=C sort -z | xargs -0 -r sha256sum")
+
+SOURCE_DIR = re.compile(r"/src/(main|test)/(?:java|kotlin|groovy|scala)/(.+)\.(?:java|kt|groovy|scala)$")
+
+def _combine(pairs):
+    digest = hashlib.sha256()
+    for key, value in sorted(pairs):
+        digest.update(f"{key}\0{value}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def test_class_of(test_id):
+    return test_id.split("#", 1)[0].split("$", 1)[0]
+
+class SourceSnapshot:
+    """Hashes of a project's files at one point in time, grouped the way fingerprints need them"""
+
+    def __init__(self, listing, test_ids):
+        self.main = {}  # "org/foo/Bar.java" -> [sha256, ...] (one per module defining it)
+        self.tests = {} # "org.foo.BarTest" -> [sha256, ...]
+        other = []
+        for line in listing.splitlines():
+            digest, _, path = line.partition("  ")
+            if not path:
+                continue
+            m = SOURCE_DIR.search(path)
+            if not m:
+                other.append((path, digest))
+            elif m.group(1) == "main":
+                ext = path.rsplit(".", 1)[1]
+                self.main.setdefault(f"{m.group(2)}.{ext}", []).append(digest)
+            else:
+                self.tests.setdefault(m.group(2).replace("/", "."), []).append(digest)
+        self.files = len(listing.splitlines())
+
+        test_classes = {test_class_of(t) for t in test_ids}
+        helpers = [(name, d) for name, digests in self.tests.items() if name not in test_classes for d in digests]
+        self.env = _combine(other + helpers)
+        self.all_main = _combine((name, d) for name, digests in self.main.items() for d in digests)
+        self.all_tests = _combine((name, d) for name, digests in self.tests.items() for d in digests)
+
+    def test_source(self, test_id):
+        """Hash of the source of a test's class (nested classes map to their outer class), or None"""
+        name = test_class_of(test_id)
+        while name:
+            if name in self.tests:
+                return _combine(("", d) for d in self.tests[name])
+            parent, _, last = name.rpartition(".")
+            # a.b.Outer.Inner -> a.b.Outer, but never up into the package
+            if not parent or not last[:1].isupper() or not parent.rpartition(".")[2][:1].isupper():
+                return None
+            name = parent
+
+    def fingerprint(self, test_id, covered=None):
+        """Fingerprint of a test's inputs; covered = main source files of its report (None = all of them)"""
+        digest = hashlib.sha256(self.env.encode("utf-8"))
+        # A test whose source cannot be found depends on all test sources
+        digest.update((self.test_source(test_id) or self.all_tests).encode("utf-8"))
+        if covered is None:
+            digest.update(self.all_main.encode("utf-8"))
+        else:
+            digest.update(_combine((name, "|".join(self.main.get(name, ["-"]))) for name in covered).encode("utf-8"))
+        return digest.hexdigest()
+
+    def changed(self, test_ids, recorded):
+        """The tests whose inputs differ from the recorded (fingerprint, covered) or were never recorded"""
+        stale = []
+        for test_id in test_ids:
+            entry = recorded.get(test_id)
+            if entry is None or self.fingerprint(test_id, entry[1]) != entry[0]:
+                stale.append(test_id)
+        return stale
+
+def covered_sources(report_path):
+    """Source files (package/File.java) with covered instructions in a JaCoCo report (plain or compressed)"""
+    covered = set()
+    for row in iter_jacoco_counters(report_path, "sourcefile"):
+        if row.counters.get("INSTRUCTION", (0, 0))[1] > 0:
+            covered.add(f"{row.package}/{row.name}" if row.package else row.name)
+    return sorted(covered)
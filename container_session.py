@@ -0,0 +1,261 @@
+import io
+import os
+import json
+import socket
+import struct
+import tarfile
+import threading
+import subprocess
+import http.client
+import urllib.parse
+
+# Default Docker Engine socket (overridden by DOCKER_HOST=unix://... or an explicit path)
+DEFAULT_SOCKET = "/var/run/docker.sock"
+
+# How much of a streamed command's output is kept in memory for callers to scan
+STREAM_TAIL_BYTES = 64 * 1024
+
+def default_socket_path():
+    host = os.environ.get("DOCKER_HOST", "")
+    if host.startswith("unix://"):
+        return host[len("unix://"):]
+    return DEFAULT_SOCKET
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that talks to a Unix domain socket instead of TCP"""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+class DockerAPIError(Exception):
+    pass
+
+class OutputTail:
+    """Keeps the last `limit` bytes written to it"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.buf = bytearray()
+
+    def write(self, data):
+        self.buf += data
+        if len(self.buf) > self.limit:
+            del self.buf[:len(self.buf) - self.limit]
+
+    def text(self):
+        return self.buf.decode("utf-8", errors="ignore")
+
+class ContainerSession:
+    """Runs commands and copies files in one container through the Docker Engine API
+
+    One keep-alive connection is reused for all control calls (exec create/inspect,
+    archive transfers); each exec start gets its own connection because Docker hijacks
+    it for the output stream. Results are subprocess.CompletedProcess objects so the
+    session is a drop-in replacement for `docker exec` / `docker cp` through run_cmd.
+    """
+
+    def __init__(self, container, workdir="/app", socket_path=None, timeout=None):
+        self.container = container
+        self.workdir = workdir
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self._conn = None
+        self._lock = threading.Lock()
+
+    # ---------------- HTTP plumbing ----------------
+
+    def _new_connection(self):
+        return UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+
+    def _request(self, method, path, body=None, headers=None):
+        """Control request on the shared keep-alive connection; returns (status, body bytes)"""
+        headers = dict(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        with self._lock:
+            for attempt in range(2):
+                if self._conn is None:
+                    self._conn = self._new_connection()
+                try:
+                    self._conn.request(method, path, body=body, headers=headers)
+                    resp = self._conn.getresponse()
+                    data = resp.read()
+                    if resp.will_close:
+                        self._conn.close()
+                        self._conn = None
+                    return resp.status, data
+                except (ConnectionError, http.client.HTTPException, OSError):
+                    # The daemon may have dropped the idle connection; reconnect once
+                    if self._conn is not None:
+                        self._conn.close()
+                    self._conn = None
+                    if attempt == 1:
+                        raise
+
+    def _json(self, method, path, body=None, expected=(200, 201)):
+        status, data = self._request(method, path, body)
+        if status not in expected:
+            raise DockerAPIError(f"{method} {path} -> {status}: {data.decode('utf-8', errors='ignore').strip()}")
+        return json.loads(data) if data else {}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---------------- Commands ----------------
+
+    def exec(self, cmd, env=None, workdir=None, log_file=None):
+        """Run `cmd` with sh -c in the container
+
+        Without log_file, stdout/stderr are returned in full. With log_file, both streams
+        are written to that file as they arrive and only the last STREAM_TAIL_BYTES of
+        each are kept in the returned result.
+        """
+        exec_id = self._create_exec(cmd, env, workdir)
+        if log_file:
+            out, err = OutputTail(STREAM_TAIL_BYTES), OutputTail(STREAM_TAIL_BYTES)
+            with open(log_file, "ab") as log:
+                self._stream_exec(exec_id, out, err, log)
+            stdout, stderr = out.text(), err.text()
+        else:
+            out, err = io.BytesIO(), io.BytesIO()
+            self._stream_exec(exec_id, out, err, None)
+            stdout = out.getvalue().decode("utf-8", errors="ignore")
+            stderr = err.getvalue().decode("utf-8", errors="ignore")
+
+        return subprocess.CompletedProcess(cmd, self._exit_code(exec_id), stdout, stderr)
+
+    def exec_stream(self, cmd, sink, env=None, workdir=None):
+        """Run `cmd` and write its raw stdout to the file-like `sink` as it arrives
+
+        Meant for binary output such as a tar stream; only the tail of stderr is kept.
+        """
+        exec_id = self._create_exec(cmd, env, workdir)
+        err = OutputTail(STREAM_TAIL_BYTES)
+        self._stream_exec(exec_id, sink, err, None)
+        return subprocess.CompletedProcess(cmd, self._exit_code(exec_id), "", err.text())
+
+    def _create_exec(self, cmd, env, workdir):
+        quoted = urllib.parse.quote(self.container, safe="")
+        created = self._json("POST", f"/containers/{quoted}/exec", {
+            "Cmd": ["sh", "-c", cmd],
+            "AttachStdout": True,
+            "AttachStderr": True,
+            "WorkingDir": workdir or self.workdir,
+            "Env": [f"{k}={v}" for k, v in (env or {}).items()],
+        })
+        return created["Id"]
+
+    def _exit_code(self, exec_id):
+        code = self._json("GET", f"/exec/{exec_id}/json").get("ExitCode")
+        return code if code is not None else -1
+
+    def _stream_exec(self, exec_id, out, err, log):
+        """Start an exec and demultiplex its raw stream (8-byte frame headers) into out/err"""
+        conn = self._new_connection()
+        try:
+            body = json.dumps({"Detach": False, "Tty": False}).encode("utf-8")
+            conn.request("POST", f"/exec/{exec_id}/start", body=body, headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            if resp.status != 200:
+                raise DockerAPIError(f"exec start -> {resp.status}: {resp.read().decode('utf-8', errors='ignore').strip()}")
+            while True:
+                header = _read_exact(resp, 8)
+                if not header:
+                    break
+                stream_type, size = header[0], struct.unpack(">I", header[4:8])[0]
+                payload = _read_exact(resp, size)
+                (err if stream_type == 2 else out).write(payload)
+                if log is not None:
+                    log.write(payload)
+        finally:
+            conn.close()
+
+    # ---------------- File transfer ----------------
+
+    def copy_from(self, remote_path, local_path):
+        """Like `docker cp container:remote_path local_path`; returns bytes received"""
+        if not remote_path.startswith("/"):
+            remote_path = f"{self.workdir}/{remote_path}"
+        query = urllib.parse.urlencode({"path": remote_path})
+        conn = self._new_connection()
+        received = 0
+        try:
+            conn.request("GET", f"/containers/{urllib.parse.quote(self.container, safe='')}/archive?{query}")
+            resp = conn.getresponse()
+            if resp.status != 200:
+                raise DockerAPIError(f"archive get {remote_path} -> {resp.status}: {resp.read().decode('utf-8', errors='ignore').strip()}")
+            counter = CountingReader(resp)
+            base = os.path.basename(remote_path.rstrip("/"))
+            with tarfile.open(fileobj=counter, mode="r|") as tar:
+                for member in tar:
+                    # Re-root the archive's top-level entry at local_path, like docker cp does
+                    rel = os.path.normpath(member.name)
+                    if rel.startswith("..") or os.path.isabs(rel):
+                        continue
+                    rel = rel[len(base):].lstrip("/") if rel == base or rel.startswith(base + "/") else rel
+                    target = os.path.join(local_path, rel) if rel else local_path
+                    if member.isdir():
+                        os.makedirs(target, exist_ok=True)
+                    elif member.isfile():
+                        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+                        src = tar.extractfile(member)
+                        with open(target, "wb") as f:
+                            while True:
+                                chunk = src.read(1024 * 1024)
+                                if not chunk: break
+                                f.write(chunk)
+            received = counter.count
+        finally:
+            conn.close()
+        return received
+
+    def copy_to(self, local_path, remote_path):
+        """Like `docker cp local_path container:remote_path`; returns bytes sent"""
+        if not remote_path.startswith("/"):
+            remote_path = f"{self.workdir}/{remote_path}"
+        remote_dir, remote_name = os.path.split(remote_path.rstrip("/"))
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w") as tar:
+            tar.add(local_path, arcname=remote_name)
+        data = buf.getvalue()
+        query = urllib.parse.urlencode({"path": remote_dir or "/"})
+        status, body = self._request("PUT", f"/containers/{urllib.parse.quote(self.container, safe='')}/archive?{query}",
+                                     body=data, headers={"Content-Type": "application/x-tar"})
+        if status != 200:
+            raise DockerAPIError(f"archive put {remote_path} -> {status}: {body.decode('utf-8', errors='ignore').strip()}")
+        return len(data)
+
+def _read_exact(resp, size):
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = resp.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+class CountingReader:
+    """File-like wrapper that counts the bytes read through it"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.count += len(data)
+        return data
@@ -0,0 +1,219 @@
+import time
+import heapq
+import argparse
+
+import numpy as np
+
+from coverage_store import CoverageStore
+
+# Popcount of every byte value (np.bitwise_count only exists in NumPy >= 2.0)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def popcount_rows(bits):
+    """Number of set bits per row of a packed (n, W) uint8 matrix"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits).sum(axis=-1, dtype=np.int64)
+    return _POPCOUNT[bits].sum(axis=-1, dtype=np.int64)
+
+class CoverageMatrix:
+    """
+    Tests x items (methods or lines) coverage as a bit-packed matrix.
+    Row t has bit i set if test t covers item i; rows are np.packbits rows, so
+    set operations over whole test groups are a few vectorized byte ops.
+    """
+
+    def __init__(self, bits, n_items, tests, categories):
+        self.bits = bits
+        self.n_items = n_items
+        self.tests = tests
+        self.categories = categories
+
+    @classmethod
+    def from_csr(cls, indptr, indices, n_items, tests, categories, chunk=1024):
+        n_tests = len(indptr) - 1
+        bits = np.zeros((n_tests, (n_items + 7) // 8), dtype=np.uint8)
+        # Unpack a block of rows at a time to keep the dense bool buffer small
+        for start in range(0, n_tests, chunk):
+            end = min(start + chunk, n_tests)
+            dense = np.zeros((end - start, n_items), dtype=bool)
+            lo, hi = indptr[start], indptr[end]
+            rows = np.repeat(np.arange(end - start), np.diff(indptr[start:end + 1]))
+            dense[rows, indices[lo:hi]] = True
+            bits[start:end] = np.packbits(dense, axis=1)
+        return cls(bits, n_items, tests, categories)
+
+    @classmethod
+    def from_store(cls, store, level="method"):
+        """Method level: a method counts as covered if Inst_Covered > 0. Line level: ci > 0."""
+        if level == "method":
+            indptr, indices = store.covered_entries(column=1)
+            n_items = store.n_methods
+        elif level == "line":
+            indptr, indices = store.covered_lines()
+            n_items = store.n_lines
+        else:
+            raise ValueError(f"Unknown level: {level}")
+        return cls.from_csr(indptr, indices, n_items, store.tests, store.categories())
+
+    # ---------------- Set helpers ----------------
+
+    def indices(self, rows=None):
+        """Test indices of a row selection (None = all tests, a bool mask or an index array)"""
+        if rows is None:
+            return np.arange(len(self.tests))
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            if rows.shape != (len(self.tests),):
+                raise ValueError(f"Row mask has shape {rows.shape}, expected ({len(self.tests)},)")
+            return np.flatnonzero(rows)
+        if not np.issubdtype(rows.dtype, np.integer) and rows.size:
+            raise TypeError(f"Rows must be a bool mask or an index array, not {rows.dtype}")
+        return rows.astype(np.int64, copy=False).ravel()
+
+    def mask(self, category=None):
+        """Boolean row mask for a category (None = all tests)"""
+        if category is None:
+            return np.ones(len(self.tests), dtype=bool)
+        return self.categories == category
+
+    def union(self, rows):
+        """Packed union of the selected rows (bool mask or index array)"""
+        selected = self.bits[rows]
+        if len(selected) == 0:
+            return np.zeros(self.bits.shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(selected, axis=0)
+
+    def count(self, packed):
+        return int(popcount_rows(packed))
+
+    def item_counts(self, rows=None, chunk=1024):
+        """How many of the selected tests cover each item (int32 vector of n_items)"""
+        selected = self.bits if rows is None else self.bits[rows]
+        counts = np.zeros(self.n_items, dtype=np.int32)
+        for start in range(0, len(selected), chunk):
+            block = np.unpackbits(selected[start:start + chunk], axis=1, count=self.n_items)
+            counts += block.sum(axis=0, dtype=np.int32)
+        return counts
+
+    # ---------------- Aggregates ----------------
+
+    def compare(self, a="pt", b="nonpt"):
+        """Union coverage of two categories, their overlap and the items only one of them covers"""
+        ua = self.union(self.mask(a))
+        ub = self.union(self.mask(b))
+        both = self.count(ua & ub)
+        union = self.count(ua | ub)
+        return {
+            "items": self.n_items,
+            f"{a}_tests": int(self.mask(a).sum()),
+            f"{b}_tests": int(self.mask(b).sum()),
+            f"{a}_covered": self.count(ua),
+            f"{b}_covered": self.count(ub),
+            "overlap": both,
+            f"only_{a}": self.count(ua & ~ub),
+            f"only_{b}": self.count(ub & ~ua),
+            "union": union,
+            "jaccard": both / union if union else 0.0,
+        }
+
+    def per_test_coverage(self):
+        return popcount_rows(self.bits)
+
+    def unique_per_test(self, rows=None):
+        """Items each test covers that no other (selected) test covers"""
+        rows = self.mask() if rows is None else rows
+        unique = np.packbits(self.item_counts(rows) == 1)
+        result = np.zeros(len(self.tests), dtype=np.int64)
+        result[rows] = popcount_rows(self.bits[rows] & unique)
+        return result
+
+    def marginal_gain(self, rows, base_rows):
+        """Items each of `rows` adds on top of the union of `base_rows`"""
+        base = self.union(base_rows)
+        return popcount_rows(self.bits[rows] & ~base)
+
+    def greedy_selection(self, rows=None, k=None, target=None):
+        """
+        Greedy coverage-maximizing subset of the selected tests.
+        Stops after k tests, once `target` (fraction of the selected tests' union) is
+        reached, or when no test adds anything. Uses lazy evaluation: coverage gain is
+        submodular, so a stale gain is an upper bound and only the heap top is recomputed.
+        `rows` is a bool mask or an index array (None = all tests).
+        Returns a list of (test index, gain, cumulative covered).
+        """
+        candidates = np.unique(self.indices(rows))
+        goal = self.count(self.union(candidates))
+        if target is not None:
+            goal = int(np.ceil(goal * target))
+        covered = np.zeros(self.bits.shape[1], dtype=np.uint8)
+        total = 0
+        heap = [(-int(g), int(t)) for t, g in zip(candidates, popcount_rows(self.bits[candidates]))]
+        heapq.heapify(heap)
+        selection = []
+        while heap and total < goal and (k is None or len(selection) < k):
+            neg_gain, t = heapq.heappop(heap)
+            gain = self.count(self.bits[t] & ~covered)
+            if gain == 0:
+                continue
+            if heap and gain < -heap[0][0]:
+                # Stale bound: push back with the fresh gain and try the next best
+                heapq.heappush(heap, (-gain, t))
+                continue
+            covered |= self.bits[t]
+            total += gain
+            selection.append((t, gain, total))
+        return selection
+
+def _print_compare(stats, a, b):
+    n = stats["items"] or 1
+    print(f"📊 {stats['items']} items, {stats[f'{a}_tests']} {a} tests, {stats[f'{b}_tests']} {b} tests")
+    print(f"   {a:>6} covered: {stats[f'{a}_covered']:>8} ({stats[f'{a}_covered'] / n:.1%})")
+    print(f"   {b:>6} covered: {stats[f'{b}_covered']:>8} ({stats[f'{b}_covered'] / n:.1%})")
+    print(f"   union:         {stats['union']:>8} ({stats['union'] / n:.1%})")
+    print(f"   overlap:       {stats['overlap']:>8} (jaccard {stats['jaccard']:.3f})")
+    print(f"   only {a}:{'':>{8 - len(a)}}{stats[f'only_{a}']:>8}")
+    print(f"   only {b}:{'':>{8 - len(b)}}{stats[f'only_{b}']:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PT vs non-PT coverage analysis on the columnar coverage store")
+    parser.add_argument("command", choices=["compare", "unique", "gain", "greedy"])
+    parser.add_argument("project_name")
+    parser.add_argument("--store-root", default="coverage_store")
+    parser.add_argument("--level", choices=["method", "line"], default="method")
+    parser.add_argument("--a", default="pt", help="First category (compare/gain: the tests whose gain is measured)")
+    parser.add_argument("--b", default="nonpt", help="Second category (gain: the base set)")
+    parser.add_argument("--category", default=None, help="Restrict unique/greedy to one category")
+    parser.add_argument("--k", type=int, default=None, help="greedy: maximum number of tests")
+    parser.add_argument("--target", type=float, default=None, help="greedy: stop at this fraction of the reachable coverage")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    store = CoverageStore.open(args.project_name, args.store_root)
+    matrix = CoverageMatrix.from_store(store, args.level)
+    print(f"📥 Loaded {len(matrix.tests)} tests x {matrix.n_items} {args.level}s in {time.monotonic() - start:.2f}s")
+
+    start = time.monotonic()
+    if args.command == "compare":
+        _print_compare(matrix.compare(args.a, args.b), args.a, args.b)
+    elif args.command == "unique":
+        rows = matrix.mask(args.category)
+        unique = matrix.unique_per_test(rows)
+        print(f"🔎 Tests with the most unique {args.level}s:")
+        for t in np.argsort(-unique)[:args.top]:
+            if unique[t] == 0: break
+            print(f"   {unique[t]:>7}  {matrix.tests[t]}")
+    elif args.command == "gain":
+        rows = np.flatnonzero(matrix.mask(args.a))
+        gains = matrix.marginal_gain(rows, matrix.mask(args.b))
+        print(f"➕ {args.a} tests adding the most {args.level}s over all {args.b} tests "
+              f"(total {int((gains > 0).sum())} tests add something):")
+        for i in np.argsort(-gains)[:args.top]:
+            if gains[i] == 0: break
+            print(f"   {gains[i]:>7}  {matrix.tests[rows[i]]}")
+    elif args.command == "greedy":
+        selection = matrix.greedy_selection(matrix.mask(args.category), args.k, args.target)
+        print(f"🎯 Greedy selection: {len(selection)} tests")
+        for t, gain, total in selection[:args.top]:
+            print(f"   +{gain:>7}  ={total:>8}  {matrix.tests[t]}")
+    print(f"⏱️ Answered in {time.monotonic() - start:.3f}s")
@@ -0,0 +1,294 @@
+import os
+import csv
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from xml_validator import CSV_FIELDS, iter_jacoco_methods, iter_jacoco_counters, walk_reports
+from report_store import stored_reports
+
+# Store layout (one directory per project, every array loadable with mmap_mode='r'):
+#   meta.json           format version, counts, where the reports came from
+#   methods.json        interned method identities: [[package, class, method, desc], ...]
+#   tests.json          test names as "<category>/<report name>", e.g. "pt/org_foo_BarTest_testX"
+#   method_totals.npy   int32 (M, 2): total instructions and lines per method
+#   indptr.npy          int64 (T + 1): CSR row pointers, one row per test
+#   method_idx.npy      int32 (nnz): method index of every stored entry
+#   counters.npy        int32 (nnz, 4): Inst_Missed, Inst_Covered, Line_Missed, Line_Covered
+#
+# Optional line level (build --lines):
+#   line_files.json     source files as "<package>/<File.java>"
+#   line_file.npy       int32 (L): file index of every line id
+#   line_nr.npy         int32 (L): line number of every line id
+#   line_indptr.npy     int64 (T + 1) and line_idx.npy int32: CSR of the covered (ci > 0) lines per test
+#
+# Only entries that differ from "nothing covered" (missed == total, covered == 0) are
+# stored, so a test costs space proportional to what it covers, not to the project size.
+STORE_VERSION = 1
+COUNTER_COLUMNS = ['Inst_Missed', 'Inst_Covered', 'Line_Missed', 'Line_Covered']
+
+def _read_report(xml_path, lines=False):
+    """
+    Worker: method rows of one report as plain tuples, plus ((file, nr), covered) per line
+    when lines=True. Returns (None, None) if the report is unreadable.
+    """
+    try:
+        rows = [((r.package, r.clazz, r.method, r.desc), (r.inst_missed, r.inst_covered, r.line_missed, r.line_covered))
+                for r in iter_jacoco_methods(xml_path)]
+        line_rows = None
+        if lines:
+            line_rows = [((f"{r.package}/{r.name}", r.line), r.counters['ci'] > 0)
+                         for r in iter_jacoco_counters(xml_path, 'line')]
+        return rows, line_rows
+    except Exception as e:
+        print(f"   ❌ Skipping {xml_path}: {e}")
+        return None, None
+
+def _read_report_with_lines(xml_path):
+    return _read_report(xml_path, lines=True)
+
+def find_reports(input_dir):
+    """Sorted (test name, report path) of a project's reports, loose XMLs and stored blobs"""
+    reports = {}
+    for xml_path in walk_reports(input_dir):
+        reports[os.path.relpath(xml_path, input_dir)[:-len(".xml")]] = xml_path
+    # Reports kept in the content-addressed store (report_store.py) are read from their blobs
+    for category, name, blob_path in stored_reports(input_dir):
+        reports.setdefault(os.path.join(category, name), blob_path)
+    return sorted(reports.items())
+
+def build_store(project_name, input_root="experiment_data", store_root="coverage_store", jobs=1, lines=False):
+    """Builds the columnar store of a project from its per-test JaCoCo XMLs (and line coverage if lines=True)"""
+    input_dir = os.path.join(input_root, project_name)
+    store_dir = os.path.join(store_root, project_name)
+    if not os.path.exists(input_dir):
+        print(f"❌ Input directory not found: {input_dir}")
+        return None
+
+    reports = find_reports(input_dir)
+    print(f"🗄️ Building coverage store for {project_name} from {len(reports)} reports...")
+
+    method_ids = {}
+    methods = []
+    totals = []
+    tests = []
+    indptr = [0]
+    idx_chunks = []
+    counter_chunks = []
+    line_ids = {}
+    line_files = {}
+    line_file = []
+    line_nr = []
+    line_indptr = [0]
+    line_chunks = []
+
+    def add(name, result):
+        rows, line_rows = result
+        if rows is None:
+            return
+        idx = []
+        vals = []
+        for key, counters in rows:
+            mid = method_ids.get(key)
+            if mid is None:
+                mid = method_ids[key] = len(methods)
+                methods.append(key)
+                totals.append((counters[0] + counters[1], counters[2] + counters[3]))
+            inst_total, line_total = totals[mid]
+            # Keep only entries that differ from the "not covered" default
+            if counters[1] or counters[3] or counters[0] != inst_total or counters[2] != line_total:
+                idx.append(mid)
+                vals.append(counters)
+        tests.append(name.replace(os.sep, "/"))
+        idx_chunks.append(np.asarray(idx, dtype=np.int32))
+        counter_chunks.append(np.asarray(vals, dtype=np.int32).reshape(-1, 4))
+        indptr.append(indptr[-1] + len(idx))
+
+        if lines:
+            covered = []
+            for key, is_covered in line_rows:
+                lid = line_ids.get(key)
+                if lid is None:
+                    lid = line_ids[key] = len(line_nr)
+                    line_file.append(line_files.setdefault(key[0], len(line_files)))
+                    line_nr.append(key[1])
+                if is_covered:
+                    covered.append(lid)
+            line_chunks.append(np.asarray(covered, dtype=np.int32))
+            line_indptr.append(line_indptr[-1] + len(covered))
+
+        if len(tests) % 100 == 0:
+            print(f"   ... ingested {len(tests)} reports ({len(methods)} methods)")
+
+    reader = _read_report_with_lines if lines else _read_report
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # map() keeps the report order, so method ids are assigned deterministically
+            for (name, _), result in zip(reports, pool.map(reader, [p for _, p in reports], chunksize=8)):
+                add(name, result)
+    else:
+        for name, xml_path in reports:
+            add(name, reader(xml_path))
+
+    os.makedirs(store_dir, exist_ok=True)
+    np.save(os.path.join(store_dir, "method_totals.npy"), np.asarray(totals, dtype=np.int32).reshape(-1, 2))
+    np.save(os.path.join(store_dir, "indptr.npy"), np.asarray(indptr, dtype=np.int64))
+    np.save(os.path.join(store_dir, "method_idx.npy"),
+            np.concatenate(idx_chunks) if idx_chunks else np.zeros(0, dtype=np.int32))
+    np.save(os.path.join(store_dir, "counters.npy"),
+            np.concatenate(counter_chunks) if counter_chunks else np.zeros((0, 4), dtype=np.int32))
+    if lines:
+        np.save(os.path.join(store_dir, "line_file.npy"), np.asarray(line_file, dtype=np.int32))
+        np.save(os.path.join(store_dir, "line_nr.npy"), np.asarray(line_nr, dtype=np.int32))
+        np.save(os.path.join(store_dir, "line_indptr.npy"), np.asarray(line_indptr, dtype=np.int64))
+        np.save(os.path.join(store_dir, "line_idx.npy"),
+                np.concatenate(line_chunks) if line_chunks else np.zeros(0, dtype=np.int32))
+        with open(os.path.join(store_dir, "line_files.json"), "w") as f:
+            json.dump(sorted(line_files, key=line_files.get), f)
+    with open(os.path.join(store_dir, "methods.json"), "w") as f:
+        json.dump([list(m) for m in methods], f)
+    with open(os.path.join(store_dir, "tests.json"), "w") as f:
+        json.dump(tests, f)
+    with open(os.path.join(store_dir, "meta.json"), "w") as f:
+        json.dump({"version": STORE_VERSION, "project": project_name, "input_dir": input_dir,
+                   "n_tests": len(tests), "n_methods": len(methods), "nnz": indptr[-1],
+                   "has_lines": lines, "n_lines": len(line_nr)}, f, indent=2)
+
+    print(f"🎉 Stored {len(tests)} tests x {len(methods)} methods ({indptr[-1]} non-default entries) in {store_dir}")
+    return store_dir
+
+class CoverageStore:
+    """Read access to a project's columnar coverage store (arrays are memory-mapped)"""
+
+    def __init__(self, store_dir, mmap=True):
+        self.store_dir = store_dir
+        mode = 'r' if mmap else None
+        with open(os.path.join(store_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported coverage store version in {store_dir}: {self.meta.get('version')}")
+        with open(os.path.join(store_dir, "methods.json")) as f:
+            self.methods = [tuple(m) for m in json.load(f)]
+        with open(os.path.join(store_dir, "tests.json")) as f:
+            self.tests = json.load(f)
+        self.method_totals = np.load(os.path.join(store_dir, "method_totals.npy"), mmap_mode=mode)
+        self.indptr = np.load(os.path.join(store_dir, "indptr.npy"), mmap_mode=mode)
+        self.method_idx = np.load(os.path.join(store_dir, "method_idx.npy"), mmap_mode=mode)
+        self.counters = np.load(os.path.join(store_dir, "counters.npy"), mmap_mode=mode)
+        self.has_lines = self.meta.get("has_lines", False)
+        if self.has_lines:
+            with open(os.path.join(store_dir, "line_files.json")) as f:
+                self.line_files = json.load(f)
+            self.line_file = np.load(os.path.join(store_dir, "line_file.npy"), mmap_mode=mode)
+            self.line_nr = np.load(os.path.join(store_dir, "line_nr.npy"), mmap_mode=mode)
+            self.line_indptr = np.load(os.path.join(store_dir, "line_indptr.npy"), mmap_mode=mode)
+            self.line_idx = np.load(os.path.join(store_dir, "line_idx.npy"), mmap_mode=mode)
+        self._test_ids = None
+
+    @classmethod
+    def open(cls, project_name, store_root="coverage_store", mmap=True):
+        return cls(os.path.join(store_root, project_name), mmap)
+
+    @property
+    def n_tests(self):
+        return len(self.tests)
+
+    @property
+    def n_methods(self):
+        return len(self.methods)
+
+    @property
+    def n_lines(self):
+        return len(self.line_nr) if self.has_lines else 0
+
+    def test_index(self, name):
+        if self._test_ids is None:
+            self._test_ids = {t: i for i, t in enumerate(self.tests)}
+        return self._test_ids[name]
+
+    def categories(self):
+        """Category of every test ("pt", "nonpt", ...) as an array aligned with self.tests"""
+        return np.asarray([t.split("/", 1)[0] if "/" in t else "" for t in self.tests])
+
+    def test_entries(self, test):
+        """(method indices, counters) of the stored entries of one test (index or name)"""
+        if not isinstance(test, (int, np.integer)):
+            test = self.test_index(test)
+        start, end = self.indptr[test], self.indptr[test + 1]
+        return self.method_idx[start:end], self.counters[start:end]
+
+    def dense_counters(self, test):
+        """Full (M, 4) counter matrix of one test, defaults filled in"""
+        dense = np.zeros((self.n_methods, 4), dtype=np.int32)
+        dense[:, 0] = self.method_totals[:, 0]
+        dense[:, 2] = self.method_totals[:, 1]
+        idx, vals = self.test_entries(test)
+        dense[idx] = vals
+        return dense
+
+    def covered_entries(self, column=1):
+        """
+        CSR (indptr, method indices) of the entries with a non-zero counter in `column`
+        (1 = Inst_Covered, 3 = Line_Covered) for all tests at once.
+        """
+        mask = np.asarray(self.counters[:, column]) > 0
+        kept = np.cumsum(np.concatenate(([0], mask)))
+        return kept[np.asarray(self.indptr)], np.asarray(self.method_idx)[mask]
+
+    def covered_lines(self):
+        """CSR (indptr, line ids) of the covered lines of all tests (store built with --lines)"""
+        if not self.has_lines:
+            raise ValueError(f"{self.store_dir} has no line-level data; rebuild it with --lines")
+        return np.asarray(self.line_indptr), np.asarray(self.line_idx)
+
+def export_csv(project_name, store_root="coverage_store", output_root="coverage_csvs"):
+    """Writes the store back out in the per-test CSV layout of xml_validator.process_project"""
+    store = CoverageStore.open(project_name, store_root)
+    output_dir = os.path.join(output_root, project_name)
+    print(f"📤 Exporting {store.n_tests} tests of {project_name} to {output_dir}...")
+    for t, name in enumerate(store.tests):
+        csv_path = os.path.join(output_dir, *name.split("/")) + ".csv"
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+        dense = store.dense_counters(t)
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            for method, counters in zip(store.methods, dense.tolist()):
+                writer.writerow(list(method) + counters)
+        if (t + 1) % 100 == 0:
+            print(f"   ... exported {t + 1} files")
+    print(f"🎉 Exported {store.n_tests} CSV files.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar per-project coverage store")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Build the store from experiment_data/<project> XMLs")
+    p_build.add_argument("project_names", nargs="+")
+    p_build.add_argument("--input-root", default="experiment_data")
+    p_build.add_argument("--store-root", default="coverage_store")
+    p_build.add_argument("--jobs", type=int, default=1, help="Worker processes for XML parsing")
+    p_build.add_argument("--lines", action="store_true", help="Also store line-level coverage (sourcefile/line)")
+
+    p_export = sub.add_parser("export", help="Export the store back to per-test CSVs")
+    p_export.add_argument("project_name")
+    p_export.add_argument("--store-root", default="coverage_store")
+    p_export.add_argument("--output-root", default="coverage_csvs")
+
+    p_info = sub.add_parser("info", help="Print the size of a project's store")
+    p_info.add_argument("project_name")
+    p_info.add_argument("--store-root", default="coverage_store")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        for name in args.project_names:
+            build_store(name, args.input_root, args.store_root, max(1, args.jobs), args.lines)
+    elif args.command == "export":
+        export_csv(args.project_name, args.store_root, args.output_root)
+    elif args.command == "info":
+        store = CoverageStore.open(args.project_name, args.store_root)
+        size = sum(os.path.getsize(os.path.join(store.store_dir, f)) for f in os.listdir(store.store_dir))
+        print(f"📊 {args.project_name}: {store.n_tests} tests x {store.n_methods} methods, "
+              f"{store.meta['nnz']} entries, {store.n_lines} lines, {size / 1024 / 1024:.1f} MB on disk")
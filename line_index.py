@@ -0,0 +1,332 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from xml_validator import iter_jacoco_counters
+from coverage_store import find_reports
+
+# Line-level coverage index of a project, built from the <sourcefile>/<line> detail of its
+# per-test JaCoCo reports, for questions like "which tests cover line 42 of Foo.java".
+#
+# Index layout (one directory per project, every .npy loadable with mmap_mode='r'):
+#   meta.json           format version and counts
+#   files.json          source files as "<package>/<File.java>", sorted
+#   tests.json          test names as "<category>/<report name>" (as in coverage_store)
+#   file_ptr.npy        int64 (F + 1): line ids of file f are file_ptr[f]:file_ptr[f + 1]
+#   line_nr.npy         int32 (L): line number of every line id (ascending within a file)
+#   line_totals.npy     int32 (L, 2): instructions and branches of every line
+#   test_ptr.npy        int64 (T + 1) \
+#   test_lines.npy      int32 (nnz)    } CSR test -> covered lines (ci > 0 or cb > 0),
+#   test_counts.npy     int32 (nnz, 4)/  with the line's mi, ci, mb, cb in that test
+#   line_ptr.npy        int64 (L + 1) \  CSR line -> covering tests: positions of the
+#   line_entries.npy    int64 (nnz)    / line's entries in the test-side arrays, by test
+#
+# A query reads the JSON name lists and a few slices of the memory-mapped arrays, so it
+# answers in milliseconds whatever the size of the project.
+INDEX_VERSION = 1
+
+def _read_lines(xml_path):
+    """Worker: [(source file, line numbers, (n, 4) mi/ci/mb/cb), ...] of one report, or None if unreadable"""
+    try:
+        files = []
+        current, nrs, counts = None, [], []
+        for r in iter_jacoco_counters(xml_path, 'line'):
+            name = f"{r.package}/{r.name}" if r.package else r.name
+            if name != current:
+                if nrs:
+                    files.append((current, np.asarray(nrs, dtype=np.int32), np.asarray(counts, dtype=np.int32).reshape(-1, 4)))
+                current, nrs, counts = name, [], []
+            c = r.counters
+            nrs.append(r.line)
+            counts.append((c['mi'], c['ci'], c['mb'], c['cb']))
+        if nrs:
+            files.append((current, np.asarray(nrs, dtype=np.int32), np.asarray(counts, dtype=np.int32).reshape(-1, 4)))
+        return files
+    except Exception as e:
+        print(f"   ❌ Skipping {xml_path}: {e}")
+        return None
+
+def build_index(project_name, input_root="experiment_data", index_root="line_index", jobs=1):
+    """Builds the line index of a project from its per-test JaCoCo XMLs (loose or in the report store)"""
+    input_dir = os.path.join(input_root, project_name)
+    index_dir = os.path.join(index_root, project_name)
+    if not os.path.exists(input_dir):
+        print(f"❌ Input directory not found: {input_dir}")
+        return None
+
+    reports = find_reports(input_dir)
+    print(f"🗺️ Building line index for {project_name} from {len(reports)} reports...")
+
+    file_ids = {}
+    universe = [] # per file id: (sorted line numbers, (n, 2) instruction/branch totals)
+    tests = []
+    test_ptr = [0]
+    chunks = [] # per test: (file ids, line numbers, counters) of its covered lines
+
+    def add(name, files):
+        if files is None:
+            return
+        entries = []
+        for file_name, nrs, counts in files:
+            fid = file_ids.get(file_name)
+            if fid is None:
+                fid = file_ids[file_name] = len(universe)
+                universe.append((np.zeros(0, dtype=np.int32), np.zeros((0, 2), dtype=np.int32)))
+            known, totals = universe[fid]
+            # Every report of a project normally lists the same lines; merge only when they differ
+            if not np.array_equal(known, nrs):
+                line_totals = np.stack((counts[:, 0] + counts[:, 1], counts[:, 2] + counts[:, 3]), axis=1)
+                merged, first = np.unique(np.concatenate((known, nrs)), return_index=True)
+                universe[fid] = (merged, np.concatenate((totals, line_totals))[first])
+            hit = (counts[:, 1] > 0) | (counts[:, 3] > 0)
+            if hit.any():
+                entries.append((np.full(int(hit.sum()), fid, dtype=np.int32), nrs[hit], counts[hit]))
+        tests.append(name.replace(os.sep, "/"))
+        n = sum(len(e[1]) for e in entries)
+        chunks.append(tuple(np.concatenate(parts) for parts in zip(*entries)) if entries else None)
+        test_ptr.append(test_ptr[-1] + n)
+        if len(tests) % 100 == 0:
+            print(f"   ... indexed {len(tests)} reports ({len(file_ids)} source files)")
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for (name, _), files in zip(reports, pool.map(_read_lines, [p for _, p in reports], chunksize=8)):
+                add(name, files)
+    else:
+        for name, xml_path in reports:
+            add(name, _read_lines(xml_path))
+
+    # Line ids: files in name order, lines ascending within a file
+    names = sorted(file_ids)
+    order = [file_ids[n] for n in names]
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    sizes = np.asarray([len(universe[fid][0]) for fid in order], dtype=np.int64)
+    file_ptr = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+    line_nr = np.concatenate([universe[fid][0] for fid in order]) if order else np.zeros(0, dtype=np.int32)
+    line_totals = np.concatenate([universe[fid][1] for fid in order]) if order else np.zeros((0, 2), dtype=np.int32)
+    line_keys = (np.repeat(np.arange(len(order), dtype=np.int64), sizes) << 32) | line_nr.astype(np.int64)
+
+    kept = [c for c in chunks if c is not None]
+    ent_file = np.concatenate([c[0] for c in kept]) if kept else np.zeros(0, dtype=np.int32)
+    ent_nr = np.concatenate([c[1] for c in kept]) if kept else np.zeros(0, dtype=np.int32)
+    test_counts = np.concatenate([c[2] for c in kept]) if kept else np.zeros((0, 4), dtype=np.int32)
+    test_lines = np.searchsorted(line_keys, (rank[ent_file] << 32) | ent_nr.astype(np.int64)).astype(np.int32)
+    test_ptr = np.asarray(test_ptr, dtype=np.int64)
+    # Lines ascending within every test row ...
+    rows = np.repeat(np.arange(len(tests)), np.diff(test_ptr))
+    by_row = np.lexsort((test_lines, rows))
+    test_lines, test_counts = test_lines[by_row], test_counts[by_row]
+    # ... and the transpose: a stable sort by line keeps the tests of a line ascending
+    line_entries = np.argsort(test_lines, kind='stable').astype(np.int64)
+    line_ptr = np.concatenate(([0], np.cumsum(np.bincount(test_lines, minlength=len(line_nr))))).astype(np.int64)
+
+    os.makedirs(index_dir, exist_ok=True)
+    for name, array in (("file_ptr", file_ptr), ("line_nr", line_nr), ("line_totals", line_totals),
+                        ("test_ptr", test_ptr), ("test_lines", test_lines), ("test_counts", test_counts),
+                        ("line_ptr", line_ptr), ("line_entries", line_entries)):
+        np.save(os.path.join(index_dir, f"{name}.npy"), array)
+    with open(os.path.join(index_dir, "files.json"), "w") as f:
+        json.dump(names, f)
+    with open(os.path.join(index_dir, "tests.json"), "w") as f:
+        json.dump(tests, f)
+    with open(os.path.join(index_dir, "meta.json"), "w") as f:
+        json.dump({"version": INDEX_VERSION, "project": project_name, "input_dir": input_dir, "n_tests": len(tests),
+                   "n_files": len(names), "n_lines": len(line_nr), "nnz": int(test_ptr[-1])}, f, indent=2)
+
+    print(f"🎉 Indexed {len(tests)} tests x {len(line_nr)} lines of {len(names)} files "
+          f"({int(test_ptr[-1])} covered entries) in {index_dir}")
+    return index_dir
+
+class LineIndex:
+    """Read access to a project's line index (arrays are memory-mapped)"""
+
+    def __init__(self, index_dir, mmap=True):
+        self.index_dir = index_dir
+        mode = 'r' if mmap else None
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported line index version in {index_dir}: {self.meta.get('version')}")
+        with open(os.path.join(index_dir, "files.json")) as f:
+            self.files = json.load(f)
+        with open(os.path.join(index_dir, "tests.json")) as f:
+            self.tests = json.load(f)
+        for name in ("file_ptr", "line_nr", "line_totals", "test_ptr", "test_lines", "test_counts", "line_ptr", "line_entries"):
+            setattr(self, name, np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode=mode))
+        self._file_ids = None
+        self._test_ids = None
+        self._categories = None
+
+    @classmethod
+    def open(cls, project_name, index_root="line_index", mmap=True):
+        return cls(os.path.join(index_root, project_name), mmap)
+
+    @property
+    def n_tests(self):
+        return len(self.tests)
+
+    @property
+    def n_lines(self):
+        return len(self.line_nr)
+
+    def categories(self):
+        """Category of every test as an array aligned with self.tests"""
+        if self._categories is None:
+            self._categories = np.asarray([t.split("/", 1)[0] if "/" in t else "" for t in self.tests])
+        return self._categories
+
+    def find_file(self, name):
+        """Index of a source file given as "org/foo/Bar.java" or any unique path suffix ("Bar.java")"""
+        if self._file_ids is None:
+            self._file_ids = {f: i for i, f in enumerate(self.files)}
+        if name in self._file_ids:
+            return self._file_ids[name]
+        matches = [i for i, f in enumerate(self.files) if f.endswith("/" + name)]
+        if not matches:
+            raise KeyError(f"No source file matches {name}")
+        if len(matches) > 1:
+            raise ValueError(f"{name} is ambiguous: {', '.join(self.files[i] for i in matches[:5])}")
+        return matches[0]
+
+    def find_test(self, name):
+        """Index of a test given as "<category>/<report name>", a report name or a test id (org.foo.BarTest#testX)"""
+        if self._test_ids is None:
+            self._test_ids = {t: i for i, t in enumerate(self.tests)}
+        if name in self._test_ids:
+            return self._test_ids[name]
+        report = name.replace("#", "_").replace(".", "_")
+        matches = [i for i, t in enumerate(self.tests) if t.split("/", 1)[-1] in (name, report)]
+        if not matches:
+            raise KeyError(f"No test matches {name}")
+        if len(matches) > 1:
+            raise ValueError(f"{name} is ambiguous: {', '.join(self.tests[i] for i in matches[:5])}")
+        return matches[0]
+
+    def _file(self, file):
+        return file if isinstance(file, (int, np.integer)) else self.find_file(file)
+
+    def line_id(self, file, nr):
+        """Line id of line `nr` of a file, or None if that line holds no code"""
+        f = self._file(file)
+        lo, hi = int(self.file_ptr[f]), int(self.file_ptr[f + 1])
+        i = lo + int(np.searchsorted(self.line_nr[lo:hi], nr))
+        return i if i < hi and self.line_nr[i] == nr else None
+
+    def _line_tests(self, lo, hi):
+        """(test indices, entry positions) of the covering entries of line ids lo:hi"""
+        entries = np.asarray(self.line_entries[self.line_ptr[lo]:self.line_ptr[hi]])
+        return np.searchsorted(self.test_ptr, entries, side="right") - 1, entries
+
+    def covering_tests(self, file, nr):
+        """Bitmap (bool array over self.tests) of the tests covering a line"""
+        mask = np.zeros(self.n_tests, dtype=bool)
+        lid = self.line_id(file, nr)
+        if lid is not None:
+            mask[self._line_tests(lid, lid + 1)[0]] = True
+        return mask
+
+    def tests_of_line(self, file, nr, category=None):
+        """Tests covering a line: [(test name, mi, ci, mb, cb), ...]"""
+        lid = self.line_id(file, nr)
+        if lid is None:
+            return []
+        tests, entries = self._line_tests(lid, lid + 1)
+        rows = [(self.tests[t], *c) for t, c in zip(tests.tolist(), np.asarray(self.test_counts[entries]).tolist())]
+        return [r for r in rows if not category or r[0].startswith(category + "/")]
+
+    def lines_of_test(self, test):
+        """Lines a test covers: [(source file, line number, mi, ci, mb, cb), ...]"""
+        t = test if isinstance(test, (int, np.integer)) else self.find_test(test)
+        lo, hi = self.test_ptr[t], self.test_ptr[t + 1]
+        lines = np.asarray(self.test_lines[lo:hi])
+        files = np.searchsorted(self.file_ptr, lines, side="right") - 1
+        return [(self.files[f], nr, *c) for f, nr, c in zip(files.tolist(), np.asarray(self.line_nr[lines]).tolist(),
+                                                            np.asarray(self.test_counts[lo:hi]).tolist())]
+
+    def heatmap(self, file, category=None):
+        """Per line of a source file: [(line number, instructions, branches, covering tests), ...]"""
+        f = self._file(file)
+        lo, hi = int(self.file_ptr[f]), int(self.file_ptr[f + 1])
+        per_line = np.diff(np.asarray(self.line_ptr[lo:hi + 1]))
+        if category:
+            tests, _ = self._line_tests(lo, hi)
+            line_of_entry = np.repeat(np.arange(hi - lo), per_line)
+            per_line = np.bincount(line_of_entry[self.categories()[tests] == category], minlength=hi - lo)
+        totals = np.asarray(self.line_totals[lo:hi])
+        return [(nr, inst, br, n) for nr, (inst, br), n in zip(np.asarray(self.line_nr[lo:hi]).tolist(), totals.tolist(), per_line.tolist())]
+
+def parse_location(location):
+    """'org/foo/Bar.java:42' -> ('org/foo/Bar.java', 42)"""
+    file, sep, nr = location.rpartition(":")
+    if not sep or not nr.isdigit():
+        raise argparse.ArgumentTypeError(f"expected <source file>:<line>, got {location}")
+    return file, int(nr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Line-level coverage index: which tests cover which lines")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Build the index from experiment_data/<project> XMLs (loose or stored)")
+    p_build.add_argument("project_names", nargs="+")
+    p_build.add_argument("--input-root", default="experiment_data")
+    p_build.add_argument("--jobs", type=int, default=1, help="Worker processes for XML parsing")
+
+    p_line = sub.add_parser("tests-of-line", help="Tests covering a line, with its mi/ci/mb/cb in each")
+    p_line.add_argument("project_name")
+    p_line.add_argument("location", type=parse_location, help="<source file>:<line>, e.g. Bar.java:42 or org/foo/Bar.java:42")
+    p_line.add_argument("--category", default=None, help="Only tests of this category (pt, nonpt)")
+
+    p_test = sub.add_parser("lines-of-test", help="Lines a test covers")
+    p_test.add_argument("project_name")
+    p_test.add_argument("test", help="<category>/<report name>, a report name or a test id (org.foo.BarTest#testX)")
+
+    p_heat = sub.add_parser("heatmap", help="Number of covering tests for every line of a source file")
+    p_heat.add_argument("project_name")
+    p_heat.add_argument("file", help="Source file, e.g. Bar.java or org/foo/Bar.java")
+    p_heat.add_argument("--category", default=None, help="Only count tests of this category (pt, nonpt)")
+
+    p_info = sub.add_parser("info", help="Print the size of a project's index")
+    p_info.add_argument("project_name")
+
+    for p in (p_build, p_line, p_test, p_heat, p_info):
+        p.add_argument("--index-root", default="line_index")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        for name in args.project_names:
+            build_index(name, args.input_root, args.index_root, max(1, args.jobs))
+        sys.exit(0)
+
+    start = time.perf_counter()
+    index = LineIndex.open(args.project_name, args.index_root)
+    try:
+        if args.command == "tests-of-line":
+            rows = index.tests_of_line(*args.location, category=args.category)
+            for test, mi, ci, mb, cb in rows:
+                print(f"   {test}  (ci {ci}, mi {mi}, cb {cb}, mb {mb})")
+            print(f"🎯 {len(rows)} tests cover {args.location[0]}:{args.location[1]}")
+        elif args.command == "lines-of-test":
+            rows = index.lines_of_test(args.test)
+            for file, nr, mi, ci, mb, cb in rows:
+                print(f"   {file}:{nr}  (ci {ci}, mi {mi}, cb {cb}, mb {mb})")
+            print(f"🎯 {len(rows)} lines covered")
+        elif args.command == "heatmap":
+            rows = index.heatmap(args.file, args.category)
+            peak = max((n for *_, n in rows), default=0) or 1
+            for nr, inst, br, n in rows:
+                print(f"   {nr:>6}  {n:>6} tests  {'█' * round(40 * n / peak)}")
+            print(f"🔥 {index.files[index.find_file(args.file)]}: {sum(1 for *_, n in rows if n)}/{len(rows)} lines covered")
+        elif args.command == "info":
+            size = sum(os.path.getsize(os.path.join(index.index_dir, f)) for f in os.listdir(index.index_dir))
+            print(f"📊 {args.project_name}: {index.n_tests} tests x {index.n_lines} lines of {len(index.files)} files, "
+                  f"{index.meta['nnz']} covered entries, {size / 1024 / 1024:.1f} MB on disk")
+    except (KeyError, ValueError) as e:
+        print(f"❌ {e.args[0] if e.args else e}")
+        sys.exit(1)
+    print(f"⏱️ {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,227 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from xml_validator import walk_reports
+
+# Offline, bulk report generation for runs made with auto_runner --exec-only.
+#
+# auto_runner stores one small jacoco .exec per test next to where the XML would be
+# (experiment_data/<project>/<category>/<test>.exec) and copies the compiled classes
+# once to experiment_data/<project>/classes/. This module feeds all of them to ONE
+# JVM (the JaCoCo core/report API from the CLI jar): class files are read once, every
+# class is analyzed once without execution data, and per test only the classes that
+# actually have execution data are analyzed again. Batch mode compiles the same
+# BulkReport in the container to convert the dumps of each batch.
+
+BULK_REPORT_SOURCE = """
+import java.io.*;
+import java.nio.file.*;
+import java.util.*;
+import java.util.stream.*;
+
+import org.jacoco.core.analysis.*;
+import org.jacoco.core.data.*;
+import org.jacoco.core.internal.data.CRC64;
+import org.jacoco.core.tools.ExecFileLoader;
+import org.jacoco.report.*;
+import org.jacoco.report.xml.XMLFormatter;
+
+public class BulkReport {
+
+    static final class ClassFile {
+        final String location;
+        final byte[] bytes;
+        final long id;
+        ClassFile(String location, byte[] bytes) {
+            this.location = location;
+            this.bytes = bytes;
+            this.id = CRC64.classId(bytes);
+        }
+    }
+
+    static final ISourceFileLocator NO_SOURCES = new ISourceFileLocator() {
+        public Reader getSourceFile(String packageName, String fileName) { return null; }
+        public int getTabWidth() { return 4; }
+    };
+
+    // Usage: BulkReport <task list> <xml|csv> <class dir>...
+    // Each task list line is "<input .exec>\\t<output file>".
+    public static void main(String[] args) throws Exception {
+        List<ClassFile> classes = new ArrayList<>();
+        for (int i = 2; i < args.length; i++) {
+            try (Stream<Path> files = Files.walk(Paths.get(args[i]))) {
+                for (Path p : files.filter(f -> f.toString().endsWith(".class")).collect(Collectors.toList())) {
+                    classes.add(new ClassFile(p.toString(), Files.readAllBytes(p)));
+                }
+            }
+        }
+
+        // Analyze every class once without execution data; reused for all tests that did not touch it
+        Map<Long, IClassCoverage> baseline = new HashMap<>();
+        Analyzer baselineAnalyzer = new Analyzer(new ExecutionDataStore(), cc -> baseline.put(cc.getId(), cc));
+        List<ClassFile> analyzable = new ArrayList<>();
+        for (ClassFile cf : classes) {
+            try {
+                baselineAnalyzer.analyzeClass(cf.bytes, cf.location);
+                analyzable.add(cf);
+            } catch (IOException e) {
+                System.err.println("skip " + cf.location + ": " + e.getMessage());
+            }
+        }
+        System.out.println("classes " + analyzable.size());
+
+        boolean csv = "csv".equals(args[1]);
+        int done = 0, failed = 0;
+        for (String line : Files.readAllLines(Paths.get(args[0]))) {
+            String[] task = line.split("\\t");
+            if (task.length != 2) continue;
+            try {
+                ExecFileLoader loader = new ExecFileLoader();
+                loader.load(new File(task[0]));
+                ExecutionDataStore store = loader.getExecutionDataStore();
+                CoverageBuilder builder = new CoverageBuilder();
+                Analyzer analyzer = new Analyzer(store, builder);
+                for (ClassFile cf : analyzable) {
+                    if (store.get(cf.id) == null) {
+                        IClassCoverage cached = baseline.get(cf.id);
+                        if (cached != null) builder.visitCoverage(cached);
+                    } else {
+                        analyzer.analyzeClass(cf.bytes, cf.location);
+                    }
+                }
+                IBundleCoverage bundle = builder.getBundle(new File(task[0]).getName());
+                Path tmp = Paths.get(task[1] + ".tmp");
+                Files.createDirectories(tmp.toAbsolutePath().getParent());
+                if (csv) writeCsv(bundle, tmp);
+                else writeXml(loader, bundle, tmp);
+                Files.move(tmp, Paths.get(task[1]), StandardCopyOption.REPLACE_EXISTING);
+                done++;
+            } catch (Exception e) {
+                failed++;
+                System.err.println("failed " + task[0] + ": " + e);
+            }
+            if ((done + failed) % 100 == 0) System.out.println("progress " + (done + failed));
+        }
+        System.out.println("done " + done + " failed " + failed);
+    }
+
+    static void writeXml(ExecFileLoader loader, IBundleCoverage bundle, Path out) throws IOException {
+        OutputStream os = new BufferedOutputStream(Files.newOutputStream(out));
+        IReportVisitor visitor = new XMLFormatter().createVisitor(os);
+        visitor.visitInfo(loader.getSessionInfoStore().getInfos(), loader.getExecutionDataStore().getContents());
+        visitor.visitBundle(bundle, NO_SOURCES);
+        visitor.visitEnd(); // closes the stream
+    }
+
+    // Same columns as xml_validator.CSV_FIELDS
+    static void writeCsv(IBundleCoverage bundle, Path out) throws IOException {
+        try (PrintWriter w = new PrintWriter(Files.newBufferedWriter(out))) {
+            w.print("Package,Class,Method,Desc,Inst_Missed,Inst_Covered,Line_Missed,Line_Covered\\r\\n");
+            for (IPackageCoverage p : bundle.getPackages()) {
+                for (IClassCoverage c : p.getClasses()) {
+                    for (IMethodCoverage m : c.getMethods()) {
+                        ICounter ins = m.getInstructionCounter();
+                        ICounter ln = m.getLineCounter();
+                        if (ins.getTotalCount() == 0) continue;
+                        w.print(field(p.getName()) + "," + field(c.getName()) + "," + field(m.getName()) + "," + field(m.getDesc()) + ","
+                                + ins.getMissedCount() + "," + ins.getCoveredCount() + "," + ln.getMissedCount() + "," + ln.getCoveredCount() + "\\r\\n");
+                    }
+                }
+            }
+        }
+    }
+
+    static String field(String s) {
+        if (s == null) return "";
+        if (s.contains(",") || s.contains("\\"") || s.contains("\\n")) return "\\"" + s.replace("\\"", "\\"\\"") + "\\"";
+        return s;
+    }
+}
+"""
+
+def find_exec_tasks(project_name, input_root="experiment_data", fmt="xml", output_root="coverage_csvs", force=False):
+    """(exec path, output path) for every stored .exec whose output is missing or older"""
+    input_dir = os.path.join(input_root, project_name)
+    tasks = []
+    for exec_path in walk_reports(input_dir, ".exec"):
+        rel = os.path.relpath(exec_path, input_dir)[:-len(".exec")]
+        if fmt == "xml":
+            out_path = os.path.join(input_dir, rel + ".xml")
+        else:
+            out_path = os.path.join(output_root, project_name, rel + ".csv")
+        if not force and os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(exec_path):
+            continue
+        tasks.append((exec_path, out_path))
+    return tasks
+
+def generate_reports(project_name, jacoco_cli, input_root="experiment_data", fmt="xml", output_root="coverage_csvs", force=False, java="java"):
+    """Builds XML (next to the .exec files) or CSV reports for all tests of a project in one JVM"""
+    input_dir = os.path.join(input_root, project_name)
+    classes_dir = os.path.join(input_dir, "classes")
+    if not os.path.exists(jacoco_cli):
+        print(f"❌ Error: JaCoCo CLI jar '{jacoco_cli}' not found locally!")
+        return False
+    if not os.path.isdir(classes_dir):
+        print(f"❌ No class directories found at {classes_dir} (run auto_runner with --exec-only first)")
+        return False
+
+    tasks = find_exec_tasks(project_name, input_root, fmt, output_root, force)
+    print(f"🏭 Generating {len(tasks)} {fmt.upper()} reports for {project_name} in one JVM...")
+    if not tasks:
+        return True
+
+    work_dir = tempfile.mkdtemp(prefix="ptcov_bulk_")
+    try:
+        source = os.path.join(work_dir, "BulkReport.java")
+        with open(source, "w") as f:
+            f.write(BULK_REPORT_SOURCE)
+        task_list = os.path.join(work_dir, "tasks.tsv")
+        with open(task_list, "w") as f:
+            for exec_path, out_path in tasks:
+                f.write(f"{os.path.abspath(exec_path)}\t{os.path.abspath(out_path)}\n")
+
+        start = time.monotonic()
+        # Single-file source launch (Java 11+); the CLI jar bundles jacoco core/report and ASM
+        proc = subprocess.Popen([java, "-cp", jacoco_cli, source, task_list, fmt, classes_dir],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding='utf-8', errors='ignore')
+        for line in proc.stdout:
+            line = line.rstrip()
+            if line.startswith("progress "):
+                print(f"   ... generated {line.split()[1]}/{len(tasks)} reports")
+            elif line.startswith("classes "):
+                print(f"   ℹ️ Analyzed {line.split()[1]} classes once")
+            elif line.startswith("done "):
+                print(f"   ✅ {line}")
+            else:
+                print(f"   {line}")
+        proc.wait()
+        elapsed = time.monotonic() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if proc.returncode != 0:
+        print(f"❌ Bulk report generation failed (exit {proc.returncode})")
+        return False
+    print(f"🎉 Finished in {elapsed:.1f}s ({elapsed / len(tasks):.2f}s per test).")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate per-test JaCoCo reports offline from stored .exec files")
+    parser.add_argument("project_names", nargs="+", help="Project (container) names under the input root")
+    parser.add_argument("--jacoco-cli", default="jacococli.jar", help="Path to the JaCoCo CLI (nodeps) jar")
+    parser.add_argument("--input-root", default="experiment_data", help="Root output directory of auto_runner")
+    parser.add_argument("--format", choices=["xml", "csv", "store"], default="xml",
+                        help="xml: next to the .exec files; csv: xml_validator layout; store: XML, then the columnar coverage store")
+    parser.add_argument("--output-root", default="coverage_csvs", help="Root directory for --format csv")
+    parser.add_argument("--force", action="store_true", help="Regenerate reports that are already up to date")
+    args = parser.parse_args()
+
+    for name in args.project_names:
+        fmt = "xml" if args.format == "store" else args.format
+        if generate_reports(name, args.jacoco_cli, args.input_root, fmt, args.output_root, args.force) and args.format == "store":
+            from coverage_store import build_store
+            build_store(name, args.input_root)
@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+from auto_runner import ProjectRunner, RunnerError, add_runner_arguments, runner_options
+
+# Runs the auto_runner pipeline for many project containers in one process.
+#
+# Projects come from the command line or a manifest and run concurrently (at most
+# --max-projects at a time). The host's CPU/memory budget is split evenly over the
+# project slots and applied to every container of a project (the project container
+# and its worker clones) with docker update / docker run limits. Each project writes
+# its messages to OUTPUT_DIR/<container>/runner.log; the console shows a progress table.
+
+def parse_memory(value):
+    """'512m', '4g', '1024' (bytes) -> bytes"""
+    value = str(value).strip().lower()
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+def host_memory_available():
+    """MemAvailable of the host in bytes (None if unknown)"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def load_manifest(path):
+    """Projects from a manifest: a JSON list (names or {"container": ..., <ProjectRunner option>: ...})
+    or a text file with one container name per line ('#' starts a comment)."""
+    with open(path) as f:
+        text = f.read()
+    if path.endswith(".json"):
+        projects = []
+        for entry in json.loads(text):
+            if isinstance(entry, str):
+                projects.append((entry, {}))
+            else:
+                entry = dict(entry)
+                projects.append((entry.pop("container"), entry))
+        return projects
+    names = [line.split("#", 1)[0].strip() for line in text.splitlines()]
+    return [(name, {}) for name in names if name]
+
+class Orchestrator:
+    """Runs ProjectRunners concurrently under a concurrency cap and CPU/memory budgets"""
+
+    def __init__(self, projects, defaults, max_projects=2, cpus=None, memory=None, status_interval=60):
+        self.max_projects = max(1, max_projects)
+        self.cpus = cpus
+        self.memory = parse_memory(memory) if memory else None
+        self.status_interval = status_interval
+        self.runners = []
+        for container, overrides in projects:
+            options = dict(defaults, **overrides)
+            options["container_limits"] = self.project_limits(options.get("workers", 1))
+            self.runners.append(ProjectRunner(container, **options))
+        self.results = {} # container -> "ok" or error message
+        self.summaries = {} # container -> last ledger summary of a finished project (its ledger is closed)
+        self.started = {}
+        self.lock = threading.Lock()
+
+    def project_limits(self, workers):
+        """Per-container limits: one project slot's share of the budget, split over its worker containers"""
+        if not self.cpus and not self.memory:
+            return None
+        containers = max(1, workers)
+        limits = {}
+        if self.cpus:
+            limits["cpus"] = round(self.cpus / self.max_projects / containers, 2)
+        if self.memory:
+            limits["memory"] = f"{self.memory // self.max_projects // containers // (1024 ** 2)}m"
+        return limits
+
+    def _run_project(self, runner):
+        log_path = os.path.join(runner.output_dir, runner.container_name, "runner.log")
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        with open(log_path, "a") as log:
+            runner.out = log
+            try:
+                runner.run()
+                result = "ok"
+            except RunnerError as e:
+                runner.log(f"❌ {e}")
+                result = str(e)
+            except Exception as e:
+                runner.log(f"❌ Runner crashed: {e!r}")
+                result = f"crashed: {e!r}"
+        if result != "ok":
+            runner.phase = "failed"
+        with self.lock:
+            self.results[runner.container_name] = result
+            # Keep the final counts for the status table and release the SQLite connection
+            if runner.ledger is not None:
+                self.summaries[runner.container_name] = runner.ledger.summary()
+                runner.ledger.close()
+                runner.ledger = None
+        print(f"{'✅' if result == 'ok' else '❌'} {runner.container_name}: {result} "
+              f"({(time.monotonic() - self.started[runner.container_name]) / 60:.1f} min)", flush=True)
+
+    def _can_start(self, running):
+        if len(running) >= self.max_projects:
+            return False
+        if self.memory and running:
+            # Do not start another project if the host is already short on memory
+            available = host_memory_available()
+            if available is not None and available < self.memory // self.max_projects:
+                return False
+        return True
+
+    def run(self):
+        pending = list(self.runners)
+        running = {}
+        last_status = time.monotonic()
+        print(f"🎛️ Orchestrating {len(pending)} projects, up to {self.max_projects} at a time"
+              f"{f', {self.cpus} CPUs' if self.cpus else ''}{f', {self.memory / 1024 ** 3:.1f} GiB' if self.memory else ''}")
+        while pending or running:
+            while pending and self._can_start(running):
+                runner = pending.pop(0)
+                self.started[runner.container_name] = time.monotonic()
+                thread = threading.Thread(target=self._run_project, args=(runner,), daemon=True)
+                thread.start()
+                running[runner.container_name] = (runner, thread)
+                print(f"▶️ Started {runner.container_name} (log: {os.path.join(runner.output_dir, runner.container_name, 'runner.log')})", flush=True)
+            for name, (runner, thread) in list(running.items()):
+                if not thread.is_alive():
+                    del running[name]
+            if time.monotonic() - last_status >= self.status_interval:
+                self.print_status([r for r, _ in running.values()], len(pending))
+                last_status = time.monotonic()
+            time.sleep(1)
+        self.print_status([], 0)
+        return all(result == "ok" for result in self.results.values())
+
+    def print_status(self, running, queued):
+        with self.lock:
+            lines = [self._status_line(runner) for runner in running + [r for r in self.runners if r.container_name in self.results]]
+        print(f"\n📋 {len(running)} running, {queued} queued, {len(self.results)} finished")
+        for line in lines:
+            print(line)
+        sys.stdout.flush()
+
+    def _status_line(self, runner):
+        line = f"   {runner.container_name:<40} {runner.phase:<10}"
+        summary = runner.ledger.summary() if runner.ledger is not None else self.summaries.get(runner.container_name)
+        if summary is not None:
+            for category in ("pt", "nonpt"):
+                counts = summary["counts"].get(category)
+                if counts:
+                    total = sum(counts.values())
+                    line += f" {category} {total - counts['pending'] - counts['running']}/{total}"
+            run = summary["run"]
+            if run and run["eta_seconds"] is not None:
+                line += f"  ETA {run['eta_seconds'] / 3600:.1f}h"
+        return line
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the auto_runner pipeline for many projects under host resource budgets")
+    parser.add_argument("containers", nargs="*", help="Project container names")
+    parser.add_argument("--manifest", default=None, help="JSON list or text file of containers (JSON entries may override runner options)")
+    parser.add_argument("--max-projects", type=int, default=2, help="How many projects run at the same time (default: 2)")
+    parser.add_argument("--cpus", type=float, default=None, help="Total CPUs for all project containers (docker --cpus)")
+    parser.add_argument("--memory", default=None, help="Total memory for all project containers, e.g. 64g")
+    parser.add_argument("--status-interval", type=int, default=60, help="Seconds between progress tables (default: 60)")
+    add_runner_arguments(parser)
+    args = parser.parse_args()
+
+    projects = [(name, {}) for name in args.containers]
+    if args.manifest:
+        projects += load_manifest(args.manifest)
+    if not projects:
+        parser.error("no projects given (container names or --manifest)")
+
+    try:
+        orchestrator = Orchestrator(projects, runner_options(parser, args), args.max_projects,
+                                    args.cpus, args.memory, args.status_interval)
+    except ValueError as e: # e.g. an invalid --time-budget or --memory
+        parser.error(str(e))
+    sys.exit(0 if orchestrator.run() else 1)
@@ -1,3 +1,4 @@
+import os
 import xml.etree.ElementTree as ET
 
 # JaCoCo 插件配置片段
@@ -23,6 +24,33 @@ JACOCO_PLUGIN = """
 </plugin>
 """
 
+# 快速测试 profile 的 id，auto_runner 通过 -P 激活
+FAST_PROFILE_ID = "pt-coverage-fast"
+
+# 每次单测运行都不需要的插件（artifactId 关键字），在 profile 里把它们的 execution 解绑
+FAST_SKIP_PLUGINS = [
+    "apache-rat-plugin", "maven-checkstyle-plugin", "maven-enforcer-plugin",
+    "spotbugs-maven-plugin", "findbugs-maven-plugin", "maven-javadoc-plugin",
+    "license-maven-plugin", "maven-license-plugin", "animal-sniffer-maven-plugin",
+    "git-commit-id-plugin", "git-commit-id-maven-plugin", "maven-pmd-plugin",
+    "spotless-maven-plugin", "forbiddenapis", "japicmp-maven-plugin", "revapi-maven-plugin",
+]
+
+# 对应插件的 skip 属性（对父 POM 里声明、当前文件看不到的插件也生效）
+FAST_SKIP_PROPERTIES = [
+    "rat.skip", "checkstyle.skip", "enforcer.skip", "spotbugs.skip", "findbugs.skip",
+    "maven.javadoc.skip", "license.skip", "animal.sniffer.skip", "maven.gitcommitid.skip",
+    "pmd.skip", "cpd.skip", "spotless.check.skip", "forbiddenapis.skip", "japicmp.skip", "revapi.skip",
+]
+
+# 减少 surefire 每次运行的输出开销的配置
+# 注意：不设置 forkCount/reuseForks —— 1/true 本来就是 surefire 的默认值，省不了 fork，
+# 反而会覆盖项目自己的设置（例如 forkCount=0）
+FAST_SUREFIRE_CONFIG = {
+    "trimStackTrace": "true",
+    "redirectTestOutputToFile": "true",
+}
+
 def inject_jacoco_into_pom(pom_path):
     print(f"💉 Injecting JaCoCo into {pom_path}...")
     
@@ -152,7 +180,129 @@ def inject_jacoco_into_pom(pom_path):
     tree.write(pom_path, encoding='utf-8', xml_declaration=True)
     print("   ✅ JaCoCo injected successfully.")
 
+def inject_fast_profile(pom_path):
+    """Add (or replace) the pt-coverage-fast profile that strips per-run build overhead"""
+    print(f"⚡ Injecting {FAST_PROFILE_ID} profile into {pom_path}...")
+
+    ET.register_namespace('', "http://maven.apache.org/POM/4.0.0")
+    tree = ET.parse(pom_path)
+    root = tree.getroot()
+
+    ns = {'mvn': 'http://maven.apache.org/POM/4.0.0'}
+
+    # 1. 找到 <profiles>，没有就创建；已有同名 profile 则删掉重建，保证幂等
+    profiles = root.find('mvn:profiles', ns)
+    if profiles is None:
+        profiles = ET.SubElement(root, 'profiles')
+    for prof in profiles.findall('mvn:profile', ns):
+        pid = prof.find('mvn:id', ns)
+        if pid is not None and pid.text == FAST_PROFILE_ID:
+            profiles.remove(prof)
+
+    profile = ET.SubElement(profiles, 'profile')
+    ET.SubElement(profile, 'id').text = FAST_PROFILE_ID
+
+    # 2. skip 属性
+    properties = ET.SubElement(profile, 'properties')
+    for prop in FAST_SKIP_PROPERTIES:
+        ET.SubElement(properties, prop).text = "true"
+
+    # 3. 收集本文件 build/plugins 和 build/pluginManagement/plugins 里的重型插件
+    plugin_lists = []
+    build = root.find('mvn:build', ns)
+    if build is not None:
+        if build.find('mvn:plugins', ns) is not None:
+            plugin_lists.append(build.find('mvn:plugins', ns))
+        plugin_mgmt = build.find('mvn:pluginManagement', ns)
+        if plugin_mgmt is not None and plugin_mgmt.find('mvn:plugins', ns) is not None:
+            plugin_lists.append(plugin_mgmt.find('mvn:plugins', ns))
+
+    profile_build = ET.SubElement(profile, 'build')
+    profile_plugins = ET.SubElement(profile_build, 'plugins')
+
+    # 同一个插件可能同时出现在 plugins 和 pluginManagement 里（execution 只声明在其中一处），
+    # 所以先按 artifactId 合并两处的 execution id，再统一生成覆盖
+    unbound = {} # artifactId -> (groupId, [execution id, ...])
+    for p_list in plugin_lists:
+        for p in p_list.findall('mvn:plugin', ns):
+            aid = p.find('mvn:artifactId', ns)
+            if aid is None or aid.text is None:
+                continue
+            if not any(name in aid.text for name in FAST_SKIP_PLUGINS):
+                continue
+            gid = p.find('mvn:groupId', ns)
+            group, exe_ids = unbound.setdefault(aid.text, (gid.text if gid is not None else None, []))
+            if group is None and gid is not None:
+                unbound[aid.text] = (gid.text, exe_ids)
+            executions = p.find('mvn:executions', ns)
+            if executions is not None:
+                for exe in executions.findall('mvn:execution', ns):
+                    exe_id = exe.find('mvn:id', ns)
+                    # 没有 id 的 execution 在 Maven 里就是 default
+                    exe_id = exe_id.text if exe_id is not None else "default"
+                    if exe_id not in exe_ids:
+                        exe_ids.append(exe_id)
+
+    for aid, (group, exe_ids) in unbound.items():
+        # 在 profile 中覆盖同名插件：skip=true，并把每个 execution 的 phase 设为 none
+        override = ET.SubElement(profile_plugins, 'plugin')
+        if group is not None:
+            ET.SubElement(override, 'groupId').text = group
+        ET.SubElement(override, 'artifactId').text = aid
+        config = ET.SubElement(override, 'configuration')
+        ET.SubElement(config, 'skip').text = "true"
+        if exe_ids:
+            override_executions = ET.SubElement(override, 'executions')
+            for exe_id in exe_ids:
+                new_exe = ET.SubElement(override_executions, 'execution')
+                ET.SubElement(new_exe, 'id').text = exe_id
+                ET.SubElement(new_exe, 'phase').text = "none"
+        print(f"   ➖ Unbound {aid}.")
+
+    # 4. surefire 的输出相关配置（与主配置合并，argLine 保持不变）
+    surefire = ET.SubElement(profile_plugins, 'plugin')
+    ET.SubElement(surefire, 'groupId').text = "org.apache.maven.plugins"
+    ET.SubElement(surefire, 'artifactId').text = "maven-surefire-plugin"
+    surefire_config = ET.SubElement(surefire, 'configuration')
+    for key, value in FAST_SUREFIRE_CONFIG.items():
+        ET.SubElement(surefire_config, key).text = value
+
+    # 5. 保存文件
+    tree.write(pom_path, encoding='utf-8', xml_declaration=True)
+    print(f"   ✅ {FAST_PROFILE_ID} profile injected ({len(unbound)} plugins unbound).")
+
+def module_poms(pom_path):
+    """Paths (relative to pom_path's directory) of the POMs of its <modules>, including modules declared in profiles"""
+    ns = {'mvn': 'http://maven.apache.org/POM/4.0.0'}
+    children = []
+    for module in ET.parse(pom_path).getroot().findall('.//mvn:modules/mvn:module', ns):
+        if not module.text:
+            continue
+        child = module.text.strip()
+        if not child.endswith(".xml"):
+            child = os.path.join(child, "pom.xml")
+        children.append(os.path.normpath(child))
+    return children
+
+def find_module_poms(pom_path):
+    """Return pom_path plus the POMs of all (nested) <modules>, including modules declared in profiles"""
+    found = []
+    pending = [os.path.abspath(pom_path)]
+    while pending:
+        current = pending.pop(0)
+        if current in found or not os.path.exists(current):
+            continue
+        found.append(current)
+        base = os.path.dirname(current)
+        pending.extend(os.path.normpath(os.path.join(base, child)) for child in module_poms(current))
+    return found
+
 if __name__ == "__main__":
     import sys
-    target_pom = sys.argv[1] if len(sys.argv) > 1 else "pom.xml"
-    inject_jacoco_into_pom(target_pom)
\ No newline at end of file
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    target_pom = args[0] if args else "pom.xml"
+    inject_jacoco_into_pom(target_pom)
+    if "--fast" in sys.argv:
+        # 根 POM 与所有子模块 POM 一次处理完
+        for module_pom in find_module_poms(target_pom):
+            inject_fast_profile(module_pom)
\ No newline at end of file
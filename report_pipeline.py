@@ -0,0 +1,170 @@
+import os
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from xml_validator import convert_one, load_hash_manifest, save_hash_manifest
+
+# Report collection and CSV conversion overlapping with test execution (auto_runner --pipeline).
+#
+# A worker thread runs a test, leaves its report staged in the container and hands the
+# test to a bounded collect queue, then starts the next test right away. Collector
+# threads copy staged reports out, record the outcome in the run ledger and pass each
+# XML on to a process pool that writes its CSV (--convert-csv). A full queue blocks the
+# workers, so the host never falls more than a few reports behind.
+#
+# A test only counts as ok in the ledger once its report is on the host, so a crash
+# loses no finished report: tests that were run but not collected go back to pending,
+# and collected reports without an up-to-date CSV are converted by the catch-up pass
+# of the next run (or by xml_validator, which skips what is already converted).
+
+# Manifest updates are flushed after this many conversions
+MANIFEST_FLUSH = 100
+
+class ReportPipeline:
+    """Collect queue + collector threads + converter pool for one step 3 loop"""
+
+    def __init__(self, runner, category, collectors=2, queue_size=8, csv_root=None, convert_jobs=1):
+        self.runner = runner
+        self.category = category
+        self.collect_queue = queue.Queue(maxsize=max(1, queue_size))
+        self.threads = [threading.Thread(target=self._collector, name=f"collector-{i}", daemon=True)
+                        for i in range(max(1, collectors))]
+        self.catch_up_thread = None
+        self.stats = {"collected": 0, "converted": 0, "skipped": 0, "empty": 0, "failed": 0, "max_queue": 0}
+        self.lock = threading.Lock()
+
+        self.csv_dir = os.path.join(csv_root, runner.container_name) if csv_root else None
+        self.pool = None
+        if self.csv_dir and not runner.exec_only:
+            self.manifest = load_hash_manifest(self.csv_dir)
+            self.unsaved = 0
+            # Spawned workers: forking a process that runs threads and subprocesses is not safe
+            self.pool = ProcessPoolExecutor(max_workers=max(1, convert_jobs), mp_context=multiprocessing.get_context("spawn"))
+            # Bounds the reports waiting for (or in) conversion
+            self.convert_slots = threading.BoundedSemaphore(max(1, convert_jobs) * 4)
+
+    def start(self):
+        for t in self.threads: t.start()
+
+    def submit(self, job):
+        """Queue a finished test run (see ProjectRunner.run_single_test(stage=True)); blocks while the queue is full
+
+        Raises RuntimeError instead of blocking forever when no collector is left to drain the queue.
+        """
+        while True:
+            try:
+                self.collect_queue.put(job, timeout=1)
+                break
+            except queue.Full:
+                if not self._collecting():
+                    raise RuntimeError("all report collectors have stopped")
+        with self.lock:
+            self.stats["max_queue"] = max(self.stats["max_queue"], self.collect_queue.qsize())
+
+    def _collector(self):
+        while True:
+            job = self.collect_queue.get()
+            if job is None:
+                return
+            test_id, local_xml = job[1], job[2]
+            try:
+                outcome = self.runner.collect_report(*job)
+            except Exception as e:
+                self.runner.log(f"   ❌ Collecting the report of {test_id} failed: {e}")
+                outcome = {"state": "failed", "log": f"collector error: {e}"}
+            # Nothing may end this thread early: the workers block on a full queue until it is drained
+            try:
+                self.runner.finish_test(self.category, test_id, outcome)
+                with self.lock:
+                    self.stats["collected"] += 1
+                if outcome["state"] == "ok":
+                    self.convert(local_xml)
+            except Exception as e:
+                self.runner.log(f"   ❌ Recording or converting the report of {test_id} failed: {e}")
+
+    def _collecting(self):
+        return any(t.is_alive() for t in self.threads)
+
+    def convert(self, local_xml):
+        """Convert one local report to CSV in the pool (no-op without --convert-csv or when the CSV is up to date)"""
+        if not self.pool:
+            return
+        source = local_xml
+        if not os.path.exists(source) and self.runner.report_store is not None:
+            # Moved into the report store by the collector; read the compressed blob
+            source = self.runner.report_store.get(self.category, os.path.basename(local_xml)[:-len(".xml")])
+        if not source or not os.path.exists(source):
+            return
+        rel_xml = os.path.join(self.category, os.path.basename(local_xml))
+        csv_path = os.path.join(self.csv_dir, rel_xml[:-len(".xml")] + ".csv")
+        if os.path.exists(csv_path) and os.path.getmtime(csv_path) >= os.path.getmtime(source):
+            with self.lock:
+                self.stats["skipped"] += 1
+            return
+        self.convert_slots.acquire()
+        try:
+            future = self.pool.submit(convert_one, source, csv_path, self.manifest.get(rel_xml))
+        except BaseException:
+            # e.g. BrokenProcessPool; the report stays for xml_validator or the next catch-up pass
+            self.convert_slots.release()
+            raise
+        future.add_done_callback(lambda f: self._converted(rel_xml, f))
+
+    def _converted(self, rel_xml, future):
+        self.convert_slots.release()
+        try:
+            status, value = future.result()
+        except Exception as e:
+            status, value = "failed", repr(e)
+        with self.lock:
+            self.stats[status] += 1
+            if status == "failed":
+                self.runner.log(f"   ❌ CSV conversion failed: {rel_xml} ({value})")
+                return
+            if value: self.manifest[rel_xml] = value
+            self.unsaved += 1
+            if self.unsaved >= MANIFEST_FLUSH:
+                save_hash_manifest(self.csv_dir, self.manifest)
+                self.unsaved = 0
+
+    def catch_up(self, local_xmls):
+        """Convert reports of earlier runs whose CSV is missing or older (e.g. after a crash), in the background"""
+        if not self.pool or not local_xmls:
+            return
+        self.catch_up_thread = threading.Thread(target=self._catch_up, args=(local_xmls,), name="catch-up", daemon=True)
+        self.catch_up_thread.start()
+
+    def _catch_up(self, local_xmls):
+        try:
+            for path in local_xmls:
+                self.convert(path)
+        except Exception as e:
+            self.runner.log(f"   ❌ Catch-up conversion stopped: {e}")
+
+    def close(self):
+        """Drain the collect queue, wait for all conversions and save the hash manifest"""
+        for _ in self.threads:
+            # A collector that died cannot take its stop marker; don't wait for room that never comes
+            while self._collecting():
+                try:
+                    self.collect_queue.put(None, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+        for t in self.threads: t.join()
+        if self.collect_queue.qsize():
+            # Only left behind if every collector died; these tests stay 'running' and go back to pending next run
+            self.runner.log(f"   ⚠️ {self.collect_queue.qsize()} finished tests were not collected")
+        if self.catch_up_thread: self.catch_up_thread.join()
+        if self.pool:
+            self.pool.shutdown(wait=True)
+            with self.lock:
+                save_hash_manifest(self.csv_dir, self.manifest)
+        s = self.stats
+        message = f"   🔄 Pipeline: {s['collected']} reports collected (queue peak {s['max_queue']})"
+        if self.pool:
+            message += (f", {s['converted']} converted to CSV, {s['skipped']} up to date, {s['empty']} empty, "
+                        f"{s['failed']} failed -> {self.csv_dir}")
+        self.runner.log(message)
@@ -0,0 +1,276 @@
+import os
+import sys
+import gzip
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from xml_validator import open_report, walk_reports
+
+# Content-addressed, compressed storage of per-test reports (auto_runner --store-reports).
+#
+#   <output root>/<project>/reports/
+#       index.sqlite                   (category, test name) -> sha256 of the uncompressed report
+#       blobs/<ab>/<sha256>.xml.gz     one compressed copy per distinct report (.xml.zst with zstd)
+#
+# Reports of one project are mostly identical test to test and often byte for byte, so
+# exact duplicates are stored once and the rest compress very well. A blob is written to
+# a temp file and renamed, and its mapping is committed before the loose XML is deleted,
+# so an interrupted ingest leaves either the loose report or a complete stored one.
+# Readers (xml_validator, coverage_store) stream the blobs through open_report.
+
+STORE_DIR = "reports"
+INDEX_FILE = "index.sqlite"
+CODECS = {"gzip": ".xml.gz", "zstd": ".xml.zst"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 6}
+CHUNK = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    PRIMARY KEY (category, name)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    stored_bytes INTEGER NOT NULL,
+    PRIMARY KEY (sha256, codec)
+);
+"""
+
+def _compress_to_temp(path, tmp_dir, codec, level):
+    """Worker: compress a report into a temp file while hashing it; returns (sha256, temp path, raw bytes)"""
+    digest = hashlib.sha256()
+    raw = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+    try:
+        with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            if codec == "zstd":
+                out = zstandard.ZstdCompressor(level=level).stream_writer(dst, closefd=False)
+            else:
+                # mtime=0: the same report always gives the same bytes
+                out = gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=level, mtime=0)
+            with out:
+                for chunk in iter(lambda: src.read(CHUNK), b""):
+                    digest.update(chunk)
+                    raw += len(chunk)
+                    out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return digest.hexdigest(), tmp_path, raw
+
+class ReportStore:
+    """Deduplicating, compressed report store of one project (thread-safe)"""
+
+    def __init__(self, root, codec="gzip", level=None):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec} (choose from {', '.join(CODECS)})")
+        if codec == "zstd" and zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package (pip install zstandard)")
+        self.root = root
+        self.codec = codec
+        self.level = level or DEFAULT_LEVELS[codec]
+        self.tmp_dir = os.path.join(root, "blobs", ".tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, INDEX_FILE), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    @classmethod
+    def open(cls, project_name, output_root="experiment_data", codec="gzip", level=None):
+        return cls(os.path.join(output_root, project_name, STORE_DIR), codec, level)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def blob_path(self, sha256, codec):
+        return os.path.join(self.root, "blobs", sha256[:2], sha256 + CODECS[codec])
+
+    def put(self, category, name, path, remove=True):
+        """Store the report at `path` as (category, name); returns (sha256, raw bytes, stored bytes or 0 if deduplicated)"""
+        return self.add_compressed(category, name, path, *_compress_to_temp(path, self.tmp_dir, self.codec, self.level), remove=remove)
+
+    def add_compressed(self, category, name, path, sha256, tmp_path, raw_bytes, remove=True):
+        """Second half of put(): move a compressed temp file into place (or drop it if the blob exists) and map the test to it"""
+        blob = self.blob_path(sha256, self.codec)
+        with self._lock:
+            known = self._conn.execute("SELECT 1 FROM blobs WHERE sha256 = ? AND codec = ?", (sha256, self.codec)).fetchone()
+            if known and os.path.exists(blob):
+                os.remove(tmp_path)
+                # Newer than any CSV converted before this test pointed here (see xml_validator.convert_one)
+                os.utime(blob)
+                stored = 0
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(tmp_path, blob)
+                stored = os.path.getsize(blob)
+                self._conn.execute("INSERT OR REPLACE INTO blobs (sha256, codec, stored_bytes) VALUES (?, ?, ?)",
+                                   (sha256, self.codec, stored))
+            self._conn.execute("INSERT OR REPLACE INTO reports (category, name, sha256, codec, raw_bytes) VALUES (?, ?, ?, ?, ?)",
+                               (category, name, sha256, self.codec, raw_bytes))
+            self._conn.commit()
+        if remove:
+            os.remove(path)
+        return sha256, raw_bytes, stored
+
+    def get(self, category, name):
+        """Blob path of a stored report, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256, codec FROM reports WHERE category = ? AND name = ?", (category, name)).fetchone()
+        return self.blob_path(*row) if row else None
+
+    def remove(self, category, name):
+        """Forget a test's report (its blob stays until gc)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM reports WHERE category = ? AND name = ?", (category, name))
+            self._conn.commit()
+
+    def has(self, category, name):
+        return self.get(category, name) is not None
+
+    def open_report(self, category, name):
+        """Streaming, decompressed binary reader of a stored report"""
+        blob = self.get(category, name)
+        if not blob:
+            raise KeyError(f"{category}/{name}")
+        return open_report(blob)
+
+    def items(self, category=None):
+        """(category, name, blob path) of all stored reports"""
+        sql = "SELECT category, name, sha256, codec FROM reports"
+        params = ()
+        if category:
+            sql += " WHERE category = ?"
+            params = (category,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY category, name", params).fetchall()
+        return [(c, n, self.blob_path(sha, codec)) for c, n, sha, codec in rows]
+
+    def stats(self):
+        with self._lock:
+            reports, raw = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(raw_bytes), 0) FROM reports").fetchone()
+            blobs, stored = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(stored_bytes), 0) FROM blobs").fetchone()
+        return {"reports": reports, "blobs": blobs, "raw_bytes": raw, "stored_bytes": stored}
+
+    def gc(self):
+        """Delete blobs no test maps to any more; returns the number removed"""
+        with self._lock:
+            rows = self._conn.execute("""SELECT sha256, codec FROM blobs WHERE NOT EXISTS
+                                         (SELECT 1 FROM reports r WHERE r.sha256 = blobs.sha256 AND r.codec = blobs.codec)""").fetchall()
+            for sha256, codec in rows:
+                blob = self.blob_path(sha256, codec)
+                if os.path.exists(blob): os.remove(blob)
+                self._conn.execute("DELETE FROM blobs WHERE sha256 = ? AND codec = ?", (sha256, codec))
+            self._conn.commit()
+        return len(rows)
+
+def stored_reports(project_dir):
+    """(category, name, blob path) of the stored reports below a project's output directory (none without a store)"""
+    if not os.path.exists(os.path.join(project_dir, STORE_DIR, INDEX_FILE)):
+        return []
+    store = ReportStore(os.path.join(project_dir, STORE_DIR))
+    try:
+        return store.items()
+    finally:
+        store.close()
+
+def ingest_project(project_name, input_root="experiment_data", codec="gzip", level=None, jobs=1, keep=False):
+    """Move the loose XML reports of a project into its store; returns the store stats"""
+    input_dir = os.path.join(input_root, project_name)
+    if not os.path.exists(input_dir):
+        print(f"❌ Input directory not found: {input_dir}")
+        return None
+    store = ReportStore.open(project_name, input_root, codec, level)
+
+    reports = []
+    for path in walk_reports(input_dir):
+        category, file = os.path.split(os.path.relpath(path, input_dir))
+        if category and os.sep not in category:
+            reports.append((category, file[:-len(".xml")], path))
+    print(f"📦 Storing {len(reports)} reports of {project_name} ({codec})...")
+
+    done = 0
+    def record(category, name, path, result):
+        nonlocal done
+        store.add_compressed(category, name, path, *result, remove=not keep)
+        done += 1
+        if done % 100 == 0:
+            print(f"   ... stored {done}/{len(reports)} reports")
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = pool.map(_compress_to_temp, [p for _, _, p in reports], [store.tmp_dir] * len(reports),
+                               [store.codec] * len(reports), [store.level] * len(reports), chunksize=4)
+            for (category, name, path), result in zip(reports, results):
+                record(category, name, path, result)
+    else:
+        for category, name, path in reports:
+            record(category, name, path, _compress_to_temp(path, store.tmp_dir, store.codec, store.level))
+
+    stats = store.stats()
+    store.close()
+    print_stats(project_name, stats)
+    return stats
+
+def print_stats(project_name, stats):
+    ratio = stats["raw_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0
+    print(f"🗃️ {project_name}: {stats['reports']} reports in {stats['blobs']} distinct blobs, "
+          f"{stats['raw_bytes'] / 1e6:.1f} MB -> {stats['stored_bytes'] / 1e6:.1f} MB ({ratio:.1f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content-addressed, compressed store of per-test JaCoCo reports")
+    parser.add_argument("command", choices=["ingest", "stats", "cat", "gc"],
+                        help="ingest: move loose XMLs into the store; stats; cat: print one report; gc: drop unreferenced blobs")
+    parser.add_argument("project_names", nargs="+", help="Project (container) names; for cat: <project> <category>/<test name>")
+    parser.add_argument("--input-root", default="experiment_data", help="Root output directory of auto_runner")
+    parser.add_argument("--codec", choices=sorted(CODECS), default="gzip", help="Compression for new blobs (default: gzip)")
+    parser.add_argument("--level", type=int, default=None, help="Compression level (default: 6)")
+    parser.add_argument("--jobs", type=int, default=1, help="Compression processes for ingest (default: 1)")
+    parser.add_argument("--keep", action="store_true", help="ingest: keep the loose XML files")
+    args = parser.parse_args()
+
+    if args.command == "cat":
+        if len(args.project_names) != 2 or "/" not in args.project_names[1]:
+            parser.error("cat needs <project> <category>/<test name>, e.g. cat myproject pt/org_foo_BarTest_testX")
+        project, key = args.project_names
+        if not os.path.exists(os.path.join(args.input_root, project, STORE_DIR, INDEX_FILE)):
+            sys.exit(f"❌ No report store for {project}")
+        store = ReportStore.open(project, args.input_root)
+        try:
+            report = store.open_report(*key.split("/", 1))
+        except KeyError:
+            sys.exit(f"❌ No stored report {key} in {project}")
+        with report as f:
+            shutil.copyfileobj(f, sys.stdout.buffer)
+        sys.exit(0)
+
+    for name in args.project_names:
+        if args.command == "ingest":
+            ingest_project(name, args.input_root, args.codec, args.level, max(1, args.jobs), args.keep)
+            continue
+        if not os.path.exists(os.path.join(args.input_root, name, STORE_DIR, INDEX_FILE)):
+            print(f"❌ No report store for {name}")
+            continue
+        store = ReportStore.open(name, args.input_root)
+        if args.command == "stats":
+            print_stats(name, store.stats())
+        elif args.command == "gc":
+            print(f"🧹 {name}: removed {store.gc()} unreferenced blobs")
+        store.close()
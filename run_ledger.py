@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+# Per-project record of every test run by auto_runner, stored in
+# <output root>/<project>/ledger.sqlite. One row per (category, test id) holds the
+# latest outcome; the runs table remembers when each auto_runner invocation started
+# so that throughput and ETA can be computed while a run is still going.
+
+LEDGER_FILE = "ledger.sqlite"
+
+STATES = ("pending", "running", "ok", "failed", "no-xml", "timeout")
+DONE_STATES = ("ok", "failed", "no-xml", "timeout")
+RETRY_STATES = ("failed", "no-xml", "timeout")
+
+def _placeholders(values):
+    """"(?, ?, ...)" for an SQL IN clause over `values`"""
+    return f"({', '.join('?' * len(values))})"
+
+# Only the tail of a failed build's output is kept
+LOG_TAIL_BYTES = 16 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    finished REAL,
+    args TEXT
+);
+CREATE TABLE IF NOT EXISTS tests (
+    category TEXT NOT NULL,
+    test_id TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    exit_code INTEGER,
+    run_id INTEGER,
+    started REAL,
+    finished REAL,
+    duration REAL,
+    phases TEXT,
+    report_bytes INTEGER,
+    log_tail TEXT,
+    PRIMARY KEY (category, test_id)
+);
+CREATE INDEX IF NOT EXISTS tests_state ON tests (state);
+CREATE TABLE IF NOT EXISTS inputs (
+    category TEXT NOT NULL,
+    test_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    covered TEXT,
+    PRIMARY KEY (category, test_id)
+);
+"""
+
+class RunLedger:
+    """SQLite ledger of test states, attempts, exit codes, per-phase timings and report sizes
+
+    One connection is shared by all runner threads and guarded by a lock; every update
+    is committed right away so an interrupted run leaves an accurate ledger behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self.run_id = None
+
+    @classmethod
+    def open(cls, project_name, output_root="experiment_data"):
+        return cls(os.path.join(output_root, project_name, LEDGER_FILE))
+
+    def _execute(self, sql, params=(), many=False):
+        with self._lock:
+            cur = self._conn.executemany(sql, params) if many else self._conn.execute(sql, params)
+            self._conn.commit()
+            return cur
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---------------- Runs ----------------
+
+    def start_run(self, args=None):
+        """Record a new runner invocation; tests left 'running' by a crashed run go back to pending"""
+        self._execute("UPDATE tests SET state = 'pending' WHERE state = 'running'")
+        cur = self._execute("INSERT INTO runs (started, args) VALUES (?, ?)", (time.time(), json.dumps(args or {})))
+        self.run_id = cur.lastrowid
+        return self.run_id
+
+    def finish_run(self):
+        if self.run_id is not None:
+            self._execute("UPDATE runs SET finished = ? WHERE run_id = ?", (time.time(), self.run_id))
+
+    # ---------------- Tests ----------------
+
+    def register(self, category, test_ids, done=None):
+        """Add tests as pending (existing rows are kept). `done(test_id)` marks reports from before the ledger existed as ok."""
+        known = {r["test_id"] for r in self._query("SELECT test_id FROM tests WHERE category = ?", (category,))}
+        rows = [(category, t, "ok" if done and done(t) else "pending") for t in test_ids if t not in known]
+        if rows:
+            self._execute("INSERT OR IGNORE INTO tests (category, test_id, state) VALUES (?, ?, ?)", rows, many=True)
+
+    def states(self, category):
+        return {r["test_id"]: r["state"] for r in self._query("SELECT test_id, state FROM tests WHERE category = ?", (category,))}
+
+    def select(self, category, test_ids, retry_failed=False, only_status=None):
+        """The subset of test_ids that should run, keeping their order
+
+        By default pending (and interrupted) tests run; retry_failed adds failed, no-xml
+        and timed-out tests; only_status restricts the selection to the given states.
+        """
+        wanted = set(only_status) if only_status else {"pending", "running"} | (set(RETRY_STATES) if retry_failed else set())
+        states = self.states(category)
+        return [t for t in test_ids if states.get(t, "pending") in wanted]
+
+    def mark_running(self, category, test_id):
+        self._execute("""INSERT INTO tests (category, test_id, state, attempts, run_id, started) VALUES (?, ?, 'running', 1, ?, ?)
+                         ON CONFLICT (category, test_id) DO UPDATE SET state = 'running', attempts = attempts + 1,
+                         run_id = excluded.run_id, started = excluded.started, finished = NULL""",
+                      (category, test_id, self.run_id, time.time()))
+
+    def finish(self, category, test_id, state, exit_code=None, phases=None, report_bytes=None, log=None):
+        """Store the outcome of a test; phases maps phase name -> seconds"""
+        phases = phases or {}
+        tail = log[-LOG_TAIL_BYTES:] if log and state != "ok" else None
+        self._execute("""UPDATE tests SET state = ?, exit_code = ?, finished = ?, duration = ?, phases = ?,
+                         report_bytes = ?, log_tail = ? WHERE category = ? AND test_id = ?""",
+                      (state, exit_code, time.time(), round(sum(phases.values()), 3),
+                       json.dumps({k: round(v, 3) for k, v in phases.items()}), report_bytes, tail, category, test_id))
+
+    def reset(self, category, test_ids):
+        """Put tests back to pending (e.g. because their inputs changed, see change_tracker.py)"""
+        self._execute("UPDATE tests SET state = 'pending' WHERE category = ? AND test_id = ?",
+                      [(category, t) for t in test_ids], many=True)
+
+    def record_inputs(self, category, test_id, fingerprint, covered=None):
+        """Remember the input fingerprint of a test's last ok run and the source files its coverage touched"""
+        self._execute("INSERT OR REPLACE INTO inputs (category, test_id, fingerprint, covered) VALUES (?, ?, ?, ?)",
+                      (category, test_id, fingerprint, json.dumps(covered) if covered is not None else None))
+
+    def inputs(self, category):
+        """test id -> (fingerprint, covered source files or None)"""
+        return {r["test_id"]: (r["fingerprint"], json.loads(r["covered"]) if r["covered"] else None)
+                for r in self._query("SELECT test_id, fingerprint, covered FROM inputs WHERE category = ?", (category,))}
+
+    def durations(self, category=None):
+        """Last measured wall time per test id (seconds), for tests that finished at least once"""
+        sql = "SELECT test_id, duration FROM tests WHERE duration IS NOT NULL"
+        params = ()
+        if category:
+            sql += " AND category = ?"
+            params = (category,)
+        return {r["test_id"]: r["duration"] for r in self._query(sql, params)}
+
+    def estimates(self, test_ids):
+        """Expected seconds per test: its last duration, else the mean of its class, else the project median"""
+        known = self.durations()
+        by_class = {}
+        for test_id, seconds in known.items():
+            by_class.setdefault(test_id.split("#", 1)[0], []).append(seconds)
+        median = sorted(known.values())[len(known) // 2] if known else 0.0
+        result = {}
+        for test_id in test_ids:
+            if test_id in known:
+                result[test_id] = known[test_id]
+            else:
+                same_class = by_class.get(test_id.split("#", 1)[0])
+                result[test_id] = sum(same_class) / len(same_class) if same_class else median
+        return result
+
+    def failures(self, limit=20):
+        return self._query(f"""SELECT category, test_id, state, attempts, exit_code, log_tail FROM tests
+                               WHERE state IN {_placeholders(RETRY_STATES)} ORDER BY finished DESC LIMIT ?""",
+                           (*RETRY_STATES, limit))
+
+    # ---------------- Progress ----------------
+
+    def summary(self):
+        """Counts per category and state, plus throughput and ETA of the latest run"""
+        counts = {}
+        for r in self._query("SELECT category, state, COUNT(*) AS n FROM tests GROUP BY category, state"):
+            counts.setdefault(r["category"], dict.fromkeys(STATES, 0))[r["state"]] = r["n"]
+
+        result = {"counts": counts, "run": None}
+        runs = self._query("SELECT * FROM runs ORDER BY run_id DESC LIMIT 1")
+        if not runs:
+            return result
+        run = runs[0]
+        row = self._query(f"""SELECT COUNT(*) AS n, MAX(finished) AS last, SUM(duration) AS busy FROM tests
+                              WHERE run_id = ? AND state IN {_placeholders(DONE_STATES)}""", (run["run_id"], *DONE_STATES))[0]
+        end = run["finished"] or time.time()
+        elapsed = max(end - run["started"], 1e-9)
+        remaining = sum(c["pending"] + c["running"] for c in counts.values())
+        per_hour = row["n"] / elapsed * 3600
+        result["run"] = {
+            "run_id": run["run_id"],
+            "started": run["started"],
+            "finished": run["finished"],
+            "elapsed": elapsed,
+            "done": row["n"],
+            "test_seconds": row["busy"] or 0.0,
+            "tests_per_hour": per_hour,
+            "remaining": remaining,
+            "eta_seconds": remaining / per_hour * 3600 if per_hour and not run["finished"] else None,
+        }
+        return result
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m{seconds % 60:02d}s"
+
+def print_summary(ledger, project_name, out=None):
+    summary = ledger.summary()
+    print(f"📒 Ledger for {project_name}: {ledger.path}", file=out)
+    for category, counts in sorted(summary["counts"].items()):
+        total = sum(counts.values())
+        print(f"   {category:>6}: {total:>6} tests  " + "  ".join(f"{s} {counts[s]}" for s in STATES), file=out)
+    run = summary["run"]
+    if not run:
+        print("   No runs recorded yet.", file=out)
+        return
+    status = "finished" if run["finished"] else "in progress"
+    print(f"   Run #{run['run_id']} ({status}): {run['done']} tests in {_format_duration(run['elapsed'])}, "
+          f"{run['tests_per_hour']:.1f} tests/hour", file=out)
+    if run["eta_seconds"] is not None:
+        print(f"   ⏳ {run['remaining']} remaining, ETA {_format_duration(run['eta_seconds'])} "
+              f"({time.strftime('%Y-%m-%d %H:%M', time.localtime(time.time() + run['eta_seconds']))})", file=out)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the auto_runner run ledger of a project")
+    parser.add_argument("command", choices=["summary", "failures", "durations"])
+    parser.add_argument("project_name", help="Project (container) name")
+    parser.add_argument("--out", default="./experiment_data", help="Root output directory of auto_runner")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(args.out, args.project_name, LEDGER_FILE)
+    if not os.path.exists(path):
+        print(f"❌ No ledger found at {path}")
+        sys.exit(1)
+    ledger = RunLedger(path)
+    if args.command == "summary":
+        print_summary(ledger, args.project_name)
+    elif args.command == "failures":
+        for r in ledger.failures(args.limit):
+            print(f"=== [{r['category']}] {r['test_id']}: {r['state']} (exit {r['exit_code']}, attempts {r['attempts']}) ===")
+            if r["log_tail"]: print(r["log_tail"].rstrip())
+    elif args.command == "durations":
+        slowest = sorted(ledger.durations().items(), key=lambda kv: -kv[1])[:args.limit]
+        for test_id, seconds in slowest:
+            print(f"   {seconds:>8.1f}s  {test_id}")
+    ledger.close()
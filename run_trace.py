@@ -0,0 +1,108 @@
+import os
+import json
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+# Phase timing for auto_runner. Every step, container command and file transfer is
+# wrapped in a span (monotonic clock). Aggregates (count, total, p50/p95, bytes) are
+# always kept; the individual spans are only kept when a trace file is requested and
+# can be exported in Chrome trace-event format (chrome://tracing, ui.perfetto.dev).
+
+class RunTrace:
+    """Collects spans of one project run"""
+
+    def __init__(self, keep_events=False, name="auto_runner"):
+        self.keep_events = keep_events
+        self.name = name
+        self.t0 = time.monotonic()
+        self.events = []
+        self.durations = {} # span name -> [seconds]
+        self.bytes = {} # span name -> bytes transferred
+        self._threads = {} # thread ident -> (tid, thread name)
+        self._lock = threading.Lock()
+
+    def _tid(self):
+        ident = threading.get_ident()
+        if ident not in self._threads:
+            self._threads[ident] = (len(self._threads) + 1, threading.current_thread().name)
+        return self._threads[ident][0]
+
+    def record(self, name, start, duration, category="cmd", nbytes=None, args=None):
+        """Add a finished span; start is a time.monotonic() value"""
+        with self._lock:
+            self.durations.setdefault(name, []).append(duration)
+            if nbytes:
+                self.bytes[name] = self.bytes.get(name, 0) + nbytes
+            if self.keep_events:
+                event = {"name": name, "cat": category, "ph": "X", "pid": 1, "tid": self._tid(),
+                         "ts": round((start - self.t0) * 1e6), "dur": round(duration * 1e6)}
+                if args or nbytes:
+                    event["args"] = dict(args or {}, **({"bytes": nbytes} if nbytes else {}))
+                self.events.append(event)
+
+    @contextmanager
+    def span(self, name, category="phase", **args):
+        """with trace.span("step2"): ... ; yields a dict where the body may set "bytes" """
+        info = {}
+        start = time.monotonic()
+        try:
+            yield info
+        finally:
+            self.record(name, start, time.monotonic() - start, category, info.get("bytes"), args or None)
+
+    # ---------------- Reports ----------------
+
+    def export_chrome(self, path):
+        """Write the spans as Chrome trace-event JSON"""
+        with self._lock:
+            meta = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": self.name}}]
+            meta += [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": tname}}
+                     for tid, tname in self._threads.values()]
+            events = meta + list(self.events)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        os.replace(path + ".tmp", path)
+
+    def table(self):
+        """Per span name: count, total, p50, p95, max (seconds) and bytes, slowest total first"""
+        rows = []
+        with self._lock:
+            for name, values in self.durations.items():
+                ordered = sorted(values)
+                rows.append({
+                    "name": name,
+                    "count": len(ordered),
+                    "total": sum(ordered),
+                    "p50": _percentile(ordered, 50),
+                    "p95": _percentile(ordered, 95),
+                    "max": ordered[-1],
+                    "bytes": self.bytes.get(name, 0),
+                })
+        return sorted(rows, key=lambda r: -r["total"])
+
+    def print_table(self, out=None):
+        rows = self.table()
+        if not rows: return
+        wall = time.monotonic() - self.t0
+        print(f"\n⏱️ Phase timings ({wall / 60:.1f} min wall clock):", file=out)
+        print(f"   {'phase':<28} {'count':>7} {'total':>10} {'p50':>8} {'p95':>8} {'max':>8} {'MB':>9}", file=out)
+        for r in rows:
+            mb = f"{r['bytes'] / 1e6:.1f}" if r["bytes"] else ""
+            print(f"   {r['name']:<28} {r['count']:>7} {r['total']:>9.1f}s {r['p50']:>7.2f}s {r['p95']:>7.2f}s "
+                  f"{r['max']:>7.2f}s {mb:>9}", file=out)
+
+def _percentile(ordered, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered: return 0.0
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def command_name(cmd):
+    """Short span name for a shell command line, e.g. 'docker cp' or 'java'"""
+    words = cmd.split()
+    if not words: return "cmd"
+    if words[0] == "docker" and len(words) > 1:
+        return f"docker {words[1]}"
+    return os.path.basename(words[0])
@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import glob
+import time
+import random
+import argparse
+import itertools
+
+from run_ledger import RunLedger, LEDGER_FILE, _format_duration
+
+# Reproducible, time-budgeted choice of the tests auto_runner runs (step 2b).
+#
+# Every PT runs and len(PTs) x --ratio non-PTs are sampled, as before, but the sample is
+# seeded and stratified: each category is put into a "sampling order" in which every
+# prefix is a random sample spread over the classes (or packages) in proportion to their
+# size. With --time-budget the plan keeps the longest prefixes of both orders that fit
+# the budget with the PT:non-PT ratio intact, using the per-test estimates of the run
+# ledger (RunLedger.estimates). The tests also run in that order, so a run cut short has
+# still covered a stratified sample.
+#
+# The plan is written to <output root>/<project>/sample_plan.json. Without --seed the
+# seed of that file is reused, so a resumed run picks the same tests.
+
+PLAN_FILE = "sample_plan.json"
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+STRATA = ("class", "package")
+
+def parse_budget(value):
+    """'12h', '90m', '1h30m', '3600' (seconds) -> seconds"""
+    text = str(value).strip().lower()
+    if re.fullmatch(r"\d+(\.\d+)?", text):
+        return float(text)
+    parts = re.findall(r"(\d+(?:\.\d+)?)([smhd])", text)
+    if not parts or "".join(n + u for n, u in parts) != text:
+        raise ValueError(f"Invalid time budget: {value} (e.g. 12h, 90m, 1h30m)")
+    return sum(float(n) * UNITS[u] for n, u in parts)
+
+def stratum(test_id, stratify):
+    cls = test_id.split("#", 1)[0]
+    return cls.rsplit(".", 1)[0] if stratify == "package" else cls
+
+def stratified_order(test_ids, rng, stratify="class"):
+    """All tests in sampling order: every prefix is a proportional, stratified random sample
+
+    Each stratum is shuffled and its tests get evenly spaced positions (i + offset) / size
+    with one random offset per stratum; sorting by position interleaves the strata.
+    Package strata are ordered by class inside.
+    """
+    strata = {}
+    for test_id in sorted(set(test_ids)):
+        strata.setdefault(stratum(test_id, stratify), []).append(test_id)
+    keyed = []
+    for name in sorted(strata):
+        members = strata[name]
+        if stratify == "package":
+            members = stratified_order(members, rng, "class")
+        else:
+            rng.shuffle(members)
+        offset = rng.random()
+        keyed.extend(((i + offset) / len(members), test_id) for i, test_id in enumerate(members))
+    keyed.sort()
+    return [test_id for _, test_id in keyed]
+
+class SamplePlan:
+    """Tests to run (in sampling order) and what they are expected to cost"""
+
+    def __init__(self, pts, nonpts, seed, stratify, ratio, budget, workers, estimates, expected, full):
+        self.pts = pts
+        self.nonpts = nonpts
+        self.seed = seed
+        self.stratify = stratify
+        self.ratio = ratio
+        self.budget = budget
+        self.workers = workers
+        self.estimated = estimates is not None
+        self.expected = expected # seconds of test time of the tests still to run in the plan
+        self.full = full # (PTs, non-PTs, seconds) of the plan without a budget
+
+    def describe(self):
+        """Lines for the run log"""
+        lines = [f"🎯 Plan: Run {len(self.pts)} PTs + {len(self.nonpts)} Non-PTs (seed {self.seed}, stratified by {self.stratify})"]
+        if not self.estimated:
+            lines.append("   ⏱️ Expected runtime unknown: no test durations recorded yet")
+            if self.budget:
+                lines.append("   ⚠️ The time budget is not applied without duration estimates")
+            return lines
+        message = f"   ⏱️ Expected runtime: {_format_duration(self.expected)} of test time"
+        if self.workers > 1:
+            message += f" (~{_format_duration(self.expected / self.workers)} with {self.workers} workers)"
+        if self.budget:
+            message += f", budget {_format_duration(self.budget)}"
+        lines.append(message)
+        if (len(self.pts), len(self.nonpts)) != self.full[:2]:
+            lines.append(f"   ✂️ Scaled down from {self.full[0]} PTs + {self.full[1]} Non-PTs "
+                         f"({_format_duration(self.full[2] / self.workers)}) to fit the budget")
+        return lines
+
+    def to_json(self):
+        return {"created": time.time(), "seed": self.seed, "stratify": self.stratify, "ratio": self.ratio,
+                "time_budget": self.budget, "workers": self.workers,
+                "expected_seconds": self.expected if self.estimated else None, "pts": self.pts, "nonpts": self.nonpts}
+
+def plan_sample(pts, nonpts, ratio, seed, estimates=None, budget=None, workers=1, stratify="class"):
+    """Seeded, stratified sample of PTs and non-PTs fitting `budget` seconds of wall time
+
+    estimates maps test id -> expected seconds (tests that are already done cost 0);
+    None means nothing is known yet and the budget cannot be applied.
+    """
+    workers = max(1, workers)
+    pt_order = stratified_order(pts, random.Random(f"{seed}/pt"), stratify)
+    nonpt_order = stratified_order(nonpts, random.Random(f"{seed}/nonpt"), stratify)
+
+    def nonpt_count(n_pt):
+        # As the old sampling: int(PTs x ratio) non-PTs, but at least one
+        if not nonpt_order or (pt_order and not n_pt):
+            return 0
+        return min(len(nonpt_order), max(1, int(n_pt * ratio)))
+
+    costs = estimates or {}
+    pt_cost = list(itertools.accumulate((costs.get(t, 0.0) for t in pt_order), initial=0.0))
+    nonpt_cost = list(itertools.accumulate((costs.get(t, 0.0) for t in nonpt_order), initial=0.0))
+    total = lambda n_pt: pt_cost[n_pt] + nonpt_cost[nonpt_count(n_pt)]
+
+    n_pt = len(pt_order)
+    full = (n_pt, nonpt_count(n_pt), total(n_pt))
+    if budget and estimates is not None:
+        # Prefix costs only grow, so the largest prefix within the budget is found by walking back
+        while n_pt > 0 and total(n_pt) > budget * workers:
+            n_pt -= 1
+    return SamplePlan(pt_order[:n_pt], nonpt_order[:nonpt_count(n_pt)], seed, stratify, ratio, budget, workers,
+                      estimates, total(n_pt), full)
+
+def plan_path(project_name, output_root="experiment_data"):
+    return os.path.join(output_root, project_name, PLAN_FILE)
+
+def load_plan(path):
+    """The saved plan (a dict), or None"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_plan(path, plan):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(plan.to_json(), f, indent=1)
+    os.replace(path + ".tmp", path)
+
+def latest_parser_result(project_name, output_root="experiment_data"):
+    """(pts, nonpts) of the newest cached parser result of a project, or None"""
+    paths = glob.glob(os.path.join(output_root, project_name, "parser_cache", "*.json"))
+    if not paths:
+        return None
+    with open(max(paths, key=os.path.getmtime)) as f:
+        cached = json.load(f)
+    return cached["pts"], cached["nonpts"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preview the sampling plan of a project from its cached parser result and run ledger")
+    parser.add_argument("project_names", nargs="+", help="Project (container) names")
+    parser.add_argument("--out", default="./experiment_data", help="Root output directory of auto_runner")
+    parser.add_argument("--ratio", type=float, default=3.0, help="Non-PT sampling ratio (default: 3.0)")
+    parser.add_argument("--seed", type=int, default=None, help="Sampling seed (default: the seed of the saved plan, else 0)")
+    parser.add_argument("--time-budget", default=None, help="Wall-clock budget per project, e.g. 12h, 90m, 1h30m")
+    parser.add_argument("--workers", type=int, default=1, help="Worker containers the budget is shared by (default: 1)")
+    parser.add_argument("--stratify", choices=STRATA, default="class", help="Sampling strata (default: class)")
+    args = parser.parse_args()
+    try:
+        budget = parse_budget(args.time_budget) if args.time_budget else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    for name in args.project_names:
+        tests = latest_parser_result(name, args.out)
+        if tests is None:
+            print(f"❌ No cached parser result for {name} (run auto_runner first)")
+            continue
+        pts, nonpts = tests
+        seed = args.seed
+        if seed is None:
+            seed = (load_plan(plan_path(name, args.out)) or {}).get("seed", 0)
+        estimates = None
+        if os.path.exists(os.path.join(args.out, name, LEDGER_FILE)):
+            ledger = RunLedger.open(name, args.out)
+            if ledger.durations():
+                estimates = ledger.estimates(pts + nonpts)
+            ledger.close()
+        print(f"📋 {name}: {len(pts)} PTs, {len(nonpts)} Non-PTs")
+        for line in plan_sample(pts, nonpts, args.ratio, seed, estimates, budget, args.workers, args.stratify).describe():
+            print(line)
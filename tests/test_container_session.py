@@ -0,0 +1,234 @@
+import io
+import os
+import sys
+import json
+import shutil
+import socket
+import struct
+import tarfile
+import tempfile
+import threading
+import unittest
+import subprocess
+import socketserver
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from container_session import ContainerSession, DockerAPIError
+
+# ContainerSession against a fake Docker Engine API on a local Unix socket. A "container"
+# is a directory: exec runs the command with sh -c inside it, and archive paths are
+# resolved below it.
+
+CONTAINER = "fake-container"
+
+class FakeEngine(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, root):
+        self.root = root
+        self.execs = {}
+        self.requests = []
+        super().__init__(socket_path, EngineHandler)
+
+    def host_path(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+class EngineHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, status, body=b"", content_type="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def not_found(self, what):
+        self.send_body(404, {"message": f"No such {what}"})
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def route(self):
+        url = urllib.parse.urlparse(self.path)
+        self.server.requests.append((self.command, url.path))
+        parts = url.path.strip("/").split("/")
+        query = urllib.parse.parse_qs(url.query)
+        return parts, query
+
+    def container_ok(self, parts):
+        if parts[0] == "containers" and urllib.parse.unquote(parts[1]) != CONTAINER:
+            self.not_found(f"container: {urllib.parse.unquote(parts[1])}")
+            return False
+        return True
+
+    def do_POST(self):
+        parts, _ = self.route()
+        body = json.loads(self.read_body() or b"{}")
+        if parts[0] == "containers" and parts[2] == "exec":
+            if not self.container_ok(parts): return
+            exec_id = f"exec{len(self.server.execs)}"
+            self.server.execs[exec_id] = {"config": body, "exit": None}
+            self.send_body(201, {"Id": exec_id})
+        elif parts[0] == "exec" and parts[2] == "start":
+            entry = self.server.execs.get(parts[1])
+            if entry is None: return self.not_found("exec instance")
+            config = entry["config"]
+            workdir = self.server.host_path(config["WorkingDir"])
+            env = dict(os.environ, **dict(e.split("=", 1) for e in config["Env"]))
+            res = subprocess.run(config["Cmd"], cwd=workdir, env=env, capture_output=True)
+            entry["exit"] = res.returncode
+            # Hijacked raw stream: no length, the connection closes after the last frame.
+            # Small frames alternating between the streams exercise the demultiplexer.
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.docker.raw-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            frames = []
+            for stream, data in ((1, res.stdout), (2, res.stderr)):
+                frames.append([(stream, data[i:i + 3]) for i in range(0, len(data), 3)])
+            out, err = frames
+            while out or err:
+                for chunks in (out, err):
+                    if chunks:
+                        stream, payload = chunks.pop(0)
+                        self.wfile.write(struct.pack(">BxxxI", stream, len(payload)) + payload)
+            self.close_connection = True
+        else:
+            self.not_found("endpoint")
+
+    def do_GET(self):
+        parts, query = self.route()
+        if parts[0] == "exec" and parts[2] == "json":
+            entry = self.server.execs.get(parts[1])
+            if entry is None: return self.not_found("exec instance")
+            self.send_body(200, {"ExitCode": entry["exit"], "Running": False})
+        elif parts[0] == "containers" and parts[2] == "archive":
+            if not self.container_ok(parts): return
+            path = query["path"][0]
+            host = self.server.host_path(path)
+            if not os.path.exists(host): return self.not_found(f"file or directory: {path}")
+            buf = io.BytesIO()
+            with tarfile.open(fileobj=buf, mode="w") as tar:
+                tar.add(host, arcname=os.path.basename(path.rstrip("/")))
+            self.send_body(200, buf.getvalue(), "application/x-tar")
+        else:
+            self.not_found("endpoint")
+
+    def do_PUT(self):
+        parts, query = self.route()
+        data = self.read_body()
+        if parts[0] == "containers" and parts[2] == "archive":
+            if not self.container_ok(parts): return
+            host = self.server.host_path(query["path"][0])
+            if not os.path.isdir(host): return self.not_found(f"directory: {query['path'][0]}")
+            with tarfile.open(fileobj=io.BytesIO(data), mode="r") as tar:
+                tar.extractall(host)
+            self.send_body(200)
+        else:
+            self.not_found("endpoint")
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs Unix domain sockets")
+class ContainerSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="ptcov_session_")
+        self.root = os.path.join(self.tmp, "container")
+        os.makedirs(os.path.join(self.root, "app"))
+        self.engine = FakeEngine(os.path.join(self.tmp, "docker.sock"), self.root)
+        threading.Thread(target=self.engine.serve_forever, daemon=True).start()
+        self.session = ContainerSession(CONTAINER, "/app", self.engine.server_address, timeout=10)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.shutdown()
+        self.engine.server_close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_exec_demultiplexes_stdout_and_stderr(self):
+        res = self.session.exec("printf 'hello from stdout'; printf 'and stderr' >&2; printf ' again'; exit 3")
+        self.assertEqual(res.stdout, "hello from stdout again")
+        self.assertEqual(res.stderr, "and stderr")
+        self.assertEqual(res.returncode, 3)
+
+    def test_exec_uses_workdir_and_env(self):
+        res = self.session.exec('pwd; echo "$PTCOV_X"', env={"PTCOV_X": "42"})
+        self.assertEqual(res.stdout.split(), [os.path.join(self.root, "app"), "42"])
+        self.assertEqual(res.returncode, 0)
+
+    def test_exec_streams_to_log_file(self):
+        log = os.path.join(self.tmp, "build.log")
+        res = self.session.exec("echo one; echo two >&2", log_file=log)
+        # The log gets the frames as they arrive, so stdout and stderr interleave
+        with open(log) as f:
+            self.assertEqual(sorted(f.read()), sorted("one\ntwo\n"))
+        self.assertEqual((res.stdout, res.stderr, res.returncode), ("one\n", "two\n", 0))
+
+    def test_exit_code_is_inspected_per_exec(self):
+        codes = [self.session.exec(f"exit {code}").returncode for code in (0, 1, 7)]
+        self.assertEqual(codes, [0, 1, 7])
+        inspects = [r for r in self.engine.requests if r[1].endswith("/json")]
+        self.assertEqual(len(inspects), 3)
+
+    def test_unknown_container_raises(self):
+        other = ContainerSession("missing", "/app", self.engine.server_address, timeout=10)
+        try:
+            with self.assertRaises(DockerAPIError) as ctx:
+                other.exec("true")
+            self.assertIn("404", str(ctx.exception))
+            with self.assertRaises(DockerAPIError):
+                other.copy_from("/app/x", os.path.join(self.tmp, "x"))
+        finally:
+            other.close()
+
+    def test_missing_path_raises(self):
+        with self.assertRaises(DockerAPIError) as ctx:
+            self.session.copy_from("/app/nope.xml", os.path.join(self.tmp, "nope.xml"))
+        self.assertIn("404", str(ctx.exception))
+        local = os.path.join(self.tmp, "f.txt")
+        with open(local, "w") as f:
+            f.write("x")
+        with self.assertRaises(DockerAPIError):
+            self.session.copy_to(local, "/no/such/dir/f.txt")
+
+    def test_archive_round_trip_of_a_file(self):
+        local = os.path.join(self.tmp, "report.xml")
+        payload = b"<report>" + os.urandom(4096).hex().encode() + b"</report>"
+        with open(local, "wb") as f:
+            f.write(payload)
+        sent = self.session.copy_to(local, "/app/report.xml")
+        self.assertGreater(sent, len(payload))
+        with open(os.path.join(self.root, "app", "report.xml"), "rb") as f:
+            self.assertEqual(f.read(), payload)
+
+        back = os.path.join(self.tmp, "back.xml")
+        received = self.session.copy_from("report.xml", back)
+        self.assertGreater(received, len(payload))
+        with open(back, "rb") as f:
+            self.assertEqual(f.read(), payload)
+
+    def test_archive_round_trip_of_a_directory(self):
+        src = os.path.join(self.tmp, "classes")
+        os.makedirs(os.path.join(src, "org", "foo"))
+        for name in ("A.class", "B.class"):
+            with open(os.path.join(src, "org", "foo", name), "wb") as f:
+                f.write(name.encode() * 100)
+        self.session.copy_to(src, "/app/classes")
+        self.assertEqual(self.session.exec("ls classes/org/foo").stdout.split(), ["A.class", "B.class"])
+
+        dest = os.path.join(self.tmp, "copied")
+        self.session.copy_from("/app/classes", dest)
+        for name in ("A.class", "B.class"):
+            with open(os.path.join(dest, "org", "foo", name), "rb") as f:
+                self.assertEqual(f.read(), name.encode() * 100)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auto_runner import SOURCE_FIND, TEST_SOURCE_LISTING
+from change_tracker import SNAPSHOT_SCRIPT, SourceSnapshot
+
+# The find commands run in the containers, against a small multi-module tree: build output
+# (target/, build/ next to a build file) is skipped, packages named build or target are not.
+
+FILES = [
+    "pom.xml",
+    "m/pom.xml",
+    "m/src/main/java/org/x/build/Builder.java",
+    "m/src/test/java/org/x/build/BuildTest.java",
+    "m/src/test/java/org/x/target/TargetTest.java",
+    "m/src/test/java/org/x/util/UtilTest.java",
+    "m/target/generated-test-sources/src/test/java/org/x/GenTest.java",
+    "m/target/classes/pom.xml",
+    "g/build.gradle.kts",
+    "g/src/test/java/org/y/build/GradleBuildTest.java",
+    "g/build/tmp/src/test/java/org/y/TmpTest.java",
+    "node_modules/p/src/test/java/NodeTest.java",
+    ".git/src/test/java/GitTest.java",
+]
+
+def make_tree(root):
+    for rel in FILES:
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(rel)
+
+def run_find(root, script):
+    res = subprocess.run(["sh", "-c", script], cwd=root, capture_output=True, text=True, check=True)
+    return sorted(line[2:] if line.startswith("./") else line for line in res.stdout.splitlines())
+
+class SourceFindTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="ptcov_find_")
+        make_tree(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_parser_input_keeps_build_packages(self):
+        self.assertEqual(run_find(self.root, SOURCE_FIND), [
+            "g/build.gradle.kts",
+            "g/src/test/java/org/y/build/GradleBuildTest.java",
+            "m/pom.xml",
+            "m/src/test/java/org/x/build/BuildTest.java",
+            "m/src/test/java/org/x/target/TargetTest.java",
+            "m/src/test/java/org/x/util/UtilTest.java",
+            "pom.xml",
+        ])
+
+    def test_fingerprint_lists_the_parsed_test_sources(self):
+        listed = [line.split(" ", 1)[0] for line in run_find(self.root, TEST_SOURCE_LISTING)]
+        parsed = [path for path in run_find(self.root, SOURCE_FIND) if "/src/test/java/" in path]
+        self.assertEqual(sorted(listed), parsed)
+        self.assertIn("m/src/test/java/org/x/build/BuildTest.java", listed)
+
+    def test_snapshot_hashes_build_packages(self):
+        listing = subprocess.run(["sh", "-c", SNAPSHOT_SCRIPT], cwd=self.root, capture_output=True, text=True, check=True).stdout
+        snapshot = SourceSnapshot(listing, ["org.x.build.BuildTest#test"])
+        self.assertIn("org/x/build/Builder.java", snapshot.main)
+        self.assertIn("org.x.build.BuildTest", snapshot.tests)
+        self.assertNotIn("org.x.GenTest", snapshot.tests)
+        self.assertNotIn("org.y.TmpTest", snapshot.tests)
+
+        # Editing a covered class in a build package changes the test's fingerprint
+        before = snapshot.fingerprint("org.x.build.BuildTest#test", ["org/x/build/Builder.java"])
+        with open(os.path.join(self.root, "m/src/main/java/org/x/build/Builder.java"), "a") as f:
+            f.write("// changed")
+        listing = subprocess.run(["sh", "-c", SNAPSHOT_SCRIPT], cwd=self.root, capture_output=True, text=True, check=True).stdout
+        after = SourceSnapshot(listing, ["org.x.build.BuildTest#test"]).fingerprint("org.x.build.BuildTest#test", ["org/x/build/Builder.java"])
+        self.assertNotEqual(before, after)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,180 @@
 import os
 import csv
+import gzip
+import json
+import hashlib
 import argparse
+from contextlib import contextmanager
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Per-project file (in the CSV output dir) with the content hashes of the converted XMLs
+HASH_MANIFEST = ".xml_hashes.json"
+
+CSV_FIELDS = ['Package', 'Class', 'Method', 'Desc', 'Inst_Missed', 'Inst_Covered', 'Line_Missed', 'Line_Covered']
+
+# Report files that are read through a streaming decompressor (see report_store.py)
+COMPRESSED_SUFFIXES = ('.xml.gz', '.xml.zst')
+
+def open_report(path):
+    """Binary stream of a report file; .gz and .zst reports are decompressed on the fly"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError(f"{path} is zstd-compressed, which needs the zstandard package (pip install zstandard)")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+# Top-level directories of a project's output that hold no per-test reports: copied
+# class dirs (--exec-only, may contain resource .xml files), build logs (--stream-logs),
+# the report store (--store-reports, read through stored_reports) and the parser cache
+NON_REPORT_DIRS = ("classes", "logs", "reports", "parser_cache")
+
+def walk_reports(input_dir, suffix=".xml"):
+    """Sorted paths of the per-test report files (*suffix) below a project's output directory
+
+    Skips the runner's scratch directories (.batch_*, ...) and NON_REPORT_DIRS.
+    """
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and not (root == input_dir and d in NON_REPORT_DIRS))
+        for file in sorted(files):
+            if file.endswith(suffix):
+                yield os.path.join(root, file)
+
+@contextmanager
+def _report_source(xml_file):
+    """A path is opened with open_report (and closed again); file objects are used as they are"""
+    if isinstance(xml_file, str):
+        with open_report(xml_file) as f:
+            yield f
+    else:
+        yield xml_file
+
+class MethodRow:
+    """One method-level CSV row (compact: no per-row dict)"""
+    __slots__ = ('package', 'clazz', 'method', 'desc', 'inst_missed', 'inst_covered', 'line_missed', 'line_covered')
+
+    def __init__(self, package, clazz, method, desc, inst_missed, inst_covered, line_missed, line_covered):
+        self.package = package
+        self.clazz = clazz
+        self.method = method
+        self.desc = desc
+        self.inst_missed = inst_missed
+        self.inst_covered = inst_covered
+        self.line_missed = line_missed
+        self.line_covered = line_covered
+
+    def as_tuple(self):
+        return (self.package, self.clazz, self.method, self.desc,
+                self.inst_missed, self.inst_covered, self.line_missed, self.line_covered)
+
+    def as_dict(self):
+        return dict(zip(CSV_FIELDS, self.as_tuple()))
+
+class CounterRow:
+    """Counters of a class, sourcefile or line element (see iter_jacoco_counters)"""
+    __slots__ = ('level', 'package', 'name', 'line', 'counters')
+
+    def __init__(self, level, package, name, line, counters):
+        self.level = level
+        self.package = package
+        self.name = name
+        self.line = line
+        self.counters = counters
+
+def iter_jacoco_methods(xml_file):
+    """
+    Streams a JaCoCo XML file and yields a MethodRow per method with instructions.
+    Elements are handled as they close and cleared afterwards, so memory use does
+    not grow with the size of the report. xml_file may be a path (also .xml.gz/.xml.zst)
+    or a binary file object.
+    """
+    with _report_source(xml_file) as source:
+        yield from _iter_methods(source)
+
+def _iter_methods(source):
+    package_name = None
+    class_name = None
+    # Incremental parse: 'start' gives us package/class names before their children close
+    context = ET.iterparse(source, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        tag = elem.tag
+        if event == 'start':
+            if tag == 'package':
+                package_name = elem.get('name')
+            elif tag == 'class':
+                class_name = elem.get('name')
+            continue
+
+        if tag == 'method':
+            inst_missed = inst_covered = line_missed = line_covered = 0
+            for counter in elem.iterfind('counter'):
+                type_ = counter.get('type')
+                if type_ == 'INSTRUCTION':
+                    inst_missed = int(counter.get('missed'))
+                    inst_covered = int(counter.get('covered'))
+                elif type_ == 'LINE':
+                    line_missed = int(counter.get('missed'))
+                    line_covered = int(counter.get('covered'))
+            # Only keep methods that have instructions
+            if inst_missed + inst_covered > 0:
+                yield MethodRow(package_name, class_name, elem.get('name'), elem.get('desc'),
+                                inst_missed, inst_covered, line_missed, line_covered)
+            elem.clear()
+        elif tag in ('class', 'sourcefile', 'package'):
+            # Finished subtree: drop it and detach it from the root
+            elem.clear()
+            root.clear()
+
+def iter_jacoco_counters(xml_file, level='class'):
+    """
+    Streams class, sourcefile or line level counters from a JaCoCo XML file.
+
+    level='class'      -> CounterRow(name=class name, counters={type: (missed, covered)})
+    level='sourcefile' -> CounterRow(name=source file name, counters={type: (missed, covered)})
+    level='line'       -> CounterRow(name=source file name, line=nr, counters={'mi','ci','mb','cb'})
+    """
+    if level not in ('class', 'sourcefile', 'line'):
+        raise ValueError(f"Unknown counter level: {level}")
+    with _report_source(xml_file) as source:
+        yield from _iter_counters(source, level)
+
+def _iter_counters(source, level):
+    package_name = None
+    sourcefile = None
+    context = ET.iterparse(source, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        tag = elem.tag
+        if event == 'start':
+            if tag == 'package':
+                package_name = elem.get('name')
+            elif tag == 'sourcefile':
+                sourcefile = elem.get('name')
+            continue
+
+        if tag == 'line':
+            if level == 'line':
+                yield CounterRow('line', package_name, sourcefile, int(elem.get('nr')), {
+                    'mi': int(elem.get('mi', 0)), 'ci': int(elem.get('ci', 0)),
+                    'mb': int(elem.get('mb', 0)), 'cb': int(elem.get('cb', 0)),
+                })
+            elem.clear()
+        elif tag == 'method':
+            elem.clear()
+        elif tag in ('class', 'sourcefile'):
+            if tag == level:
+                counters = {c.get('type'): (int(c.get('missed')), int(c.get('covered'))) for c in elem.iterfind('counter')}
+                yield CounterRow(tag, package_name, elem.get('name'), None, counters)
+            elem.clear()
+            root.clear()
+        elif tag == 'package':
+            elem.clear()
+            root.clear()
 
 def parse_jacoco_xml(xml_file):
     """
@@ -10,57 +183,7 @@ def parse_jacoco_xml(xml_file):
     """
     rows = []
     try:
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-        
-        # Iterate through packages
-        for package in root.findall('package'):
-            package_name = package.get('name')
-            
-            # Iterate through classes
-            for clazz in package.findall('class'):
-                class_name = clazz.get('name')
-                
-                # Iterate through methods
-                for method in clazz.findall('method'):
-                    method_name = method.get('name')
-                    desc = method.get('desc')
-                    
-                    # Initialize counters
-                    inst_missed = 0
-                    inst_covered = 0
-                    line_missed = 0
-                    line_covered = 0
-                    
-                    # Get counters
-                    for counter in method.findall('counter'):
-                        type_ = counter.get('type')
-                        missed = int(counter.get('missed'))
-                        covered = int(counter.get('covered'))
-                        
-                        if type_ == 'INSTRUCTION':
-                            inst_missed = missed
-                            inst_covered = covered
-                        elif type_ == 'LINE':
-                            line_missed = missed
-                            line_covered = covered
-                    
-                    # Only add if there is some coverage or code (optional, but good for verification)
-                    # If both covered are 0, it means the method wasn't executed at all (or empty)
-                    # But we want to see what was covered, so we keep everything or filter?
-                    # Let's keep everything that has instructions.
-                    if inst_missed + inst_covered > 0:
-                        rows.append({
-                            'Package': package_name,
-                            'Class': class_name,
-                            'Method': method_name,
-                            'Desc': desc,
-                            'Inst_Missed': inst_missed,
-                            'Inst_Covered': inst_covered,
-                            'Line_Missed': line_missed,
-                            'Line_Covered': line_covered
-                        })
-                        
+        rows = [row.as_dict() for row in iter_jacoco_methods(xml_file)]
     except ET.ParseError as e:
         print(f"❌ Error parsing {xml_file}: {e}")
     except Exception as e:
@@ -68,53 +191,178 @@ def parse_jacoco_xml(xml_file):
         
     return rows
 
-def process_project(project_name, input_root="experiment_data", output_root="coverage_csvs"):
+def write_coverage_csv(xml_file, csv_path, raise_errors=False):
+    """
+    Streams method rows of xml_file straight into csv_path.
+    Returns the number of rows written (0 if the report is empty or unreadable).
+    With raise_errors=True parse errors are raised instead of printed.
+    """
+    count = 0
+    tmp_path = csv_path + ".tmp"
+    try:
+        with open(tmp_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            for row in iter_jacoco_methods(xml_file):
+                writer.writerow(row.as_tuple())
+                count += 1
+    except Exception as e:
+        count = 0
+        if raise_errors:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+        if isinstance(e, ET.ParseError):
+            print(f"❌ Error parsing {xml_file}: {e}")
+        else:
+            print(f"❌ Unexpected error processing {xml_file}: {e}")
+
+    if count:
+        os.replace(tmp_path, csv_path)
+    elif os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    return count
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def report_digest(path):
+    """sha256 of a report's XML content; stored blobs (report_store.py) are named by it already"""
+    name = os.path.basename(path)
+    for suffix in COMPRESSED_SUFFIXES:
+        if name.endswith(suffix) and len(name) == 64 + len(suffix):
+            return name[:64]
+    return file_sha256(path)
+
+def convert_one(xml_path, csv_path, known_hash=None, force=False):
+    """
+    Converts one report unless its CSV is up to date.
+    Returns (status, hash) where status is 'skipped', 'converted', 'empty' or 'failed'.
+    Runs in worker processes, so it never raises.
+    """
+    try:
+        if not force and os.path.exists(csv_path):
+            # Cheap check first: CSV newer than the XML
+            if os.path.getmtime(csv_path) >= os.path.getmtime(xml_path):
+                return 'skipped', known_hash
+            # XML was rewritten (e.g. copied again by a resumed run) but may be unchanged
+            digest = report_digest(xml_path)
+            if digest == known_hash:
+                os.utime(csv_path)
+                return 'skipped', digest
+        else:
+            digest = None
+
+        digest = digest or report_digest(xml_path)
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+        if write_coverage_csv(xml_path, csv_path, raise_errors=True):
+            return 'converted', digest
+        return 'empty', digest
+    except Exception as e:
+        return 'failed', f"{type(e).__name__}: {e}"
+
+def load_hash_manifest(output_dir):
+    """Content hashes of the converted XMLs of a project, keyed by relative XML path (e.g. "pt/test.xml")"""
+    manifest_path = os.path.join(output_dir, HASH_MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)
+    return {}
+
+def save_hash_manifest(output_dir, manifest):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, HASH_MANIFEST)
+    with open(manifest_path + ".tmp", 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+def process_project(project_name, input_root="experiment_data", output_root="coverage_csvs", jobs=1, force=False):
+    """
+    Converts every XML of a project to CSV (incrementally; in a process pool when jobs > 1).
+    Returns a dict of counts per status.
+    """
     input_dir = os.path.join(input_root, project_name)
     output_dir = os.path.join(output_root, project_name)
+    stats = {'converted': 0, 'skipped': 0, 'empty': 0, 'failed': 0}
     
     if not os.path.exists(input_dir):
         print(f"❌ Input directory not found: {input_dir}")
-        return
+        return stats
 
     print(f"📂 Processing XMLs from: {input_dir}")
     print(f"💾 Saving CSVs to: {output_dir}")
-    
-    count = 0
-    
-    for root, dirs, files in os.walk(input_dir):
-        for file in files:
-            if file.endswith(".xml"):
-                xml_path = os.path.join(root, file)
-                
-                # Determine relative path to maintain structure (e.g. pt/test.xml -> pt/test.csv)
-                rel_path = os.path.relpath(root, input_dir)
-                target_dir = os.path.join(output_dir, rel_path)
-                os.makedirs(target_dir, exist_ok=True)
-                
-                csv_filename = file.replace(".xml", ".csv")
-                csv_path = os.path.join(target_dir, csv_filename)
-                
-                rows = parse_jacoco_xml(xml_path)
-                
-                if rows:
-                    with open(csv_path, 'w', newline='') as f:
-                        fieldnames = ['Package', 'Class', 'Method', 'Desc', 'Inst_Missed', 'Inst_Covered', 'Line_Missed', 'Line_Covered']
-                        writer = csv.DictWriter(f, fieldnames=fieldnames)
-                        writer.writeheader()
-                        writer.writerows(rows)
-                    # print(f"   ✅ Generated: {csv_filename}")
-                else:
-                    print(f"   ⚠️ No data found or empty XML: {file}")
-                
-                count += 1
-                if count % 100 == 0:
-                    print(f"   ... processed {count} files")
 
-    print(f"🎉 Finished! Processed {count} XML files.")
+    # Content hashes of the XMLs behind the existing CSVs, keyed by relative XML path
+    manifest = load_hash_manifest(output_dir)
+
+    tasks = {}
+    for xml_path in walk_reports(input_dir):
+        # Determine relative path to maintain structure (e.g. pt/test.xml -> pt/test.csv)
+        rel_xml = os.path.relpath(xml_path, input_dir)
+        csv_path = os.path.join(output_dir, rel_xml[:-len(".xml")] + ".csv")
+        tasks[rel_xml] = (rel_xml, xml_path, csv_path)
+
+    # Reports in the content-addressed store are read from their compressed blobs
+    # (a loose XML of the same test is newer and wins)
+    from report_store import stored_reports
+    for category, name, blob_path in stored_reports(input_dir):
+        rel_xml = os.path.join(category, name + ".xml")
+        if rel_xml not in tasks:
+            tasks[rel_xml] = (rel_xml, blob_path, os.path.join(output_dir, category, name + ".csv"))
+    tasks = list(tasks.values())
+
+    def record(rel_xml, status, value):
+        stats[status] += 1
+        if status == 'failed':
+            print(f"   ❌ Failed: {rel_xml} ({value})")
+        else:
+            if value: manifest[rel_xml] = value
+            if status == 'empty':
+                print(f"   ⚠️ No data found or empty XML: {os.path.basename(rel_xml)}")
+        done = sum(stats.values())
+        if done % 100 == 0:
+            print(f"   ... processed {done}/{len(tasks)} files")
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(convert_one, xml_path, csv_path, manifest.get(rel_xml), force): rel_xml
+                       for rel_xml, xml_path, csv_path in tasks}
+            for future in as_completed(futures):
+                status, value = future.result()
+                record(futures[future], status, value)
+    else:
+        for rel_xml, xml_path, csv_path in tasks:
+            status, value = convert_one(xml_path, csv_path, manifest.get(rel_xml), force)
+            record(rel_xml, status, value)
+
+    if tasks:
+        save_hash_manifest(output_dir, manifest)
+
+    print(f"🎉 Finished {project_name}! {len(tasks)} XML files: {stats['converted']} converted, "
+          f"{stats['skipped']} up to date, {stats['empty']} empty, {stats['failed']} failed.")
+    return stats
+
+def process_projects(project_names, input_root="experiment_data", output_root="coverage_csvs", jobs=1, force=False):
+    """Runs process_project for several projects and prints the combined counts"""
+    total = {'converted': 0, 'skipped': 0, 'empty': 0, 'failed': 0}
+    for name in project_names:
+        stats = process_project(name, input_root, output_root, jobs, force)
+        for key in total: total[key] += stats[key]
+    if len(project_names) > 1:
+        print(f"📊 All {len(project_names)} projects: {total['converted']} converted, {total['skipped']} up to date, "
+              f"{total['empty']} empty, {total['failed']} failed.")
+    return total
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Convert JaCoCo XMLs to CSVs for verification")
-    parser.add_argument("project_name", help="The project name (e.g., sag-commons-cli)")
+    parser.add_argument("project_names", nargs="+", help="One or more project names (e.g., sag-commons-cli)")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes (default: 1)")
+    parser.add_argument("--input-root", default="experiment_data", help="Root directory of the XML reports")
+    parser.add_argument("--output-root", default="coverage_csvs", help="Root directory for the CSVs")
+    parser.add_argument("--force", action="store_true", help="Convert every file even if its CSV is up to date")
     args = parser.parse_args()
     
-    process_project(args.project_name)
+    process_projects(args.project_names, args.input_root, args.output_root, max(1, args.jobs), args.force)